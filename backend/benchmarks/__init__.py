@@ -0,0 +1,4 @@
+"""
+Micro-benchmarks for the scraper hot paths
+Run from backend/, e.g. `python -m benchmarks.html_parsers page_debug.html`
+"""
@@ -0,0 +1,112 @@
+"""
+HTML parser benchmark
+Times what GogoAnimeScraper, DirectWebScraper and diagnose_page extract
+from episode pages with every parser backend, checks that the backends
+agree, and prints the per-page speedup over BeautifulSoup.
+    
+    python -m benchmarks.html_parsers                      # synthetic pages
+    python -m benchmarks.html_parsers page_debug.html ...  # saved pages (diagnose_page.py)
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from scrapers.html_parser import PARSERS, get_parser, HtmlParser
+
+
+def synthetic_page(padding: int = 400) -> str:
+    """Episode page shaped like the GogoAnime mirrors (ads, menus, episode list, player)"""
+    menu = ''.join(f'<li><a href="/genre/genre-{i}" title="Genre {i}">Genre {i}</a></li>' for i in range(60))
+    episodes = ''.join(
+        f'<li><a href="/one-piece-episode-{i}" class="ep"><div class="name"><span>EP</span> {i}</div>'
+        f'<div class="cate">SUB</div></a></li>'
+        for i in range(padding)
+    )
+    servers = ''.join(
+        f'<li class="{name}"><a href="#" rel="{i}" data-video="https://{name}.example/embed?id=abc{i}&amp;t=1">'
+        f'Choose this server<span>{name.title()}</span></a></li>'
+        for i, name in enumerate(['vidcdn', 'streamwish', 'doodstream', 'mp4upload', 'filelions'])
+    )
+    downloads = ''.join(
+        f'<a href="https://vidcdn.example/download/{quality}?id=abc" target="_blank">Download {quality.upper()}</a>'
+        for quality in ['360p', '480p', '720p', '1080p']
+    )
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>One Piece Episode 1</title>
+<script>var config = {{"ads": true, "banner": "/ads/top.js"}};</script></head>
+<body>
+<div class="menu_top_link"><ul>{menu}</ul></div>
+<!-- <iframe src="https://commented.example/out"></iframe> -->
+<div class="anime_video_body">
+  <div class="play-video"><iframe src="//vidcdn.example/streaming.php?id=abc&amp;title=One+Piece" allowfullscreen></iframe></div>
+  <iframe src="/ads/banner.html" width="728" height="90"></iframe>
+  <div class="anime_muti_link"><ul>{servers}</ul>{downloads}</div>
+  <section class="video-stream-info" id="info"><video src="https://cdn.example/preview.mp4"><source src="https://cdn.example/preview.webm"></video></section>
+</div>
+<div class="anime_video_body_episodes"><ul id="episode_page">{episodes}</ul></div>
+<script>jwplayer("player").setup({{file: "https://cdn.example/hls/one-piece-1/playlist.m3u8"}});</script>
+</body></html>"""
+
+
+def workload(parser: HtmlParser, html: str) -> Tuple:
+    """Everything the scrapers ask of one episode page"""
+    return (
+        parser.first_link(html, 'li'),                                  # Gogo search results
+        parser.attr_values(html, 'iframe', 'src'),                      # Gogo / DirectWeb iframes
+        parser.links_in_class(html, 'div', 'anime_muti_link'),          # Gogo download links
+        parser.attr_values(html, 'video', 'src'),                       # diagnose_page
+        parser.attr_values(html, 'source', 'src'),
+        parser.containers(html, ['div', 'section'], ['player', 'video', 'stream', 'embed']),
+    )
+
+
+def time_page(backend: HtmlParser, html: str, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        # A new string object per run, so the backends cannot reuse the previous parse
+        page = html[:1] + html[1:]
+        started = time.perf_counter()
+        workload(backend, page)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper HTML parser backends")
+    parser.add_argument('pages', nargs='*', help="Saved HTML pages (default: a synthetic episode page)")
+    parser.add_argument('--repeat', type=int, default=50, help="Runs per page and backend")
+    args = parser.parse_args()
+    
+    pages: Dict[str, str] = {}
+    for path in args.pages:
+        pages[path] = Path(path).read_text(encoding='utf-8', errors='replace')
+    if not pages:
+        pages['synthetic'] = synthetic_page()
+    
+    backends = {name: get_parser(name) for name in PARSERS}
+    mismatches = 0
+    
+    print(f"{'page':<30} {'KB':>6} " + ' '.join(f"{name + ' ms':>10}" for name in backends) +
+          ' ' + ' '.join(f"{name + ' x':>8}" for name in backends if name != 'bs4'))
+    for label, html in pages.items():
+        reference = workload(backends['bs4'], html)
+        medians = {}
+        for name, backend in backends.items():
+            if workload(backend, html) != reference:
+                mismatches += 1
+                print(f"[WARNING] {name} disagrees with bs4 on {label}")
+            medians[name] = statistics.median(time_page(backend, html, args.repeat))
+        
+        print(f"{Path(label).name[:30]:<30} {len(html) / 1024:>6.0f} " +
+              ' '.join(f"{medians[name] * 1000:>10.2f}" for name in backends) + ' ' +
+              ' '.join(f"{medians['bs4'] / medians[name]:>8.1f}" for name in backends if name != 'bs4'))
+    
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
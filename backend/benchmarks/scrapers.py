@@ -0,0 +1,256 @@
+"""
+Scraper benchmark on recorded traffic
+Records the upstream responses of every provider once (live), then replays
+them offline (scrapers/fixtures.py) to time search_anime, get_episode_url,
+extract_video_url and the full VideoScraper.get_video_url chain per
+provider. Prints p50/p95 and compares them with a saved baseline.
+    
+    python -m benchmarks.scrapers record "One Piece" 1 2 3        # live, fills fixtures/
+    python -m benchmarks.scrapers run "One Piece" 1 2 3 --latency 0.05 --save-baseline baseline.json
+    python -m benchmarks.scrapers run "One Piece" 1 2 3 --latency 0.05 --baseline baseline.json
+
+run exits with status 1 when a stage got slower than the baseline by more
+than --threshold (and --noise-ms), or succeeded fewer times.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Show IDs must come from the recorded search, not from Redis or the cache file
+os.environ.setdefault('SHOW_CACHE_BACKEND', 'none')
+
+from scrapers import fixtures
+from scrapers.health import embed_health, mirror_health, provider_health, source_health
+from scrapers.show_cache import show_id_cache
+from scrapers.video_scraper import VideoScraper
+
+
+STAGES = ['search_anime', 'get_episode_url', 'extract_video_url', 'get_video_url']
+
+# (provider, stage) -> [(seconds, ok), ...]
+Samples = Dict[Tuple[str, str], List[Tuple[float, bool]]]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def fresh_state(warm: bool):
+    """Start a run with cold caches and health stats, unless --warm"""
+    if warm:
+        return
+    show_id_cache.clear()
+    for tracker in (mirror_health, provider_health, source_health, embed_health):
+        tracker.reset()
+
+
+@contextlib.contextmanager
+def quiet(verbose: bool):
+    """Keep the scrapers' debug output out of the report (and the timings)"""
+    if verbose:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def timed(samples: Samples, key: Tuple[str, str], run: Callable[[], object]):
+    started = time.perf_counter()
+    result = run()
+    samples.setdefault(key, []).append((time.perf_counter() - started, bool(result)))
+    return result
+
+
+async def timed_async(samples: Samples, key: Tuple[str, str], run: Callable[[], Awaitable]):
+    started = time.perf_counter()
+    result = await run()
+    samples.setdefault(key, []).append((time.perf_counter() - started, bool(result)))
+    return result
+
+
+def chain_ok(result: Optional[Dict]) -> Optional[Dict]:
+    return result if result and result.get('success') else None
+
+
+async def chain_ok_async(result: Awaitable[Optional[Dict]]) -> Optional[Dict]:
+    return chain_ok(await result)
+
+
+def run_sync(samples: Samples, anime: str, episode: int, warm: bool, video_scraper: VideoScraper):
+    for scraper in video_scraper.scrapers:
+        name = scraper.__class__.__name__
+        fresh_state(warm)
+        anime_id = timed(samples, (name, 'search_anime'), lambda: scraper.search_anime(anime))
+        episode_url = anime_id and timed(samples, (name, 'get_episode_url'),
+                                         lambda: scraper.get_episode_url(anime_id, episode))
+        if episode_url:
+            timed(samples, (name, 'extract_video_url'), lambda: scraper.extract_video_url(episode_url))
+        
+        fresh_state(warm)
+        chain = VideoScraper()
+        chain.scrapers = [scraper if warm else type(scraper)()]
+        timed(samples, (name, 'get_video_url'), lambda: chain_ok(chain.get_video_url(anime, episode)))
+
+
+async def run_async(samples: Samples, anime: str, episode: int, warm: bool, video_scraper: VideoScraper):
+    for scraper in video_scraper.scrapers:
+        name = scraper.__class__.__name__
+        fresh_state(warm)
+        anime_id = await timed_async(samples, (name, 'search_anime'), lambda: scraper.search_anime_async(anime))
+        episode_url = anime_id and await timed_async(samples, (name, 'get_episode_url'),
+                                                     lambda: scraper.get_episode_url_async(anime_id, episode))
+        if episode_url:
+            await timed_async(samples, (name, 'extract_video_url'),
+                              lambda: scraper.extract_video_url_async(episode_url))
+        
+        fresh_state(warm)
+        chain = VideoScraper()
+        chain.scrapers = [scraper if warm else type(scraper)()]
+        await timed_async(samples, (name, 'get_video_url'),
+                          lambda: chain_ok_async(chain.get_video_url_async(anime, episode, race=False)))
+        await chain.close_async()
+    await video_scraper.close_async()
+
+
+def measure(anime: str, episodes: List[int], runs: int, use_async: bool, warm: bool, verbose: bool) -> Samples:
+    samples: Samples = {}
+    video_scraper = VideoScraper()
+    for _ in range(runs):
+        for episode in episodes:
+            if not warm:
+                video_scraper = VideoScraper()
+            with quiet(verbose):
+                if use_async:
+                    asyncio.run(run_async(samples, anime, episode, warm, video_scraper))
+                else:
+                    run_sync(samples, anime, episode, warm, video_scraper)
+    return samples
+
+
+def summarize(samples: Samples) -> Dict[str, Dict[str, Dict]]:
+    summary: Dict[str, Dict[str, Dict]] = {}
+    for (provider, stage), values in samples.items():
+        seconds = [value for value, _ in values]
+        summary.setdefault(provider, {})[stage] = {
+            'n': len(values),
+            'ok': sum(ok for _, ok in values),
+            'p50': percentile(seconds, 50),
+            'p95': percentile(seconds, 95),
+        }
+    return summary
+
+
+def regressions(current: Dict, baseline: Dict, threshold: float, noise: float) -> List[str]:
+    """Why current is worse than baseline for this stage (empty when it is not)"""
+    found = []
+    for key in ('p50', 'p95'):
+        before, after = baseline[key], current[key]
+        if after > before * (1 + threshold) and after - before > noise:
+            found.append(f"{key} +{(after / before - 1) * 100 if before else math.inf:.0f}%")
+    if current['ok'] * baseline['n'] < baseline['ok'] * current['n']:
+        found.append(f"ok {current['ok']}/{current['n']} (was {baseline['ok']}/{baseline['n']})")
+    return found
+
+
+def report(summary: Dict, baseline: Optional[Dict], threshold: float, noise: float) -> int:
+    """Print the table; returns the number of regressed stages"""
+    regressed = 0
+    print(f"{'provider':<20} {'stage':<18} {'ok':>7} {'p50 ms':>9} {'p95 ms':>9} {'base p50':>9} {'base p95':>9}  verdict")
+    for provider in sorted(summary):
+        for stage in STAGES:
+            current = summary[provider].get(stage)
+            if current is None:
+                continue
+            base = (baseline or {}).get(provider, {}).get(stage)
+            verdict = ''
+            if base:
+                problems = regressions(current, base, threshold, noise)
+                verdict = 'REGRESSION: ' + ', '.join(problems) if problems else 'ok'
+                regressed += bool(problems)
+            base_p50 = f"{base['p50'] * 1000:.1f}" if base else '-'
+            base_p95 = f"{base['p95'] * 1000:.1f}" if base else '-'
+            print(f"{provider:<20} {stage:<18} {current['ok']:>3}/{current['n']:<3} {current['p50'] * 1000:>9.1f} "
+                  f"{current['p95'] * 1000:>9.1f} {base_p50:>9} {base_p95:>9}  {verdict}")
+    return regressed
+
+
+def record(args):
+    """One live pass over every provider (sync and async paths) with SCRAPER_FIXTURES=record"""
+    fixtures.SCRAPER_FIXTURES = 'record'
+    samples = measure(args.anime, args.episodes, 1, False, False, args.verbose)
+    samples.update({(provider, f"{stage} (async)"): values for (provider, stage), values
+                    in measure(args.anime, args.episodes, 1, True, False, args.verbose).items()})
+    for (provider, stage), values in sorted(samples.items()):
+        print(f"{provider:<20} {stage:<26} {sum(ok for _, ok in values)}/{len(values)} ok")
+    print(f"[INFO] Fixtures saved in {fixtures.SCRAPER_FIXTURE_DIR}")
+
+
+def run(args) -> int:
+    fixtures.SCRAPER_FIXTURES = 'replay'
+    fixtures.SCRAPER_FIXTURE_LATENCY = args.latency
+    
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        baseline = saved['results']
+        settings = saved.get('settings', {})
+        if (settings.get('async'), settings.get('latency'), settings.get('warm')) != (args.use_async, args.latency, args.warm):
+            print(f"[WARNING] Baseline was measured with different settings: {settings}")
+    
+    samples = measure(args.anime, args.episodes, args.runs, args.use_async, args.warm, args.verbose)
+    summary = summarize(samples)
+    print(f"[INFO] {args.runs} runs x {len(args.episodes)} episodes, "
+          f"{'async' if args.use_async else 'sync'} path, latency {args.latency}s per response")
+    regressed = report(summary, baseline, args.threshold, args.noise_ms / 1000)
+    
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'settings': {'anime': args.anime, 'episodes': args.episodes, 'runs': args.runs,
+                             'async': args.use_async, 'warm': args.warm, 'latency': args.latency},
+                'results': summary,
+            }, f, indent=1)
+        print(f"[INFO] Baseline saved to {args.save_baseline}")
+    
+    if regressed:
+        print(f"[WARNING] {regressed} stage(s) regressed")
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers on recorded upstream responses")
+    parser.add_argument('command', choices=['record', 'run'])
+    parser.add_argument('anime', help="Anime name to look up")
+    parser.add_argument('episodes', nargs='+', type=int)
+    parser.add_argument('--fixtures', help="Fixture directory (default SCRAPER_FIXTURE_DIR)")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--latency', default='0', help="Seconds added per replayed response, or 'recorded'")
+    parser.add_argument('--async', dest='use_async', action='store_true', help="Time the *_async methods")
+    parser.add_argument('--warm', action='store_true', help="Keep caches and health stats between runs")
+    parser.add_argument('--baseline', help="Compare with this baseline file")
+    parser.add_argument('--save-baseline', help="Write the results as a baseline file")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown (0.2 = 20%%)")
+    parser.add_argument('--noise-ms', type=float, default=2.0, help="Ignore slowdowns smaller than this")
+    parser.add_argument('--verbose', action='store_true', help="Show the scrapers' output")
+    args = parser.parse_args()
+    
+    if args.fixtures:
+        fixtures.SCRAPER_FIXTURE_DIR = args.fixtures
+    if args.command == 'record':
+        record(args)
+    else:
+        sys.exit(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Video URL scanner benchmark
+Compares the single-pass PatternScanner with the previous approach (one
+re.findall per pattern, first match of the first matching pattern) on
+large embed pages, checking that both find the same URL.
+    
+    python -m benchmarks.url_scanner                   # synthetic embed pages
+    python -m benchmarks.url_scanner embed.html ...    # saved pages
+"""
+import argparse
+import random
+import re
+import statistics
+import string
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from scrapers.gogoanime_scraper import EMBED_VIDEO_PATTERNS, PAGE_VIDEO_PATTERNS
+from scrapers.direct_scraper import JS_VIDEO_PATTERNS, TEXT_VIDEO_PATTERNS
+from scrapers.url_scanner import PatternScanner
+
+
+def _is_video(value: str) -> bool:
+    return 'm3u8' in value or 'mp4' in value
+
+
+SCANNERS: Dict[str, tuple] = {
+    # name: (scanner, accept)
+    'gogo embed': (EMBED_VIDEO_PATTERNS, None),
+    'gogo page': (PAGE_VIDEO_PATTERNS, None),
+    'direct js': (JS_VIDEO_PATTERNS, _is_video),
+    'direct text': (TEXT_VIDEO_PATTERNS, lambda value: value.replace('\\/', '/').startswith('http') and _is_video(value)),
+}
+
+
+def findall_first(scanner: PatternScanner, text: str, accept: Optional[Callable[[str], bool]]) -> Optional[str]:
+    """The previous implementation: every pattern over the whole text in turn"""
+    for pattern in scanner.patterns:
+        matches = re.findall(pattern, text, scanner.flags)
+        if matches and (accept is None or accept(matches[0])):
+            return matches[0]
+    return None
+
+
+SOURCES_BLOCKS = {
+    'json': ('jwplayer("vplayer").setup({"sources": [{"file": '
+             '"https://cdn.example/hls/abc123/master.m3u8?t=xyz"}], "image": "https://cdn.example/poster.jpg"});'),
+    'js': ("jwplayer('vplayer').setup({sources: [{file: 'https:\\/\\/cdn.example\\/hls\\/abc123\\/master.m3u8'}], "
+           "image: 'https://cdn.example/poster.jpg'});"),
+}
+
+
+def embed_page(size: int, position: Optional[float], style: str = 'json', seed: int = 1) -> str:
+    """
+    Player page of about size bytes: minified script noise with the
+    sources block at the given relative position (None = no video at all)
+    """
+    rng = random.Random(seed)
+    words = [''.join(rng.choices(string.ascii_letters, k=rng.randint(3, 10))) for _ in range(500)]
+    chunks = []
+    length = 0
+    while length < size:
+        word = rng.choice(words)
+        chunk = rng.choice([
+            f'var {word}=function(a,b){{return a.{word}(b)}};',
+            f'"{word}":"{rng.choice(words)}",',
+            f'<div class="{word}"><span>{word}</span></div>',
+            f'src="https://static.example/{word}.js" ',
+            f"url: '/api/{word}?t={rng.randint(0, 10 ** 9)}', ",
+        ])
+        chunks.append(chunk)
+        length += len(chunk)
+    
+    if position is not None:
+        chunks.insert(int(len(chunks) * position), SOURCES_BLOCKS[style])
+    return ''.join(chunks)
+
+
+def timed(run: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the video URL scanner")
+    parser.add_argument('pages', nargs='*', help="Saved embed pages (default: synthetic pages)")
+    parser.add_argument('--size', type=int, default=2 * 1024 * 1024, help="Synthetic page size in bytes")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    pages: Dict[str, str] = {
+        path: Path(path).read_text(encoding='utf-8', errors='replace') for path in args.pages
+    }
+    if not pages:
+        for style in SOURCES_BLOCKS:
+            for label, position in [('near start', 0.05), ('at end', 1.0)]:
+                pages[f"{style} {label}"] = embed_page(args.size, position, style)
+        pages['no video'] = embed_page(args.size, None)
+    
+    mismatches = 0
+    print(f"{'page':<20} {'scanner':<12} {'findall ms':>11} {'1-pass ms':>10} {'x':>6}  result")
+    for label, text in pages.items():
+        for name, (scanner, accept) in SCANNERS.items():
+            expected = findall_first(scanner, text, accept)
+            hit = scanner.first(text, accept)
+            found = hit.value if hit else None
+            if found != expected:
+                mismatches += 1
+                print(f"[WARNING] {name} found {found!r}, expected {expected!r}")
+            
+            before = timed(lambda: findall_first(scanner, text, accept), args.repeat)
+            after = timed(lambda: scanner.first(text, accept), args.repeat)
+            print(f"{Path(label).name[:20]:<20} {name:<12} {before * 1000:>11.1f} {after * 1000:>10.1f} "
+                  f"{before / after:>6.1f}  {(found or '-')[:40]}")
+    
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Two-tier cache for resolved video results
+L1: bounded in-process TTL/LRU cache (hot episodes served from memory)
+L2: Redis, shared between workers and restarts (optional)
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from metrics import registry
+
+
+REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+REDIS_DB = int(os.getenv('REDIS_DB', 0))
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+REDIS_HEALTH_INTERVAL = float(os.getenv('REDIS_HEALTH_INTERVAL', 5))  # Seconds between connectivity checks
+
+CACHE_L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', 2048))
+CACHE_L1_TTL = int(os.getenv('CACHE_L1_TTL', 300))  # Upper bound for L1 entries when Redis is used
+
+cache_requests = registry.counter(
+    'cache_requests_total', "Result cache hits, misses and errors by tier and key namespace",
+    ['tier', 'namespace', 'result']
+)
+
+
+def key_namespace(key: str) -> str:
+    """Cache key without its trailing id (onepiece_ep_12 -> onepiece_ep)"""
+    return key.rsplit('_', 1)[0]
+
+
+class TTLCache:
+    """Bounded in-memory cache with a per-entry TTL and LRU eviction"""
+    
+    def __init__(self, max_entries: int = CACHE_L1_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def delete_prefix(self, prefix: str) -> int:
+        """Remove every key starting with prefix, return how many were removed"""
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+    
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisManager:
+    """
+    Async Redis client on a connection pool
+    
+    A background task keeps pinging Redis, so caching is switched off as
+    soon as Redis goes away and back on when it returns - no restart needed.
+    """
+    
+    def __init__(self, host: str = REDIS_HOST, port: int = REDIS_PORT, db: int = REDIS_DB,
+                 max_connections: int = REDIS_MAX_CONNECTIONS, check_interval: float = REDIS_HEALTH_INTERVAL):
+        self.address = f"{host}:{port}/{db}"
+        self.check_interval = check_interval
+        self.pool = aioredis.ConnectionPool(
+            host=host,
+            port=port,
+            db=db,
+            max_connections=max_connections,
+            decode_responses=True,
+            socket_connect_timeout=2,
+            socket_timeout=2
+        )
+        self.client = aioredis.Redis(connection_pool=self.pool)
+        self.available = False
+        self._monitor_task: Optional[asyncio.Task] = None
+    
+    async def _check(self):
+        """Ping Redis and update availability"""
+        try:
+            await self.client.ping()
+            if not self.available:
+                print(f"✅ Redis connected successfully ({self.address})")
+            self.available = True
+        except Exception as e:
+            if self.available or self._monitor_task is None:
+                print(f"⚠️  Redis not available: {e}")
+                print("   Continuing with in-memory caching only...")
+            self.available = False
+    
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self._check()
+    
+    async def start(self):
+        """Initial connectivity check, then keep checking in the background"""
+        await self._check()
+        self._monitor_task = asyncio.create_task(self._monitor())
+    
+    async def stop(self):
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+            try:
+                await self._monitor_task
+            except asyncio.CancelledError:
+                pass
+            self._monitor_task = None
+        await self.pool.disconnect()
+    
+    def report_error(self, error: Exception):
+        """
+        Connection problems switch Redis off right away so requests stop
+        waiting on timeouts; the monitor switches it back on
+        """
+        if isinstance(error, (redis.ConnectionError, redis.TimeoutError)) and self.available:
+            print(f"⚠️  Redis connection lost: {error}")
+            self.available = False
+
+
+class TieredCache:
+    """
+    L1 (in-process) in front of L2 (Redis)
+    Works with L1 only when Redis is not available
+    """
+    
+    def __init__(self, redis_manager: Optional[RedisManager] = None, l1: Optional[TTLCache] = None,
+                 l1_ttl: int = CACHE_L1_TTL):
+        self.redis = redis_manager
+        self.l1 = l1 if l1 is not None else TTLCache()
+        self.l1_ttl = l1_ttl
+        self.counters = {
+            'l1': {'hits': 0, 'misses': 0},
+            'l2': {'hits': 0, 'misses': 0, 'errors': 0},
+        }
+    
+    def _count(self, tier: str, result: str, key: str):
+        self.counters[tier][result] += 1
+        cache_requests.inc(tier=tier, namespace=key_namespace(key), result=result)
+    
+    @property
+    def l2_available(self) -> bool:
+        return self.redis is not None and self.redis.available
+    
+    async def get(self, key: str) -> Optional[Dict]:
+        """Look the key up in L1, then L2 (promoting L2 hits to L1)"""
+        value = self.l1.get(key)
+        if value is not None:
+            self._count('l1', 'hits', key)
+            return value
+        self._count('l1', 'misses', key)
+        
+        if not self.l2_available:
+            return None
+        
+        try:
+            data = await self.redis.client.get(key)
+        except Exception as e:
+            self._count('l2', 'errors', key)
+            self.redis.report_error(e)
+            print(f"Cache read error: {e}")
+            return None
+        
+        if not data:
+            self._count('l2', 'misses', key)
+            return None
+        
+        self._count('l2', 'hits', key)
+        value = json.loads(data)
+        self.l1.set(key, value, self.l1_ttl)
+        return value
+    
+    async def set(self, key: str, value: Dict, ttl: int):
+        """Write through to both tiers"""
+        l2_available = self.l2_available
+        # Without Redis L1 is the only tier, so keep entries for the full TTL
+        self.l1.set(key, value, min(ttl, self.l1_ttl) if l2_available else ttl)
+        
+        if not l2_available:
+            return
+        
+        try:
+            await self.redis.client.setex(key, ttl, json.dumps(value))
+        except Exception as e:
+            self._count('l2', 'errors', key)
+            self.redis.report_error(e)
+            print(f"Cache write error: {e}")
+    
+    async def clear(self, prefix: str) -> int:
+        """Remove every key starting with prefix from both tiers"""
+        removed = self.l1.delete_prefix(prefix)
+        
+        if self.l2_available:
+            # SCAN instead of KEYS so Redis is not blocked on large keyspaces
+            keys = [key async for key in self.redis.client.scan_iter(match=f"{prefix}*", count=500)]
+            if keys:
+                await self.redis.client.delete(*keys)
+            removed = max(removed, len(keys))
+        
+        return removed
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters per tier"""
+        return {
+            'l1': {**self.counters['l1'], 'size': len(self.l1), 'max_size': self.l1.max_entries},
+            'l2': {**self.counters['l2'], 'enabled': self.l2_available},
+        }
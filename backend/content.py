@@ -0,0 +1,72 @@
+"""
+One Piece content catalogue
+Maps content IDs (episodes, movies, specials) to search queries and
+cache keys; shared by the API and the cache warmer
+"""
+from typing import Tuple
+
+
+MAX_EPISODE = 1200
+
+# Map movie IDs to searchable names
+MOVIE_NAMES = {
+    1: "One Piece The Movie",
+    2: "One Piece Clockwork Island Adventure",
+    3: "One Piece Chopper's Kingdom",
+    4: "One Piece Dead End Adventure",
+    5: "One Piece Curse of the Sacred Sword",
+    6: "One Piece Baron Omatsuri",
+    7: "One Piece Giant Mechanical Soldier",
+    8: "One Piece Episode of Alabasta",
+    9: "One Piece Episode of Chopper Plus",
+    10: "One Piece Strong World",
+    11: "One Piece 3D Straw Hat Chase",
+    12: "One Piece Film Z",
+    13: "One Piece Film Gold",
+    14: "One Piece Stampede",
+    15: "One Piece Film Red"
+}
+
+# Map special IDs to searchable names
+SPECIAL_NAMES = {
+    1: "One Piece Romance Dawn Story",
+    2: "One Piece Episode of Nami",
+    3: "One Piece Episode of Luffy",
+    4: "One Piece Episode of Merry",
+    5: "One Piece 3D2Y",
+    6: "One Piece Episode of Sabo",
+    7: "One Piece Heart of Gold",
+    8: "One Piece Episode of East Blue",
+    9: "One Piece Episode of Skypiea",
+    10: "One Piece Defeat Him The Pirate Ganzack"
+}
+
+
+def parse_content_id(content_id: str) -> Tuple[str, str, int]:
+    """
+    Parse a content ID ("1", "movie-10", "special-5")
+    Returns (content_type, search_query, episode_num)
+    Raises ValueError for malformed IDs
+    """
+    if content_id.startswith("movie-"):
+        movie_id = int(content_id.replace("movie-", ""))
+        search_query = MOVIE_NAMES.get(movie_id, f"One Piece Movie {movie_id}")
+        return "movie", search_query, 1  # Movies are typically single episodes
+    
+    if content_id.startswith("special-"):
+        special_id = int(content_id.replace("special-", ""))
+        search_query = SPECIAL_NAMES.get(special_id, f"One Piece Special {special_id}")
+        return "special", search_query, 1  # Specials are typically single episodes
+    
+    # Regular episode
+    return "episode", "One Piece", int(content_id)
+
+
+def episode_cache_key(episode_num: int) -> str:
+    """Cache key used by /api/episode/{n}/video"""
+    return f"onepiece_ep_{episode_num}"
+
+
+def content_cache_key(content_type: str, content_id: str) -> str:
+    """Cache key used by /api/content/{content_id}/video"""
+    return f"onepiece_{content_type}_{content_id}"
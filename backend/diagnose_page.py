@@ -2,8 +2,8 @@
 Diagnostic script to see what's actually on the anime page
 """
 import requests
-from bs4 import BeautifulSoup
 import cloudscraper
+from scrapers.html_parser import html_parser
 
 def diagnose_page(url):
     """Fetch page and show its structure"""
@@ -23,38 +23,33 @@ def diagnose_page(url):
             print(f"❌ Page returned {response.status_code}")
             return
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        print(f"🧩 HTML parser: {html_parser.name}\n")
         
         # Check for iframes
-        iframes = soup.find_all('iframe')
-        print(f"📺 Iframes found: {len(iframes)}")
-        for i, iframe in enumerate(iframes, 1):
-            src = iframe.get('src', 'No src')
+        iframes = html_parser.attr_values(response.text, 'iframe', 'src')
+        print(f"📺 Iframes with src found: {len(iframes)}")
+        for i, src in enumerate(iframes, 1):
             print(f"  {i}. {src[:80]}...")
         
         # Check for video tags
-        videos = soup.find_all('video')
-        print(f"\n🎥 Video tags found: {len(videos)}")
-        for i, video in enumerate(videos, 1):
-            src = video.get('src', 'No src')
-            print(f"  {i}. {src[:80] if src else 'No direct src'}...")
+        videos = html_parser.attr_values(response.text, 'video', 'src')
+        print(f"\n🎥 Video tags with src found: {len(videos)}")
+        for i, src in enumerate(videos, 1):
+            print(f"  {i}. {src[:80]}...")
         
         # Check for source tags
-        sources = soup.find_all('source')
-        print(f"\n📡 Source tags found: {len(sources)}")
-        for i, source in enumerate(sources, 1):
-            src = source.get('src', 'No src')
+        sources = html_parser.attr_values(response.text, 'source', 'src')
+        print(f"\n📡 Source tags with src found: {len(sources)}")
+        for i, src in enumerate(sources, 1):
             print(f"  {i}. {src[:80]}...")
         
         # Check for common video player divs
-        player_divs = soup.find_all(['div', 'section'], class_=lambda x: x and any(
-            keyword in str(x).lower() for keyword in ['player', 'video', 'stream', 'embed']
-        ))
+        player_divs = html_parser.containers(
+            response.text, ['div', 'section'], ['player', 'video', 'stream', 'embed']
+        )
         print(f"\n🎬 Player containers found: {len(player_divs)}")
-        for i, div in enumerate(player_divs[:5], 1):
-            classes = div.get('class', [])
-            id_attr = div.get('id', 'no-id')
-            print(f"  {i}. class='{' '.join(classes) if classes else 'none'}', id='{id_attr}'")
+        for i, (classes, id_attr) in enumerate(player_divs[:5], 1):
+            print(f"  {i}. class='{' '.join(classes) if classes else 'none'}', id='{id_attr or 'no-id'}'")
         
         # Look for m3u8 URLs in page source
         import re
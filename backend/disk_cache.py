@@ -0,0 +1,459 @@
+"""
+On-disk cache for proxied video bytes
+Stores what the proxy streams (whole files, HLS segments and byte-range
+spans) keyed by upstream URL and byte span, evicts least recently used
+spans once the total size is over the limit, and serves hits straight
+from the file.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.responses import Response
+
+
+PROXY_DISK_CACHE_DIR = os.getenv(
+    'PROXY_DISK_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.video_cache')
+)
+PROXY_DISK_CACHE_MAX_BYTES = int(os.getenv('PROXY_DISK_CACHE_MAX_BYTES', 10 * 1024 ** 3))  # 0 = off
+PROXY_DISK_CACHE_MAX_OBJECT = int(os.getenv('PROXY_DISK_CACHE_MAX_OBJECT', 1024 ** 3))     # Bytes per span
+PROXY_DISK_CACHE_MIN_SPAN = int(os.getenv('PROXY_DISK_CACHE_MIN_SPAN', 1024 ** 2))         # Smaller partial downloads are dropped
+PROXY_DISK_CACHE_WRITE_BUFFER = int(os.getenv('PROXY_DISK_CACHE_WRITE_BUFFER', 1024 ** 2))      # Bytes collected per disk write
+PROXY_DISK_CACHE_WRITE_BACKLOG = int(os.getenv('PROXY_DISK_CACHE_WRITE_BACKLOG', 16 * 1024 ** 2))  # Unwritten bytes before a download stops being cached
+FILE_CHUNK_SIZE = 256 * 1024
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+CONTENT_RANGE_PATTERN = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+def parse_range(range_header: Optional[str]) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """
+    "bytes=a-b" -> (a, b), "bytes=a-" -> (a, None), "bytes=-n" -> (None, n)
+    None for anything else (multiple ranges are not cached)
+    """
+    match = RANGE_PATTERN.match((range_header or '').strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.groups()
+    return (int(start) if start else None), (int(end) if end else None)
+
+
+class Span:
+    """Bytes [start, end] of one upstream resource, stored in one file"""
+    
+    def __init__(self, url: str, start: int, end: int, total: Optional[int], content_type: str, path: str):
+        self.url = url
+        self.start = start
+        self.end = end          # Inclusive
+        self.total = total      # Size of the whole resource, None if unknown
+        self.content_type = content_type
+        self.path = path
+    
+    @property
+    def size(self) -> int:
+        return self.end - self.start + 1
+    
+    @property
+    def key(self) -> str:
+        return self.path
+    
+    def meta(self) -> Dict:
+        return {'url': self.url, 'start': self.start, 'end': self.end,
+                'total': self.total, 'content_type': self.content_type}
+
+
+class CachedSlice:
+    """Part of a span answering one request"""
+    
+    def __init__(self, span: Span, start: int, end: int, partial: bool):
+        self.span = span
+        self.start = start
+        self.end = end
+        self.partial = partial  # 206 (Content-Range) instead of 200
+    
+    def response(self, headers: Dict[str, str]) -> "FileSliceResponse":
+        headers = {**headers, 'Content-Length': str(self.end - self.start + 1)}
+        if self.partial:
+            total = self.span.total if self.span.total is not None else '*'
+            headers['Content-Range'] = f"bytes {self.start}-{self.end}/{total}"
+        return FileSliceResponse(
+            self.span.path,
+            offset=self.start - self.span.start,
+            length=self.end - self.start + 1,
+            status_code=206 if self.partial else 200,
+            headers=headers,
+            media_type=self.span.content_type,
+        )
+
+
+class FileSliceResponse(Response):
+    """
+    Serves a byte slice of a cached file
+    Whole files go out through the ASGI pathsend extension when the server
+    offers it (zero-copy sendfile); otherwise the slice is read with
+    os.pread in worker threads, so a cold page cache never blocks the
+    event loop.
+    """
+    
+    def __init__(self, path: str, offset: int, length: int, status_code: int,
+                 headers: Dict[str, str], media_type: str):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+    
+    async def __call__(self, scope, receive, send):
+        # Opened before the headers go out, so a span evicted in the
+        # meantime fails the request cleanly instead of truncating it
+        fd = await asyncio.to_thread(os.open, self.path, os.O_RDONLY)
+        try:
+            await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+            
+            if scope.get('method') == 'HEAD':
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+                return
+            
+            whole_file = self.offset == 0 and self.length == os.fstat(fd).st_size
+            if whole_file and 'http.response.pathsend' in scope.get('extensions', {}):
+                await send({'type': 'http.response.pathsend', 'path': self.path})
+                return
+            
+            position = self.offset
+            end = self.offset + self.length
+            while position < end:
+                chunk = await asyncio.to_thread(os.pread, fd, min(FILE_CHUNK_SIZE, end - position), position)
+                if not chunk:
+                    raise OSError(f"{self.path} is shorter than its span")
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                position += len(chunk)
+        finally:
+            os.close(fd)
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+class SpanWriter:
+    """
+    Tees a proxied upstream body into the cache
+    Whatever arrived contiguously is kept when the client goes away early
+    (at least PROXY_DISK_CACHE_MIN_SPAN bytes), the rest when it completes
+    
+    Chunks are collected in memory and written in PROXY_DISK_CACHE_WRITE_BUFFER
+    blocks on the cache's I/O thread, so the event loop never waits on the
+    disk. A writer whose blocks pile up (disk slower than the stream) stops
+    caching instead of holding the body in memory.
+    """
+    
+    def __init__(self, cache: "DiskCache", url: str, start: int, total: Optional[int], content_type: str):
+        self.cache = cache
+        self.url = url
+        self.start = start
+        self.total = total
+        self.content_type = content_type
+        self.written = 0
+        self.tmp_path = os.path.join(cache.directory, f"{cache.file_name(url, start)}.{os.getpid()}.{id(self)}.part")
+        self.closed = False
+        self._buffer = bytearray()
+        self._pending: Deque[Future] = deque()
+        # Only touched on the I/O thread
+        self._file = None
+        self._failed = False
+    
+    def write(self, chunk: bytes):
+        if self.closed:
+            return
+        if self.written + len(self._buffer) + len(chunk) > PROXY_DISK_CACHE_MAX_OBJECT:
+            self.close(completed=False)  # Keep what fits
+            return
+        self._buffer += chunk
+        if len(self._buffer) < PROXY_DISK_CACHE_WRITE_BUFFER:
+            return
+        while self._pending and self._pending[0].done():
+            self._pending.popleft()
+        if len(self._pending) * PROXY_DISK_CACHE_WRITE_BUFFER >= PROXY_DISK_CACHE_WRITE_BACKLOG:
+            self.close(completed=False)  # Disk cannot keep up
+            return
+        self._pending.append(self.cache.submit(self._write_block, bytes(self._buffer)))
+        self.written += len(self._buffer)
+        self._buffer.clear()
+    
+    def close(self, completed: bool):
+        if self.closed:
+            return
+        self.closed = True
+        data = bytes(self._buffer)
+        self.written += len(data)
+        self._buffer = bytearray()
+        keep = self.written and (completed or self.written >= PROXY_DISK_CACHE_MIN_SPAN)
+        total = self.total
+        if keep and completed and self.start == 0 and total is None:
+            total = self.written  # 200 without Content-Length: now we know
+        span = self.cache.span(self.url, self.start, self.start + self.written - 1, total, self.content_type)
+        stored = asyncio.wrap_future(self.cache.submit(self._finish, data, span if keep else None))
+        stored.add_done_callback(self.cache.stored)
+    
+    def _write_block(self, data: bytes):
+        """Runs on the I/O thread"""
+        if self._failed:
+            return
+        try:
+            if self._file is None:
+                os.makedirs(self.cache.directory, exist_ok=True)
+                self._file = open(self.tmp_path, 'wb')
+            self._file.write(data)
+        except OSError as e:
+            print(f"[WARNING] Video disk cache unavailable: {e}")
+            self._failed = True
+    
+    def _finish(self, data: bytes, span: Optional[Span]) -> Optional[Span]:
+        """Runs on the I/O thread: the finished .bin/.json pair, or None when nothing is kept"""
+        if span is not None and data:
+            self._write_block(data)
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                self._failed = True
+            self._file = None
+        if span is None or self._failed:
+            _remove(self.tmp_path)
+            return None
+        try:
+            with open(f"{span.path[:-4]}.json", 'w', encoding='utf-8') as f:
+                json.dump(span.meta(), f)
+            os.replace(self.tmp_path, span.path)
+        except OSError as e:
+            print(f"[WARNING] Could not store video span: {e}")
+            _remove(self.tmp_path)
+            return None
+        return span
+
+
+class DiskCache:
+    """LRU (by total bytes) index of spans stored under `directory`"""
+    
+    def __init__(self, directory: str = PROXY_DISK_CACHE_DIR, max_bytes: int = PROXY_DISK_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._spans: "OrderedDict[str, Span]" = OrderedDict()
+        self._by_url: Dict[str, List[Span]] = {}
+        self.total_bytes = 0
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix='video-disk-cache')
+        self.counters = {'hits': 0, 'misses': 0, 'bytes_served': 0, 'stored': 0, 'evicted': 0}
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+    
+    def file_name(self, url: str, start: int) -> str:
+        return f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:24]}-{start}"
+    
+    def load(self):
+        """Index spans left by a previous run (least recently used first)"""
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.part'):
+                _remove(path)  # Interrupted download
+                continue
+            if not name.endswith('.bin'):
+                continue
+            try:
+                with open(f"{path[:-4]}.json", 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                span = Span(meta['url'], meta['start'], meta['end'], meta['total'], meta['content_type'], path)
+                if os.path.getsize(path) != span.size:
+                    raise ValueError("size mismatch")
+                found.append((os.path.getmtime(path), span))
+            except (OSError, ValueError, KeyError):
+                _remove(path)
+                _remove(f"{path[:-4]}.json")
+        for _, span in sorted(found, key=lambda item: item[0]):
+            self._add(span)
+        self._evict()
+        if found:
+            print(f"[INFO] Video disk cache: {len(self._spans)} spans, {self.total_bytes / 1024 ** 2:.0f} MB")
+    
+    def lookup(self, url: str, range_header: Optional[str]) -> Optional[CachedSlice]:
+        """Cached bytes answering the request, or None"""
+        if not self.enabled:
+            return None
+        spans = self._by_url.get(url)
+        if not spans:
+            self.counters['misses'] += 1
+            return None
+        
+        found = self._find(spans, range_header)
+        if found is None:
+            self.counters['misses'] += 1
+            return None
+        
+        self._spans.move_to_end(found.span.key)
+        self.submit(_touch, found.span.path)  # Keeps the LRU order across restarts
+        self.counters['hits'] += 1
+        self.counters['bytes_served'] += found.end - found.start + 1
+        return found
+    
+    def _find(self, spans: List[Span], range_header: Optional[str]) -> Optional[CachedSlice]:
+        if not range_header:
+            # Whole resource
+            for span in spans:
+                if span.start == 0 and span.total is not None and span.end == span.total - 1:
+                    return CachedSlice(span, 0, span.end, partial=False)
+            return None
+        
+        requested = parse_range(range_header)
+        if requested is None:
+            return None
+        start, end = requested
+        
+        for span in spans:
+            if start is None:
+                # Suffix range: last `end` bytes
+                if span.total is None or span.end != span.total - 1:
+                    continue
+                first = max(0, span.total - end)
+                if span.start <= first:
+                    return CachedSlice(span, first, span.end, partial=True)
+                continue
+            if not span.start <= start <= span.end:
+                continue
+            if end is not None:
+                if end <= span.end:
+                    return CachedSlice(span, start, end, partial=True)
+                continue
+            # Open-ended: answer with what is cached from `start`; players
+            # ask for the rest with a follow-up range request
+            if span.end - start + 1 >= PROXY_DISK_CACHE_MIN_SPAN or (span.total is not None and span.end == span.total - 1):
+                return CachedSlice(span, start, span.end, partial=True)
+        return None
+    
+    def writer(self, url: str, status: int, headers) -> Optional[SpanWriter]:
+        """SpanWriter for a proxied upstream response, None if it is not cacheable"""
+        if not self.enabled:
+            return None
+        content_type = headers.get('content-type', 'video/mp4')
+        if status == 200:
+            length = headers.get('content-length')
+            total = int(length) if length and length.isdigit() else None
+            start = 0
+        elif status == 206:
+            match = CONTENT_RANGE_PATTERN.match(headers.get('content-range', ''))
+            if not match:
+                return None
+            start = int(match.group(1))
+            total = int(match.group(3)) if match.group(3) != '*' else None
+        else:
+            return None
+        
+        # Already stored from here to the end (e.g. a concurrent download finished first)
+        for span in self._by_url.get(url, []):
+            if span.start <= start and span.total is not None and span.end == span.total - 1:
+                return None
+        
+        return SpanWriter(self, url, start, total, content_type)
+    
+    def span(self, url: str, start: int, end: int, total: Optional[int], content_type: str) -> Span:
+        base = os.path.join(self.directory, f"{self.file_name(url, start)}-{end}")
+        return Span(url, start, end, total, content_type, f"{base}.bin")
+    
+    def submit(self, fn, *args) -> Future:
+        """Run fn on the I/O thread (jobs run one at a time, in order)"""
+        try:
+            return self._io.submit(fn, *args)
+        except RuntimeError:
+            # Shut down: the job is dropped
+            future = Future()
+            future.cancel()
+            return future
+    
+    def stored(self, future: "asyncio.Future[Optional[Span]]"):
+        """Index a span the I/O thread finished writing (called on the event loop)"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        span = future.result()
+        if span is None:
+            return
+        
+        for existing in self._by_url.get(span.url, []):
+            if existing.start <= span.start and existing.end >= span.end:
+                if existing.path != span.path:
+                    self._remove_files(span)  # Nothing new
+                return
+        
+        # Spans inside the new one are redundant now
+        for existing in list(self._by_url.get(span.url, [])):
+            if span.start <= existing.start and existing.end <= span.end:
+                self._drop(existing)
+        
+        self._add(span)
+        self.counters['stored'] += 1
+        self._evict()
+    
+    def close(self):
+        """Wait for queued writes (call on application shutdown); they are indexed by the next load()"""
+        self._io.shutdown(wait=True)
+    
+    def _add(self, span: Span):
+        self._spans[span.key] = span
+        self._by_url.setdefault(span.url, []).append(span)
+        self.total_bytes += span.size
+    
+    def _drop(self, span: Span):
+        if self._spans.pop(span.key, None) is None:
+            return
+        spans = self._by_url.get(span.url, [])
+        if span in spans:
+            spans.remove(span)
+        if not spans:
+            self._by_url.pop(span.url, None)
+        self.total_bytes -= span.size
+        self._remove_files(span)
+    
+    def _remove_files(self, span: Span):
+        self.submit(_remove, span.path)
+        self.submit(_remove, f"{span.path[:-4]}.json")
+    
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._spans:
+            _, span = next(iter(self._spans.items()))
+            self._drop(span)
+            self.counters['evicted'] += 1
+    
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            'enabled': self.enabled,
+            'spans': len(self._spans),
+            'size_mb': round(self.total_bytes / 1024 ** 2, 1),
+            'max_size_mb': round(self.max_bytes / 1024 ** 2, 1),
+        }
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _touch(path: str):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# Shared instance
+disk_cache = DiskCache()
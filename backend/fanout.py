@@ -0,0 +1,315 @@
+"""
+Upstream fan-out for the video proxy
+Concurrent viewers of the same source share one upstream transfer: the
+transfer writes into a ring buffer and every viewer whose range starts
+inside (or just ahead of) the buffered window reads from it. While a
+transfer has a single viewer the buffer only holds one chunk, so the
+body is streamed straight through; it grows to PROXY_FANOUT_BUFFER when
+a second viewer joins. A viewer that falls too far behind the others is
+detached and continues on its own upstream connection, so one paused
+viewer never stalls the rest; the last viewer is never detached.
+"""
+import asyncio
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+from disk_cache import parse_range, CONTENT_RANGE_PATTERN
+from proxy import PROXY_CHUNK_SIZE, UpstreamClient, proxy_bytes, stream_body
+
+
+PROXY_FANOUT = os.getenv('PROXY_FANOUT', 'true').lower() in ('1', 'true', 'yes')
+PROXY_FANOUT_BUFFER = int(os.getenv('PROXY_FANOUT_BUFFER', 8 * 1024 ** 2))        # Ring buffer per shared transfer
+PROXY_FANOUT_JOIN_AHEAD = int(os.getenv('PROXY_FANOUT_JOIN_AHEAD', 2 * 1024 ** 2))  # Join if the range starts this far ahead
+PROXY_FANOUT_LAG_TIMEOUT = float(os.getenv('PROXY_FANOUT_LAG_TIMEOUT', 5))         # Seconds a slow viewer may hold the transfer
+
+
+class RingBuffer:
+    """Fixed-size window over an absolute byte stream: [tail, head)"""
+    
+    def __init__(self, start: int, capacity: int):
+        self.capacity = capacity
+        self.head = start  # Absolute offset of the next byte written
+        self._start = start
+        self._buffer = bytearray(capacity)
+    
+    @property
+    def tail(self) -> int:
+        """Lowest absolute offset still held"""
+        return max(self._start, self.head - self.capacity)
+    
+    def write(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            index = self.head % self.capacity
+            count = min(len(view), self.capacity - index)
+            self._buffer[index:index + count] = view[:count]
+            self.head += count
+            view = view[count:]
+    
+    def grow(self, capacity: int):
+        """Move what is held into a larger buffer"""
+        if capacity <= self.capacity:
+            return
+        tail = self.tail
+        held = self.read(tail, self.head - tail)
+        self.capacity = capacity
+        self._buffer = bytearray(capacity)
+        self._start = self.head = tail
+        self.write(held)
+    
+    def read(self, position: int, size: int) -> bytes:
+        """Up to size bytes from position (must be within [tail, head))"""
+        size = min(size, self.head - position)
+        index = position % self.capacity
+        first = min(size, self.capacity - index)
+        if first == size:
+            return bytes(self._buffer[index:index + size])
+        return bytes(self._buffer[index:index + first]) + bytes(self._buffer[:size - first])
+
+
+class Reader:
+    def __init__(self, position: int):
+        self.position = position
+        self.detached = False
+
+
+class SharedTransfer:
+    """One upstream response, read once and fanned out to every attached reader"""
+    
+    def __init__(self, fanout: "FanOut", url: str, response: aiohttp.ClientResponse,
+                 start: int, end: Optional[int], total: Optional[int], sink=None):
+        self.fanout = fanout
+        self.url = url
+        self.start = start
+        self.end = end          # Inclusive, None while unknown (no Content-Length)
+        self.total = total
+        self.content_type = response.headers.get('content-type', 'video/mp4')
+        # One chunk while there is a single viewer (see add_reader)
+        self.buffer = RingBuffer(start, PROXY_CHUNK_SIZE)
+        self.readers: List[Reader] = []
+        self.done = False
+        self.closing = False
+        self.error: Optional[BaseException] = None
+        self._response = response
+        self._sink = sink
+        self._changed = asyncio.Condition()
+        self._task = asyncio.create_task(self._pump())
+    
+    def can_serve(self, start: int, end: Optional[int]) -> bool:
+        if self.done or self.closing or self.total is None or self.end is None:
+            return False
+        if not self.buffer.tail <= start <= self.buffer.head + PROXY_FANOUT_JOIN_AHEAD:
+            return False
+        return end is None or end <= self.end
+    
+    async def _pump(self):
+        completed = False
+        try:
+            async for chunk in self._response.content.iter_chunked(PROXY_CHUNK_SIZE):
+                proxy_bytes.inc(len(chunk), direction='received')
+                await self._make_room(len(chunk))
+                async with self._changed:
+                    self.buffer.write(chunk)
+                    self._changed.notify_all()
+                if self._sink is not None:
+                    self._sink.write(chunk)
+            completed = True
+        except asyncio.CancelledError:
+            self.error = ConnectionAbortedError("Shared transfer stopped")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            if self._sink is not None:
+                self._sink.close(completed)
+            if completed:
+                self._response.release()
+            else:
+                self._response.close()
+            self.fanout._remove(self)
+            async with self._changed:
+                self._changed.notify_all()
+    
+    async def _make_room(self, size: int):
+        """
+        Backpressure: wait until the slowest reader has consumed enough to
+        write size more bytes. Readers lagging past the timeout are detached,
+        except the one furthest ahead: a single viewer may pause as long as
+        it likes without losing the upstream connection.
+        """
+        async with self._changed:
+            def has_room():
+                attached = [reader.position for reader in self.readers if not reader.detached]
+                return not attached or self.buffer.head + size - min(attached) <= self.buffer.capacity
+            while not has_room():
+                if len(self.readers) <= 1:
+                    await self._changed.wait()
+                    continue
+                try:
+                    await asyncio.wait_for(self._changed.wait_for(has_room), PROXY_FANOUT_LAG_TIMEOUT)
+                except asyncio.TimeoutError:
+                    leader = max(self.readers, key=lambda reader: reader.position)
+                    for reader in list(self.readers):
+                        if reader is not leader and self.buffer.head + size - reader.position > self.buffer.capacity:
+                            reader.detached = True
+                            self.readers.remove(reader)
+                            self.fanout.counters['detached'] += 1
+                    self._changed.notify_all()
+        if not self.readers:
+            # Everybody left - stop downloading
+            self._stop()
+    
+    def _stop(self):
+        self.closing = True
+        self._task.cancel()
+    
+    def add_reader(self, start: int) -> Reader:
+        if self.readers:
+            # Shared from now on: room for viewers at different positions
+            self.buffer.grow(PROXY_FANOUT_BUFFER)
+        reader = Reader(start)
+        self.readers.append(reader)
+        return reader
+    
+    async def read(self, reader: Reader, end: Optional[int]) -> AsyncIterator[bytes]:
+        """Bytes from the reader's position to end (None = to the end of the transfer)"""
+        try:
+            while end is None or reader.position <= end:
+                async with self._changed:
+                    await self._changed.wait_for(
+                        lambda: self.buffer.head > reader.position or self.done or reader.detached
+                    )
+                    if reader.detached or reader.position < self.buffer.tail:
+                        break
+                    if self.buffer.head <= reader.position:
+                        # Transfer finished (or failed) before reaching us
+                        if self.error is not None and (end is None or reader.position <= end):
+                            break
+                        return
+                    stop = self.buffer.head if end is None else min(self.buffer.head, end + 1)
+                    chunk = self.buffer.read(reader.position, min(PROXY_CHUNK_SIZE, stop - reader.position))
+                    reader.position += len(chunk)
+                    self._changed.notify_all()
+                yield chunk
+            else:
+                return
+        finally:
+            if reader in self.readers:
+                self.readers.remove(reader)
+            if not self.readers and not self.done:
+                # Nobody is watching any more - stop downloading
+                self._stop()
+        
+        # Detached or the shared transfer failed: continue on our own connection
+        async for chunk in self.fanout.fetch_rest(self.url, reader.position, end):
+            yield chunk
+
+
+class Subscription:
+    """What one proxied request streams: status, headers and body"""
+    
+    def __init__(self, transfer: SharedTransfer, start: int, end: Optional[int], status: int,
+                 headers: Dict[str, str]):
+        self.transfer = transfer
+        self.end = end
+        self.status = status
+        self.headers = headers
+        # Registered right away so the transfer does not run past our start
+        self.reader = transfer.add_reader(start)
+    
+    @property
+    def content_type(self) -> str:
+        return self.transfer.content_type
+    
+    def body(self) -> AsyncIterator[bytes]:
+        return self.transfer.read(self.reader, self.end)
+
+
+class FanOut:
+    """Registry of in-flight upstream transfers by URL"""
+    
+    def __init__(self, client: UpstreamClient, enabled: bool = PROXY_FANOUT):
+        self.client = client
+        self.enabled = enabled
+        self._transfers: Dict[str, List[SharedTransfer]] = {}
+        self.counters = {'started': 0, 'joined': 0, 'detached': 0}
+    
+    def attach(self, url: str, range_header: Optional[str]) -> Optional[Subscription]:
+        """Join an in-flight transfer covering the request, None if there is none"""
+        if not self.enabled:
+            return None
+        for transfer in self._transfers.get(url, []):
+            if range_header:
+                requested = parse_range(range_header)
+                if requested is None or requested[0] is None:
+                    return None  # Multiple or suffix ranges
+                start, end = requested
+                if not transfer.can_serve(start, end):
+                    continue
+                end = transfer.end if end is None else end
+                status = 206
+                headers = {'Content-Range': f"bytes {start}-{end}/{transfer.total}"}
+            else:
+                if not transfer.can_serve(0, transfer.total - 1 if transfer.total else None):
+                    continue
+                start, end = 0, transfer.total - 1
+                status = 200
+                headers = {'Content-Length': str(transfer.total)}
+            self.counters['joined'] += 1
+            return Subscription(transfer, start, end, status, headers)
+        return None
+    
+    def start(self, url: str, response: aiohttp.ClientResponse, sink=None) -> Subscription:
+        """Share a freshly opened upstream response (status 200 or 206)"""
+        headers = {}
+        content_length = response.headers.get('content-length')
+        content_range = response.headers.get('content-range')
+        length = int(content_length) if content_length and content_length.isdigit() else None
+        
+        start, end, total = 0, None, None
+        match = CONTENT_RANGE_PATTERN.match(content_range or '')
+        if response.status == 206 and match:
+            start, end = int(match.group(1)), int(match.group(2))
+            total = int(match.group(3)) if match.group(3) != '*' else None
+        elif response.status == 200 and length is not None:
+            end, total = length - 1, length
+        
+        # Same headers the proxy always sent for this response
+        if content_length and response.status == 200:
+            headers['Content-Length'] = content_length
+        if content_range:
+            headers['Content-Range'] = content_range
+        
+        transfer = SharedTransfer(self, url, response, start, end, total, sink)
+        if self.enabled:
+            self._transfers.setdefault(url, []).append(transfer)
+        self.counters['started'] += 1
+        return Subscription(transfer, start, end, response.status, headers)
+    
+    def _remove(self, transfer: SharedTransfer):
+        transfers = self._transfers.get(transfer.url, [])
+        if transfer in transfers:
+            transfers.remove(transfer)
+        if not transfers:
+            self._transfers.pop(transfer.url, None)
+    
+    async def fetch_rest(self, url: str, start: int, end: Optional[int]) -> AsyncIterator[bytes]:
+        """Own upstream connection for a reader that left the shared transfer"""
+        response = await self.client.open(url, {'Range': f"bytes={start}-{'' if end is None else end}"})
+        if response.status != 206:
+            response.close()
+            raise aiohttp.ClientPayloadError(f"Upstream answered {response.status} to a resumed range request")
+        async for chunk in stream_body(response):
+            yield chunk
+    
+    def stats(self) -> Dict:
+        transfers = [transfer for transfers in self._transfers.values() for transfer in transfers]
+        return {
+            **self.counters,
+            'enabled': self.enabled,
+            'transfers': len(transfers),
+            'viewers': sum(len(transfer.readers) for transfer in transfers),
+        }
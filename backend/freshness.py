@@ -0,0 +1,130 @@
+"""
+Expiry-aware cache lifetimes for resolved video results
+Each result is cached only as long as its links stay playable (expiry
+hints in the URLs, else the provider's known URL lifetime) and is served
+stale-while-revalidate: past `fresh_until` it is still returned, but a
+background refresh is started; past `expires_at` it is never returned.
+Failed lookups are cached briefly (negative caching), with a shorter
+lifetime when providers were erroring than when the video was not found.
+"""
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+CACHE_DURATION = int(os.getenv('CACHE_DURATION', 3600))     # Lifetime when nothing better is known
+CACHE_MAX_TTL = int(os.getenv('CACHE_MAX_TTL', 86400))      # Upper bound for any entry
+CACHE_MIN_TTL = int(os.getenv('CACHE_MIN_TTL', 60))         # Links dying sooner are not cached
+CACHE_EXPIRY_MARGIN = int(os.getenv('CACHE_EXPIRY_MARGIN', 300))  # Keep links at least this long playable after serving
+CACHE_FRESH_FRACTION = float(os.getenv('CACHE_FRESH_FRACTION', 0.75))  # Part of the TTL served without refreshing
+CACHE_NOT_FOUND_TTL = int(os.getenv('CACHE_NOT_FOUND_TTL', 300))   # Failed lookup, every provider answered
+CACHE_ERROR_TTL = int(os.getenv('CACHE_ERROR_TTL', 30))            # Failed lookup with provider errors
+
+# Query parameters holding an absolute unix expiry time
+EXPIRY_PARAMS = ('expires', 'expire', 'expiry', 'exp', 'e', 'validto', 'valid_to', 'deadline')
+# Akamai style tokens ("exp=1700000000~acl=...") in a parameter or the path
+TOKEN_EXPIRY_PATTERN = re.compile(r'(?:^|[~&/,=])exp=(\d{10})(?:\D|$)')
+
+
+def _timestamp(value: str) -> Optional[float]:
+    """Unix seconds (or milliseconds) -> seconds; None for anything else"""
+    if not value.isdigit():
+        return None
+    number = int(value)
+    if len(value) == 13:
+        number //= 1000
+    # Only accept plausible absolute times (2001 .. 2286)
+    return float(number) if 1_000_000_000 <= number < 10_000_000_000 else None
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """Unix time the URL stops working, from hints in the URL itself"""
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None
+    params = {key.lower(): values[-1] for key, values in parse_qs(parsed.query).items() if values}
+    
+    # S3 / GCS presigned URLs: signing time + lifetime
+    if 'x-amz-date' in params and params.get('x-amz-expires', '').isdigit():
+        try:
+            signed = datetime.strptime(params['x-amz-date'], '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+            return signed.timestamp() + int(params['x-amz-expires'])
+        except ValueError:
+            pass
+    if 'x-goog-date' in params and params.get('x-goog-expires', '').isdigit():
+        try:
+            signed = datetime.strptime(params['x-goog-date'], '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+            return signed.timestamp() + int(params['x-goog-expires'])
+        except ValueError:
+            pass
+    
+    for name in EXPIRY_PARAMS:
+        expiry = _timestamp(params.get(name, ''))
+        if expiry is not None:
+            return expiry
+    
+    match = TOKEN_EXPIRY_PATTERN.search(f"{parsed.path}&{parsed.query}")
+    if match:
+        return _timestamp(match.group(1))
+    return None
+
+
+def _video_urls(result: Dict) -> Iterable[str]:
+    """Every link the result hands out: its video_urls and its alternates"""
+    for value in (result.get('video_urls') or {}).values():
+        if isinstance(value, str) and value.startswith('http'):
+            yield value
+    for alternate in result.get('alternates') or []:
+        url = alternate.get('url') if isinstance(alternate, dict) else None
+        if isinstance(url, str) and url.startswith('http'):
+            yield url
+
+
+def result_ttl(result: Dict, provider_lifetime: Optional[int] = None, now: Optional[float] = None) -> int:
+    """
+    Seconds a successful result may be served
+    0 means the links expire too soon to be worth caching
+    """
+    now = time.time() if now is None else now
+    ttl = min(provider_lifetime or CACHE_DURATION, CACHE_MAX_TTL)
+    
+    for url in _video_urls(result):
+        expiry = url_expiry(url)
+        if expiry is not None:
+            ttl = min(ttl, int(expiry - now - CACHE_EXPIRY_MARGIN))
+    
+    return ttl if ttl >= CACHE_MIN_TTL else 0
+
+
+def failure_ttl(result: Dict) -> int:
+    """Seconds a failed lookup is cached, by its reason"""
+    if result.get('reason') == 'provider_error':
+        return CACHE_ERROR_TTL
+    return CACHE_NOT_FOUND_TTL
+
+
+def stamp(result: Dict, ttl: int, now: Optional[float] = None,
+          fresh_fraction: float = CACHE_FRESH_FRACTION) -> Dict:
+    """Copy of result carrying its freshness deadlines (unix seconds)"""
+    now = time.time() if now is None else now
+    return {
+        **result,
+        'fresh_until': int(now + ttl * fresh_fraction),
+        'expires_at': int(now + ttl),
+    }
+
+
+def is_expired(result: Dict, now: Optional[float] = None) -> bool:
+    """True once the links may be dead; such entries must not be served"""
+    expires_at = result.get('expires_at')
+    return expires_at is not None and (time.time() if now is None else now) >= expires_at
+
+
+def is_stale(result: Dict, now: Optional[float] = None) -> bool:
+    """True once the entry should be refreshed in the background"""
+    fresh_until = result.get('fresh_until')
+    return fresh_until is not None and (time.time() if now is None else now) >= fresh_until
@@ -0,0 +1,163 @@
+"""
+HLS support for the video proxy
+Master and media playlists are parsed once, cached, and rendered with
+every variant, segment, key and init-section URI pointing back at the
+proxy, so the whole stream is fetched with the upstream headers and the
+pooled connections instead of by the player directly.
+"""
+import os
+import re
+from typing import List, Optional, Union
+from urllib.parse import quote, urljoin, urlparse
+
+import aiohttp
+
+from cache import TTLCache
+from singleflight import SingleFlight
+
+
+HLS_PLAYLIST_TTL = int(os.getenv('HLS_PLAYLIST_TTL', 300))                  # Master and finished (VOD) playlists
+HLS_MAX_PLAYLIST_BYTES = int(os.getenv('HLS_MAX_PLAYLIST_BYTES', 2 * 1024 * 1024))
+HLS_PLAYLIST_CACHE_ENTRIES = int(os.getenv('HLS_PLAYLIST_CACHE_ENTRIES', 512))
+
+PLAYLIST_CONTENT_TYPES = (
+    'application/vnd.apple.mpegurl',
+    'application/x-mpegurl',
+    'audio/mpegurl',
+    'audio/x-mpegurl',
+)
+PLAYLIST_MEDIA_TYPE = 'application/vnd.apple.mpegurl'
+
+# URI="..." attribute of EXT-X-KEY, EXT-X-MAP, EXT-X-MEDIA, EXT-X-I-FRAME-STREAM-INF, ...
+URI_ATTRIBUTE = re.compile(r'URI="([^"]*)"')
+TARGET_DURATION = re.compile(r'#EXT-X-TARGETDURATION:(\d+(?:\.\d+)?)')
+
+
+def looks_like_playlist(url: str) -> bool:
+    return urlparse(url).path.lower().endswith(('.m3u8', '.m3u'))
+
+
+def is_playlist_content_type(content_type: Optional[str]) -> bool:
+    return (content_type or '').split(';')[0].strip().lower() in PLAYLIST_CONTENT_TYPES
+
+
+class Playlist:
+    """
+    Parsed playlist: the text split into literal parts and absolute
+    upstream URIs, so rendering for the proxy is a single join
+    """
+    
+    def __init__(self, url: str, parts: List[Union[str, tuple]], is_master: bool, ended: bool,
+                 target_duration: Optional[float]):
+        self.url = url
+        self.parts = parts              # str (literal) or (uri,) to be proxied
+        self.is_master = is_master
+        self.ended = ended              # EXT-X-ENDLIST: VOD, never changes
+        self.target_duration = target_duration
+    
+    @property
+    def ttl(self) -> float:
+        """Seconds the playlist may be cached (live playlists are refreshed every half target duration)"""
+        if self.is_master or self.ended:
+            return HLS_PLAYLIST_TTL
+        return max(1.0, (self.target_duration or 2.0) / 2)
+    
+    def render(self, proxy_path: str) -> str:
+        """Playlist text with every URI routed through proxy_path (e.g. "/api/proxy/video")"""
+        return ''.join(
+            part if isinstance(part, str) else f"{proxy_path}?url={quote(part[0], safe='')}"
+            for part in self.parts
+        )
+
+
+def parse_playlist(text: str, url: str) -> Playlist:
+    """Parse playlist text; relative URIs are resolved against url (the final, redirected URL)"""
+    parts: List[Union[str, tuple]] = []
+    is_master = False
+    ended = False
+    target_duration = None
+    
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if not stripped:
+            parts.append(line)
+        elif stripped.startswith('#'):
+            if stripped.startswith('#EXT-X-STREAM-INF'):
+                is_master = True
+            elif stripped.startswith('#EXT-X-ENDLIST'):
+                ended = True
+            elif stripped.startswith('#EXT-X-TARGETDURATION'):
+                match = TARGET_DURATION.match(stripped)
+                target_duration = float(match.group(1)) if match else None
+            
+            # Tags carrying a URI attribute (keys, init sections, renditions)
+            position = 0
+            for match in URI_ATTRIBUTE.finditer(line):
+                parts.append(line[position:match.start(1)])
+                parts.append((urljoin(url, match.group(1)),))
+                position = match.end(1)
+            parts.append(line[position:])
+        else:
+            # Variant playlist or media segment URI
+            newline = line[len(line.rstrip('\r\n')):]
+            parts.append((urljoin(url, stripped),))
+            parts.append(newline)
+    
+    return Playlist(url, parts, is_master, ended, target_duration)
+
+
+class PlaylistCache:
+    """Parsed playlists by upstream URL; concurrent misses share one fetch"""
+    
+    def __init__(self, max_entries: int = HLS_PLAYLIST_CACHE_ENTRIES):
+        self._playlists = TTLCache(max_entries)
+        self._flight = SingleFlight()
+    
+    def get(self, url: str) -> Optional[Playlist]:
+        return self._playlists.get(url)
+    
+    def store(self, url: str, playlist: Playlist):
+        self._playlists.set(url, playlist, playlist.ttl)
+    
+    async def fetch(self, session: aiohttp.ClientSession, url: str) -> Playlist:
+        """
+        Cached playlist, else fetch and parse it
+        Raises aiohttp.ClientResponseError for non-200 answers
+        """
+        playlist = self.get(url)
+        if playlist is not None:
+            return playlist
+        
+        async def load():
+            async with session.get(url) as response:
+                if response.status != 200:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, response.history,
+                        status=response.status, message="Playlist unavailable"
+                    )
+                return await self.read(response, url)
+        
+        return await self._flight.do(url, load)
+    
+    async def read(self, response: aiohttp.ClientResponse, url: str) -> Playlist:
+        """Parse and cache an upstream playlist response (the caller releases it)"""
+        body = bytearray()
+        async for chunk in response.content.iter_any():
+            body += chunk
+            if len(body) > HLS_MAX_PLAYLIST_BYTES:
+                raise ValueError(f"Playlist larger than {HLS_MAX_PLAYLIST_BYTES} bytes")
+        
+        text = body.decode('utf-8', errors='replace')
+        if not text.lstrip('\ufeff \r\n').startswith('#EXTM3U'):
+            raise ValueError("Upstream response is not an HLS playlist")
+        
+        playlist = parse_playlist(text, str(response.url))
+        self.store(url, playlist)
+        return playlist
+    
+    def __len__(self):
+        return len(self._playlists)
+
+
+# Shared instance
+playlist_cache = PlaylistCache()
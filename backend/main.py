@@ -2,13 +2,28 @@
 FastAPI backend for One Piece Viewer
 Video scraping and caching API
 """
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
-import redis
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import aiohttp
+import asyncio
 import os
+from typing import Dict, Optional, Tuple
 from dotenv import load_dotenv
+from scrapers.base_scraper import BaseScraper
 from scrapers.video_scraper import video_scraper
+from scrapers.show_cache import show_id_cache
+from scrapers.health import embed_health, mirror_health, source_health
+from proxy import metered, upstream_client
+from disk_cache import disk_cache
+from fanout import FanOut
+from hls import Playlist, playlist_cache, looks_like_playlist, is_playlist_content_type, PLAYLIST_MEDIA_TYPE
+from singleflight import SingleFlight, RedisSingleFlight
+from cache import RedisManager, TieredCache
+from prefetch import Prefetcher
+from content import MAX_EPISODE, parse_content_id, episode_cache_key, content_cache_key
+from freshness import result_ttl, failure_ttl, stamp, is_expired, is_stale
+from metrics import CONTENT_TYPE, counter_of, gauge_of, registry, stage_timer
 
 # Load environment variables
 load_dotenv()
@@ -31,25 +46,185 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Redis client for caching (optional - will work without Redis)
-try:
-    redis_client = redis.Redis(
-        host=os.getenv('REDIS_HOST', 'localhost'),
-        port=int(os.getenv('REDIS_PORT', 6379)),
-        db=int(os.getenv('REDIS_DB', 0)),
-        decode_responses=True,
-        socket_connect_timeout=2
-    )
-    redis_client.ping()
-    REDIS_AVAILABLE = True
-    print("✅ Redis connected successfully")
-except Exception as e:
-    print(f"⚠️  Redis not available: {e}")
-    print("   Continuing without caching...")
-    REDIS_AVAILABLE = False
-    redis_client = None
+# Redis for caching (optional - will work without Redis)
+# Pooled async client, reconnects automatically when Redis comes back
+redis_manager = RedisManager()
+
+MAX_BATCH_EPISODES = int(os.getenv('MAX_BATCH_EPISODES', 100))
+
+# Concurrent cache misses for the same key share one scrape
+scrape_flight = SingleFlight()
+# Optionally also across workers, using a Redis lock
+USE_REDIS_LOCK = os.getenv('SINGLEFLIGHT_REDIS_LOCK', 'false').lower() in ('1', 'true', 'yes')
+redis_flight = RedisSingleFlight(redis_manager) if USE_REDIS_LOCK else None
+
+
+# In-process L1 cache in front of Redis (L2); keeps caching when Redis is down
+video_cache = TieredCache(redis_manager)
+
+
+async def read_cache(cache_key: str) -> Optional[dict]:
+    """Return the cached result for a key (never one whose links may have expired)"""
+    cached_data = await video_cache.get(cache_key)
+    if cached_data and is_expired(cached_data):
+        return None
+    return cached_data
 
-CACHE_DURATION = int(os.getenv('CACHE_DURATION', 3600))  # 1 hour
+
+async def write_cache(cache_key: str, result: dict) -> dict:
+    """
+    Cache a result: successes for as long as their links stay playable,
+    failures briefly so repeated misses do not re-run every provider
+    (a failure never replaces a success that is still playable, e.g. when
+    a background refresh fails)
+    Returns the result with its freshness deadlines
+    """
+    if not result.get('success'):
+        # Negative entry: served until it expires, never refreshed early
+        ttl = failure_ttl(result)
+        if ttl <= 0:
+            return result
+        cached_data = await read_cache(cache_key)
+        if cached_data and cached_data.get('success'):
+            return result
+        result = stamp(result, ttl, fresh_fraction=1.0)
+        await video_cache.set(cache_key, result, ttl)
+        return result
+    
+    ttl = result_ttl(result, video_scraper.url_lifetime(result.get('provider')))
+    if ttl <= 0:
+        return result  # Links expire too soon to be worth caching
+    result = stamp(result, ttl)
+    await video_cache.set(cache_key, result, ttl)
+    return result
+
+
+# Stale entries being refreshed in the background, by cache key
+revalidations: Dict[str, asyncio.Task] = {}
+
+
+def revalidate(cache_key: str, search_query: str, episode_num: int):
+    """Refresh a stale entry in the background while the stale one is served"""
+    if cache_key in revalidations:
+        return
+    
+    async def refresh():
+        try:
+            await _coalesced_scrape(cache_key, _scraper_for(cache_key, search_query, episode_num))
+        except Exception as e:
+            print(f"[WARNING] Refresh of {cache_key} failed: {e}")
+        finally:
+            revalidations.pop(cache_key, None)
+    
+    revalidations[cache_key] = asyncio.create_task(refresh())
+
+
+def _scraper_for(cache_key: str, search_query: str, episode_num: int):
+    """Scrape function that caches a successful result under cache_key"""
+    async def scrape():
+        result = await video_scraper.get_video_url_async(search_query, episode_num)
+        if result:
+            result = await write_cache(cache_key, result)
+        return result
+    return scrape
+
+
+async def resolve_video(cache_key: str, search_query: str, episode_num: int,
+                        prefetch: bool = False) -> Tuple[dict, bool]:
+    """
+    Get the video result for a cache key, scraping on a miss
+    Stale entries are returned right away and refreshed in the background
+    Returns (result, cached)
+    """
+    cached_data = await read_cache(cache_key)
+    if cached_data:
+        if is_stale(cached_data):
+            revalidate(cache_key, search_query, episode_num)
+        return cached_data, True
+    
+    scrape = _scraper_for(cache_key, search_query, episode_num)
+    if not prefetch:
+        # Interactive scrapes pause the background prefetch workers
+        async with prefetcher.interactive():
+            return await _coalesced_scrape(cache_key, scrape), False
+    return await _coalesced_scrape(cache_key, scrape), False
+
+
+async def _coalesced_scrape(cache_key: str, scrape) -> dict:
+    """Run scrape through the single-flight layers"""
+    
+    if redis_flight:
+        return await scrape_flight.do(
+            cache_key,
+            lambda: redis_flight.do(cache_key, scrape, lambda: read_cache(cache_key))
+        )
+    return await scrape_flight.do(cache_key, scrape)
+
+
+# Concurrent viewers of one source share a single upstream transfer
+fanout = FanOut(upstream_client)
+
+
+# Resolves the next episodes in the background after each lookup
+prefetcher = Prefetcher(lambda *job: resolve_video(*job, prefetch=True))
+
+
+# Latency of every scraper stage per provider on /metrics
+BaseScraper.stage_timer = stage_timer
+
+# Show IDs are kept in Redis whenever the shared connection is up
+show_id_cache.redis = redis_manager
+
+
+def collect_metrics():
+    """The state /health reports, as metrics"""
+    disk = disk_cache.stats()
+    fanout_stats = fanout.stats()
+    providers = video_scraper.provider_stats()['stats']
+    return [
+        gauge_of('resolves_in_flight', "Cache misses being scraped (one per key)", scrape_flight.in_flight()),
+        gauge_of('revalidations_in_flight', "Stale entries being refreshed in the background", len(revalidations)),
+        gauge_of('prefetch_queued', "Episodes waiting to be prefetched", prefetcher.stats()['queued']),
+        gauge_of('cache_l1_entries', "Entries in the in-process result cache", len(video_cache.l1)),
+        gauge_of('redis_up', "1 while Redis is reachable", int(redis_manager.available)),
+        gauge_of('provider_circuit_open', "1 while a provider is skipped by its circuit breaker",
+                 {name: int(stats['state'] != 'closed') for name, stats in providers.items()}, 'provider'),
+        gauge_of('provider_latency_seconds', "EWMA latency of a provider",
+                 {name: stats['latency_ms'] / 1000 for name, stats in providers.items()
+                  if stats['latency_ms'] is not None}, 'provider'),
+        counter_of('video_disk_cache_requests_total', "Video disk cache lookups",
+                   {'hits': disk['hits'], 'misses': disk['misses']}, 'result'),
+        counter_of('video_disk_cache_bytes_served_total', "Video bytes served from the disk cache",
+                   disk['bytes_served']),
+        counter_of('proxy_fanout_viewers_total', "Proxied streams by how they got their bytes",
+                   {'started': fanout_stats['started'], 'joined': fanout_stats['joined'],
+                    'detached': fanout_stats['detached']}, 'event'),
+        gauge_of('proxy_fanout_transfers', "Shared upstream transfers running", fanout_stats['transfers']),
+    ]
+
+
+registry.collector(collect_metrics)
+
+
+@app.on_event("startup")
+async def startup():
+    """Connect to Redis and start the background workers"""
+    await redis_manager.start()
+    await prefetcher.start()
+    await asyncio.to_thread(disk_cache.load)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the background workers, close the HTTP sessions and Redis connections"""
+    await prefetcher.stop()
+    for task in list(revalidations.values()):
+        task.cancel()
+    await asyncio.gather(*revalidations.values(), return_exceptions=True)
+    await video_scraper.close_async()
+    await upstream_client.close()
+    await asyncio.to_thread(disk_cache.close)
+    await redis_manager.stop()
 
 
 @app.get("/")
@@ -59,7 +234,7 @@ async def root():
         "message": "One Piece Viewer API",
         "version": "1.0.0",
         "status": "running",
-        "redis": "connected" if REDIS_AVAILABLE else "disabled"
+        "redis": "connected" if redis_manager.available else "disabled"
     }
 
 
@@ -68,11 +243,25 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "redis": "connected" if REDIS_AVAILABLE else "disabled",
-        "scrapers": len(video_scraper.scrapers)
+        "redis": "connected" if redis_manager.available else "disabled",
+        "scrapers": len(video_scraper.scrapers),
+        "providers": video_scraper.provider_stats(),
+        "cache": {**video_cache.stats(), "revalidating": len(revalidations)},
+        "mirrors": mirror_health.snapshot(),
+        "sources": source_health.snapshot(),
+        "embed_hosts": embed_health.snapshot(),
+        "prefetch": prefetcher.stats(),
+        "video_disk_cache": disk_cache.stats(),
+        "fanout": fanout.stats()
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: scraper stage latencies, cache and proxy counters"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/api/episode/{episode_num}/video")
 async def get_episode_video(episode_num: int):
     """
@@ -90,24 +279,11 @@ async def get_episode_video(episode_num: int):
             detail="Invalid episode number. Must be between 1 and 1200."
         )
     
-    # Check cache first (if Redis is available)
-    cache_key = f"onepiece_ep_{episode_num}"
+    # Check cache first, then scrape (concurrent misses share one scrape)
+    cache_key = episode_cache_key(episode_num)
     
-    if REDIS_AVAILABLE and redis_client:
-        try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                import json
-                return JSONResponse(content={
-                    **json.loads(cached_data),
-                    'cached': True
-                })
-        except Exception as e:
-            print(f"Cache read error: {e}")
-    
-    # Scrape video URL
     try:
-        result = video_scraper.get_video_url("One Piece", episode_num)
+        result, cached = await resolve_video(cache_key, "One Piece", episode_num)
         
         if not result or not result.get('success'):
             raise HTTPException(
@@ -115,21 +291,12 @@ async def get_episode_video(episode_num: int):
                 detail=f"Video not found for episode {episode_num}. {result.get('error', '')}"
             )
         
-        # Cache the result (if Redis is available)
-        if REDIS_AVAILABLE and redis_client:
-            try:
-                import json
-                redis_client.setex(
-                    cache_key,
-                    CACHE_DURATION,
-                    json.dumps(result)
-                )
-            except Exception as e:
-                print(f"Cache write error: {e}")
+        # Users binge - get the next episodes ready in the background
+        prefetcher.schedule_next_episodes(episode_cache_key, "One Piece", episode_num, MAX_EPISODE)
         
         return JSONResponse(content={
             **result,
-            'cached': False
+            'cached': cached
         })
         
     except HTTPException:
@@ -141,6 +308,74 @@ async def get_episode_video(episode_num: int):
         )
 
 
+@app.get("/api/episodes/video")
+async def get_episodes_video(
+    from_episode: int = Query(..., alias="from"),
+    to_episode: int = Query(..., alias="to")
+):
+    """
+    Get video URLs for a range of One Piece episodes
+    Cache misses are resolved with a few batched upstream requests and
+    written to the same per-episode cache keys as /api/episode/{n}/video
+    
+    Args:
+        from: First episode (inclusive)
+        to: Last episode (inclusive)
+    
+    Returns:
+        JSON with one result per episode
+    """
+    if from_episode < 1 or to_episode > MAX_EPISODE or from_episode > to_episode:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid episode range. Must be within 1-{MAX_EPISODE} with from <= to."
+        )
+    if to_episode - from_episode + 1 > MAX_BATCH_EPISODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many episodes. At most {MAX_BATCH_EPISODES} per request."
+        )
+    
+    episode_nums = list(range(from_episode, to_episode + 1))
+    cache_keys = {episode_num: episode_cache_key(episode_num) for episode_num in episode_nums}
+    
+    try:
+        cached_results = await asyncio.gather(*(read_cache(cache_keys[n]) for n in episode_nums))
+        episodes = {
+            episode_num: {**cached_data, 'cached': True}
+            for episode_num, cached_data in zip(episode_nums, cached_results)
+            if cached_data
+        }
+        for episode_num, result in episodes.items():
+            if is_stale(result):
+                revalidate(cache_keys[episode_num], "One Piece", episode_num)
+        
+        missing = [episode_num for episode_num in episode_nums if episode_num not in episodes]
+        if missing:
+            async with prefetcher.interactive():
+                results = await video_scraper.get_video_urls_batch_async("One Piece", missing)
+            
+            for episode_num, result in results.items():
+                # Only AllAnime is asked here, so a failure is not cached: the
+                # single-episode endpoint still tries the other providers
+                if result.get('success'):
+                    result = await write_cache(cache_keys[episode_num], result)
+                episodes[episode_num] = {**result, 'cached': False}
+        
+        return JSONResponse(content={
+            'from': from_episode,
+            'to': to_episode,
+            'found': sum(1 for result in episodes.values() if result.get('success')),
+            'episodes': {str(n): episodes[n] for n in episode_nums}
+        })
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching videos: {str(e)}"
+        )
+
+
 @app.get("/api/content/{content_id}/video")
 async def get_content_video(content_id: str):
     """
@@ -153,90 +388,25 @@ async def get_content_video(content_id: str):
         JSON with video URLs and metadata
     """
     # Parse content ID
-    content_type = "episode"
-    search_query = "One Piece"
-    episode_num = None
-    
     try:
-        if content_id.startswith("movie-"):
-            content_type = "movie"
-            movie_id = int(content_id.replace("movie-", ""))
-            
-            # Map movie IDs to searchable names
-            movie_names = {
-                1: "One Piece The Movie",
-                2: "One Piece Clockwork Island Adventure",
-                3: "One Piece Chopper's Kingdom",
-                4: "One Piece Dead End Adventure",
-                5: "One Piece Curse of the Sacred Sword",
-                6: "One Piece Baron Omatsuri",
-                7: "One Piece Giant Mechanical Soldier",
-                8: "One Piece Episode of Alabasta",
-                9: "One Piece Episode of Chopper Plus",
-                10: "One Piece Strong World",
-                11: "One Piece 3D Straw Hat Chase",
-                12: "One Piece Film Z",
-                13: "One Piece Film Gold",
-                14: "One Piece Stampede",
-                15: "One Piece Film Red"
-            }
-            search_query = movie_names.get(movie_id, f"One Piece Movie {movie_id}")
-            episode_num = 1  # Movies are typically single episodes
-            
-        elif content_id.startswith("special-"):
-            content_type = "special"
-            special_id = int(content_id.replace("special-", ""))
-            
-            # Map special IDs to searchable names
-            special_names = {
-                1: "One Piece Romance Dawn Story",
-                2: "One Piece Episode of Nami",
-                3: "One Piece Episode of Luffy",
-                4: "One Piece Episode of Merry",
-                5: "One Piece 3D2Y",
-                6: "One Piece Episode of Sabo",
-                7: "One Piece Heart of Gold",
-                8: "One Piece Episode of East Blue",
-                9: "One Piece Episode of Skypiea",
-                10: "One Piece Defeat Him The Pirate Ganzack"
-            }
-            search_query = special_names.get(special_id, f"One Piece Special {special_id}")
-            episode_num = 1  # Specials are typically single episodes
-            
-        else:
-            # Regular episode
-            episode_num = int(content_id)
-            if episode_num < 1 or episode_num > 1200:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Invalid episode number. Must be between 1 and 1200."
-                )
-            search_query = "One Piece"
-            
+        content_type, search_query, episode_num = parse_content_id(content_id)
     except ValueError:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid content ID format: {content_id}"
         )
     
-    # Check cache first (if Redis is available)
-    cache_key = f"onepiece_{content_type}_{content_id}"
+    if content_type == "episode" and (episode_num < 1 or episode_num > MAX_EPISODE):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid episode number. Must be between 1 and {MAX_EPISODE}."
+        )
     
-    if REDIS_AVAILABLE and redis_client:
-        try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                import json
-                return JSONResponse(content={
-                    **json.loads(cached_data),
-                    'cached': True
-                })
-        except Exception as e:
-            print(f"Cache read error: {e}")
+    # Check cache first, then scrape (concurrent misses share one scrape)
+    cache_key = content_cache_key(content_type, content_id)
     
-    # Scrape video URL
     try:
-        result = video_scraper.get_video_url(search_query, episode_num)
+        result, cached = await resolve_video(cache_key, search_query, episode_num)
         
         if not result or not result.get('success'):
             raise HTTPException(
@@ -244,21 +414,14 @@ async def get_content_video(content_id: str):
                 detail=f"Video not found for {content_type} {content_id}. {result.get('error', '')}"
             )
         
-        # Cache the result (if Redis is available)
-        if REDIS_AVAILABLE and redis_client:
-            try:
-                import json
-                redis_client.setex(
-                    cache_key,
-                    CACHE_DURATION,
-                    json.dumps(result)
-                )
-            except Exception as e:
-                print(f"Cache write error: {e}")
+        if content_type == "episode":
+            prefetcher.schedule_next_episodes(
+                lambda episode: content_cache_key("episode", str(episode)), search_query, episode_num, MAX_EPISODE
+            )
         
         return JSONResponse(content={
             **result,
-            'cached': False,
+            'cached': cached,
             'content_type': content_type
         })
         
@@ -278,7 +441,7 @@ async def test_scrape():
     Tests with One Piece episode 1
     """
     try:
-        result = video_scraper.get_video_url("One Piece", 1)
+        result = await video_scraper.get_video_url_async("One Piece", 1)
         return {
             "test": "scraping",
             "episode": 1,
@@ -294,16 +457,11 @@ async def test_scrape():
 @app.delete("/api/cache/clear")
 async def clear_cache():
     """Clear all cached video URLs"""
-    if not REDIS_AVAILABLE or not redis_client:
-        return {"message": "Redis not available, no cache to clear"}
-    
     try:
-        # Clear all One Piece episode caches
-        pattern = "onepiece_ep_*"
-        keys = redis_client.keys(pattern)
-        if keys:
-            redis_client.delete(*keys)
-            return {"message": f"Cleared {len(keys)} cached episodes"}
+        # Clear all One Piece episode caches (memory and Redis)
+        cleared = await video_cache.clear("onepiece_ep_")
+        if cleared:
+            return {"message": f"Cleared {cleared} cached episodes"}
         return {"message": "No cached episodes found"}
     except Exception as e:
         raise HTTPException(
@@ -312,59 +470,92 @@ async def clear_cache():
         )
 
 
+def playlist_response(playlist: Playlist) -> Response:
+    """Serve a playlist with its URIs pointing back at the proxy"""
+    # Relative to the playlist's own URL (/api/proxy/video), so it also
+    # works behind a path prefix or another host name
+    return Response(
+        content=playlist.render("video"),
+        media_type=PLAYLIST_MEDIA_TYPE,
+        headers={
+            'Cache-Control': f'public, max-age={int(playlist.ttl)}' if playlist.is_master or playlist.ended
+            else 'no-cache'
+        }
+    )
+
+
 @app.get("/api/proxy/video")
 async def proxy_video(url: str, request: Request):
     """
     Proxy video stream with proper headers and Range support
     This allows the frontend to play videos that require referrer headers
-    """
-    import requests
     
+    HLS playlists are rewritten so variant playlists, segments and keys
+    are fetched through this endpoint as well
+    """
     try:
-        # Set proper headers for the video source
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://allmanga.to',
-            'Accept': '*/*',
-            'Accept-Encoding': 'identity',
-        }
+        # HLS mode: parsed playlists are cached and shared between viewers
+        if looks_like_playlist(url):
+            playlist = await playlist_cache.fetch(await upstream_client.session(), url)
+            return playlist_response(playlist)
         
         # Pass through Range header if present (for video seeking)
+        headers = {}
         range_header = request.headers.get('range')
         if range_header:
             headers['Range'] = range_header
         
-        # Stream the video with a larger timeout and chunk size
-        response = requests.get(url, headers=headers, stream=True, timeout=60)
+        # Rewatches, seeks and other viewers are served from local disk
+        cached_slice = disk_cache.lookup(url, range_header)
+        if cached_slice is not None:
+            return cached_slice.response({
+                'Accept-Ranges': 'bytes',
+                'Cache-Control': 'public, max-age=3600',
+            })
         
-        if response.status_code not in [200, 206]:
-            raise HTTPException(status_code=response.status_code, detail="Video source unavailable")
+        # Another viewer is already streaming these bytes - read along
+        subscription = fanout.attach(url, range_header)
         
-        # Prepare response headers
+        if subscription is None:
+            # Reuses a pooled keep-alive connection to the source when possible
+            response = await upstream_client.open(url, headers)
+            
+            if response.status not in [200, 206]:
+                response.release()
+                raise HTTPException(status_code=response.status, detail="Video source unavailable")
+            
+            # Playlist without an .m3u8 path, recognised by its content type
+            if is_playlist_content_type(response.headers.get('content-type')):
+                try:
+                    playlist = await playlist_cache.read(response, url)
+                finally:
+                    response.release()
+                return playlist_response(playlist)
+            
+            # What is streamed is kept in the disk cache; viewers arriving
+            # while it runs can join the same transfer
+            subscription = fanout.start(url, response, disk_cache.writer(url, response.status, response.headers))
+        
+        # Content-Length (full responses) / Content-Range (partial content)
         response_headers = {
             'Accept-Ranges': 'bytes',
             'Cache-Control': 'public, max-age=3600',
+            **subscription.headers,
         }
         
-        # Only include Content-Length if we have it and it's reliable
-        content_length = response.headers.get('content-length')
-        if content_length and response.status_code == 200:
-            response_headers['Content-Length'] = content_length
-        
-        # Include Content-Range if present (for partial content)
-        content_range = response.headers.get('content-range')
-        if content_range:
-            response_headers['Content-Range'] = content_range
-        
-        # Return streaming response with larger chunk size for better performance
+        # The upstream transfer stops as soon as the last viewer goes away
         return StreamingResponse(
-            response.iter_content(chunk_size=65536),  # 64KB chunks
-            status_code=response.status_code,
-            media_type=response.headers.get('content-type', 'video/mp4'),
+            metered(subscription.body()),
+            status_code=subscription.status,
+            media_type=subscription.content_type,
             headers=response_headers
         )
         
-    except requests.RequestException as e:
+    except HTTPException:
+        raise
+    except aiohttp.ClientResponseError as e:
+        raise HTTPException(status_code=e.status, detail="Video source unavailable")
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
         raise HTTPException(
             status_code=502,
             detail=f"Error fetching video from source: {str(e)}"
@@ -393,7 +584,7 @@ if __name__ == "__main__":
     print(f"📍 Local:   http://localhost:{port}")
     print(f"📍 Network: http://{local_ip}:{port}")
     print(f"📡 CORS: {'All origins allowed (LAN enabled)' if origins == ['*'] else str(origins)}")
-    print(f"💾 Redis caching: {'enabled' if REDIS_AVAILABLE else 'disabled'}\n")
+    print(f"💾 Redis caching: {redis_manager.address} (in-memory only while unavailable)\n")
     
     uvicorn.run(
         app,
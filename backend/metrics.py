@@ -0,0 +1,239 @@
+"""
+Prometheus metrics for the resolver, the result cache and the video proxy
+Counters, gauges and histograms with labels, rendered in the Prometheus
+text format on /metrics. Modules define their metrics on the shared
+registry; values that already live in a stats() dict are read by a
+collector when /metrics is scraped instead of being counted twice.
+"""
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Histogram buckets (seconds)
+SCRAPE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+TTFB_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    """A metric family: one value per combination of label values"""
+    
+    kind = 'untyped'
+    
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+    
+    def _samples(self) -> Iterator[Tuple[str, List[Tuple[str, str]], float]]:
+        """(name suffix, label pairs, value) for every sample"""
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values):
+            yield '', list(zip(self.label_names, key)), value
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, pairs, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(pairs)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+    
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+    
+    @contextmanager
+    def track(self, **labels):
+        """Count the block as in progress while it runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = SCRAPE_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+    
+    def _samples(self):
+        with self._lock:
+            values = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        for key, (counts, total) in sorted(values):
+            pairs = list(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield '_bucket', pairs + [('le', _format_value(bound))], cumulative
+            yield '_sum', pairs, total
+            yield '_count', pairs, cumulative
+
+
+class Registry:
+    """Every metric shown on /metrics"""
+    
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+    
+    def _register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+    
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+    
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+    
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = SCRAPE_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+    
+    def collector(self, collect: Callable[[], Iterable[Metric]]):
+        """collect() builds metrics from current state on every scrape"""
+        self._collectors.append(collect)
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                metrics = list(collect())
+            except Exception as e:
+                print(f"[WARNING] Metrics collector failed: {e}")
+                continue
+            for metric in metrics:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _filled(metric: Metric, value, label: Optional[str]) -> Metric:
+    values = value if label else {None: value}
+    for label_value, amount in values.items():
+        metric.inc(amount, **({label: label_value} if label else {}))
+    return metric
+
+
+def gauge_of(name: str, help_text: str, value, label: Optional[str] = None) -> Gauge:
+    """Gauge for a collector: one value, or {label value: value} with label"""
+    return _filled(Gauge(name, help_text, [label] if label else []), value, label)
+
+
+def counter_of(name: str, help_text: str, value, label: Optional[str] = None) -> Counter:
+    """Counter for a collector, e.g. from a stats() counters dict"""
+    return _filled(Counter(name, help_text, [label] if label else []), value, label)
+
+
+class StageTimer:
+    """
+    Latency and in-flight count of every scraper stage per provider
+    (set as BaseScraper.stage_timer). Outcome is ok, not_found, error or
+    cancelled (race losers).
+    """
+    
+    def __init__(self, registry: Registry):
+        self.duration = registry.histogram(
+            'scraper_stage_duration_seconds', "Time spent in a scraper stage",
+            ['provider', 'stage', 'outcome'], SCRAPE_BUCKETS
+        )
+        self.in_flight = registry.gauge(
+            'scraper_stage_in_flight', "Scraper stages currently running", ['provider', 'stage']
+        )
+    
+    def run(self, provider: str, stage: str, fn: Callable, *args):
+        started = time.monotonic()
+        outcome = 'error'
+        with self.in_flight.track(provider=provider, stage=stage):
+            try:
+                result = fn(*args)
+                outcome = 'ok' if result else 'not_found'
+                return result
+            finally:
+                self.duration.observe(time.monotonic() - started, provider=provider, stage=stage, outcome=outcome)
+    
+    async def run_async(self, provider: str, stage: str, fn: Callable, *args):
+        started = time.monotonic()
+        outcome = 'error'
+        with self.in_flight.track(provider=provider, stage=stage):
+            try:
+                result = await fn(*args)
+                outcome = 'ok' if result else 'not_found'
+                return result
+            except asyncio.CancelledError:
+                outcome = 'cancelled'
+                raise
+            finally:
+                self.duration.observe(time.monotonic() - started, provider=provider, stage=stage, outcome=outcome)
+
+
+# Shared instances
+registry = Registry()
+stage_timer = StageTimer(registry)
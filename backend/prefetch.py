@@ -0,0 +1,108 @@
+"""
+Watch-ahead prefetching
+After an episode is resolved the next few episodes are resolved into the
+cache in the background, so "next episode" is a cache hit
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+
+PREFETCH_AHEAD = int(os.getenv('PREFETCH_AHEAD', 2))              # Episodes to resolve ahead (0 = off)
+PREFETCH_CONCURRENCY = int(os.getenv('PREFETCH_CONCURRENCY', 1))  # Background resolutions at once
+PREFETCH_QUEUE_SIZE = int(os.getenv('PREFETCH_QUEUE_SIZE', 100))
+
+# (cache_key, search_query, episode_num)
+PrefetchJob = Tuple[str, str, int]
+
+
+class Prefetcher:
+    """
+    Low-priority background resolver
+    
+    Runs at most `concurrency` jobs at a time and only while no interactive
+    scrape is in flight, so prefetching never competes with users waiting
+    on a video.
+    """
+    
+    def __init__(self, resolve: Callable[[str, str, int], Awaitable], ahead: int = PREFETCH_AHEAD,
+                 concurrency: int = PREFETCH_CONCURRENCY, queue_size: int = PREFETCH_QUEUE_SIZE):
+        self.resolve = resolve
+        self.ahead = ahead
+        self.concurrency = concurrency
+        self._queue: "asyncio.Queue[PrefetchJob]" = asyncio.Queue(maxsize=queue_size)
+        self._pending: Set[str] = set()
+        self._workers: List[asyncio.Task] = []
+        self._interactive = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+    
+    @asynccontextmanager
+    async def interactive(self):
+        """Mark an interactive scrape; prefetch workers pause while any is running"""
+        self._interactive += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._interactive -= 1
+            if self._interactive == 0:
+                self._idle.set()
+    
+    def schedule(self, jobs: List[PrefetchJob]):
+        """Queue jobs unless already queued; drops jobs when the queue is full"""
+        if not self._workers:
+            return
+        for job in jobs:
+            cache_key = job[0]
+            if cache_key in self._pending:
+                continue
+            try:
+                self._queue.put_nowait(job)
+                self._pending.add(cache_key)
+            except asyncio.QueueFull:
+                break
+    
+    def schedule_next_episodes(self, cache_key: Callable[[int], str], search_query: str, episode_num: int,
+                               last_episode: Optional[int] = None):
+        """Queue the `ahead` episodes after episode_num (cache_key maps an episode number to its key)"""
+        jobs = []
+        for next_episode in range(episode_num + 1, episode_num + 1 + self.ahead):
+            if last_episode is not None and next_episode > last_episode:
+                break
+            jobs.append((cache_key(next_episode), search_query, next_episode))
+        self.schedule(jobs)
+    
+    async def _worker(self):
+        while True:
+            cache_key, search_query, episode_num = await self._queue.get()
+            try:
+                await self._idle.wait()
+                await self.resolve(cache_key, search_query, episode_num)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WARNING] Prefetch of {cache_key} failed: {e}")
+            finally:
+                self._pending.discard(cache_key)
+                self._queue.task_done()
+    
+    async def start(self):
+        if self.ahead <= 0 or self.concurrency <= 0:
+            return
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+    
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+    
+    def stats(self):
+        return {
+            'ahead': self.ahead,
+            'queued': self._queue.qsize(),
+            'pending': len(self._pending),
+            'interactive_in_flight': self._interactive,
+        }
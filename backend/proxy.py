@@ -0,0 +1,145 @@
+"""
+Upstream HTTP client for the video proxy
+One pooled keep-alive aiohttp session shared by every proxied stream
+"""
+import asyncio
+import os
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, Optional
+import aiohttp
+
+from metrics import TTFB_BUCKETS, registry
+
+
+PROXY_POOL_SIZE = int(os.getenv('PROXY_POOL_SIZE', 200))           # Total upstream connections
+PROXY_POOL_PER_HOST = int(os.getenv('PROXY_POOL_PER_HOST', 0))      # 0 = no per-host limit
+PROXY_KEEPALIVE = float(os.getenv('PROXY_KEEPALIVE', 60))           # Seconds to keep idle connections
+PROXY_CONNECT_TIMEOUT = float(os.getenv('PROXY_CONNECT_TIMEOUT', 10))
+PROXY_READ_TIMEOUT = float(os.getenv('PROXY_READ_TIMEOUT', 60))
+PROXY_CHUNK_SIZE = 65536  # 64KB chunks
+
+# Headers the video sources expect
+UPSTREAM_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Referer': 'https://allmanga.to',
+    'Accept': '*/*',
+    'Accept-Encoding': 'identity',
+}
+
+proxy_upstream_responses = registry.counter(
+    'proxy_upstream_responses_total', "Upstream answers by status code (error = no answer)", ['status']
+)
+proxy_upstream_ttfb = registry.histogram(
+    'proxy_upstream_ttfb_seconds', "Time from an upstream request to its response headers", buckets=TTFB_BUCKETS
+)
+proxy_bytes = registry.counter(
+    'proxy_bytes_total', "Video bytes received from upstream and sent to viewers", ['direction']
+)
+proxy_active_streams = registry.gauge('proxy_active_streams', "Proxied video bodies being streamed to viewers")
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    """Status code and time to first byte of every upstream request (playlists included)"""
+    async def on_request_start(session, context, params):
+        context.started = time.monotonic()
+    
+    async def on_request_end(session, context, params):
+        proxy_upstream_ttfb.observe(time.monotonic() - context.started)
+        proxy_upstream_responses.inc(status=params.response.status)
+    
+    async def on_request_exception(session, context, params):
+        proxy_upstream_responses.inc(status='error')
+    
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+class UpstreamClient:
+    """Lazily created, pooled aiohttp session for fetching video sources"""
+    
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+    
+    async def session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    self._session = aiohttp.ClientSession(
+                        headers=UPSTREAM_HEADERS,
+                        connector=aiohttp.TCPConnector(
+                            limit=PROXY_POOL_SIZE,
+                            limit_per_host=PROXY_POOL_PER_HOST,
+                            keepalive_timeout=PROXY_KEEPALIVE,
+                            ttl_dns_cache=300,
+                        ),
+                        timeout=aiohttp.ClientTimeout(
+                            total=None,
+                            sock_connect=PROXY_CONNECT_TIMEOUT,
+                            sock_read=PROXY_READ_TIMEOUT,
+                        ),
+                        auto_decompress=False,
+                        trace_configs=[_trace_config()],
+                    )
+        return self._session
+    
+    async def open(self, url: str, headers: Optional[Dict[str, str]] = None) -> aiohttp.ClientResponse:
+        """
+        Send the request and return once the upstream headers arrived
+        The caller must consume the body with stream_body (or close the response)
+        """
+        session = await self.session()
+        return await session.get(url, headers=headers or {})
+    
+    async def close(self):
+        """Close the pooled connections (call on application shutdown)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+async def stream_body(response: aiohttp.ClientResponse, sink=None) -> AsyncIterator[bytes]:
+    """
+    Yield the upstream body in chunks
+    
+    When the client disconnects Starlette cancels the streaming task, which
+    lands here and closes the upstream connection instead of downloading
+    the rest of the video for nobody.
+    
+    sink (e.g. a disk_cache.SpanWriter) gets a copy of every chunk and is
+    closed with whether the body was read to the end.
+    """
+    completed = False
+    try:
+        async for chunk in response.content.iter_chunked(PROXY_CHUNK_SIZE):
+            proxy_bytes.inc(len(chunk), direction='received')
+            if sink is not None:
+                sink.write(chunk)
+            yield chunk
+        completed = True
+    finally:
+        if sink is not None:
+            sink.close(completed)
+        if completed:
+            # Body fully read - connection goes back to the keep-alive pool
+            response.release()
+        else:
+            response.close()
+
+
+async def metered(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """body as sent to a viewer, counted in proxy_active_streams and proxy_bytes_total"""
+    with proxy_active_streams.track():
+        async with aclosing(body):
+            async for chunk in body:
+                proxy_bytes.inc(len(chunk), direction='sent')
+                yield chunk
+
+
+# Shared instance
+upstream_client = UpstreamClient()
@@ -2,11 +2,60 @@
 AllAnime API Scraper - Based on ani-cli implementation
 Uses the same API that ani-cli uses (https://api.allanime.day)
 """
+import asyncio
+import os
 import requests
 import re
 import json
-from typing import Optional, Dict
+import time
+from typing import Optional, Dict, List, Set
 from .base_scraper import BaseScraper
+from .health import source_health
+from .show_cache import show_id_cache
+
+
+# Episodes resolved per aliased GraphQL request
+BATCH_SIZE = int(os.getenv('ALLANIME_BATCH_SIZE', 20))
+
+# Preferred sources, best first (case-insensitive); others follow by the API's own priority
+SOURCE_PRIORITY = [
+    name.strip().lower()
+    for name in os.getenv('ALLANIME_SOURCE_PRIORITY', 'Default,S-mp4,Luf-Mp4,Yt-mp4,Sak,Kir').split(',')
+    if name.strip()
+]
+PROBE_SOURCES = os.getenv('ALLANIME_PROBE_SOURCES', 'true').lower() in ('1', 'true', 'yes')
+PROBE_TIMEOUT = float(os.getenv('ALLANIME_PROBE_TIMEOUT', 2))   # Seconds per reachability probe
+PROBE_MAX = int(os.getenv('ALLANIME_PROBE_MAX', 4))            # Sources probed per lookup
+
+# ani-cli's hex substitution: each byte of the source URL is XORed with 0x38
+DECODE_MAP = {
+    '79': 'A', '7a': 'B', '7b': 'C', '7c': 'D', '7d': 'E', '7e': 'F',
+    '7f': 'G', '70': 'H', '71': 'I', '72': 'J', '73': 'K', '74': 'L',
+    '75': 'M', '76': 'N', '77': 'O', '68': 'P', '69': 'Q', '6a': 'R',
+    '6b': 'S', '6c': 'T', '6d': 'U', '6e': 'V', '6f': 'W', '60': 'X',
+    '61': 'Y', '62': 'Z', '59': 'a', '5a': 'b', '5b': 'c', '5c': 'd',
+    '5d': 'e', '5e': 'f', '5f': 'g', '50': 'h', '51': 'i', '52': 'j',
+    '53': 'k', '54': 'l', '55': 'm', '56': 'n', '57': 'o', '48': 'p',
+    '49': 'q', '4a': 'r', '4b': 's', '4c': 't', '4d': 'u', '4e': 'v',
+    '4f': 'w', '40': 'x', '41': 'y', '42': 'z', '08': '0', '09': '1',
+    '0a': '2', '0b': '3', '0c': '4', '0d': '5', '0e': '6', '0f': '7',
+    '00': '8', '01': '9', '15': '-', '16': '.', '67': '_', '46': '~',
+    '02': ':', '17': '/', '07': '?', '1b': '#', '63': '[', '65': ']',
+    '78': '@', '19': '!', '1c': '$', '1e': '&', '10': '(', '11': ')',
+    '12': '*', '13': '+', '14': ',', '03': ';', '05': '=', '1d': '%'
+}
+
+# The same map as a bytes.translate table (unknown bytes -> "?")
+DECODE_TABLE = bytearray(b'?' * 256)
+for _pair, _char in DECODE_MAP.items():
+    DECODE_TABLE[int(_pair, 16)] = ord(_char)
+DECODE_TABLE = bytes(DECODE_TABLE)
+
+
+def source_preference(name: str) -> int:
+    """Position of a source name in SOURCE_PRIORITY (unlisted sources last)"""
+    name = name.lower()
+    return SOURCE_PRIORITY.index(name) if name in SOURCE_PRIORITY else len(SOURCE_PRIORITY)
 
 
 class AllAnimeScraper(BaseScraper):
@@ -15,6 +64,9 @@ class AllAnimeScraper(BaseScraper):
     This is the same API that ani-cli uses
     """
     
+    # Decoded source URLs are long-lived CDN/file-host links
+    url_lifetime = 21600
+    
     def __init__(self):
         super().__init__()
         # Based on ani-cli configuration
@@ -33,68 +85,105 @@ class AllAnimeScraper(BaseScraper):
     def search_anime(self, anime_name: str) -> Optional[str]:
         """Search for anime using GraphQL API"""
         try:
-            # GraphQL query from ani-cli
-            search_gql = '''
-            query($search: SearchInput, $limit: Int, $page: Int, $translationType: VaildTranslationTypeEnumType) {
-                shows(search: $search, limit: $limit, page: $page, translationType: $translationType) {
-                    edges {
-                        _id
-                        name
-                        availableEpisodes
-                        __typename
-                    }
-                }
-            }
-            '''
-            
-            variables = {
-                "search": {
-                    "allowAdult": False,
-                    "allowUnknown": False,
-                    "query": anime_name
-                },
-                "limit": 40,
-                "page": 1,
-                "translationType": "sub",
-                "countryOrigin": "ALL"
-            }
+            show_id = show_id_cache.get('allanime', anime_name)
+            if show_id:
+                print(f"[DEBUG] Show ID cache hit: {anime_name} -> {show_id}")
+                return show_id
             
             response = self.session.get(
                 f"{self.api_base}/api",
-                params={
-                    'variables': json.dumps(variables),
-                    'query': search_gql
-                },
+                params=self._search_params(anime_name),
                 timeout=15
             )
+            show_id = self._parse_search_response(response, anime_name)
+            if show_id:
+                show_id_cache.set('allanime', anime_name, show_id)
+            return show_id
             
-            print(f"[DEBUG] API Status: {response.status_code}")
-            print(f"[DEBUG] API Response length: {len(response.text)} bytes")
-            print(f"[DEBUG] Response preview: {response.text[:200]}")
-            
-            if response.status_code != 200:
-                print(f"[ERROR] Search API returned {response.status_code}")
-                print(f"[ERROR] Response: {response.text[:500]}")
-                return None
-            
-            data = response.json()
-            
-            if 'data' in data and 'shows' in data['data'] and 'edges' in data['data']['shows']:
-                shows = data['data']['shows']['edges']
-                if shows:
-                    # Return the first show's ID
-                    show_id = shows[0]['_id']
-                    show_name = shows[0]['name']
-                    print(f"[SUCCESS] Found: {show_name} (ID: {show_id})")
-                    return show_id
-            
-            print(f"[WARNING] No shows found for: {anime_name}")
+        except Exception as e:
+            print(f"[ERROR] Search failed: {e}")
             return None
+    
+    async def search_anime_async(self, anime_name: str) -> Optional[str]:
+        """Async version of search_anime"""
+        try:
+            show_id = await show_id_cache.get_async('allanime', anime_name)
+            if show_id:
+                print(f"[DEBUG] Show ID cache hit: {anime_name} -> {show_id}")
+                return show_id
+            
+            response = await self.async_get(
+                f"{self.api_base}/api",
+                params=self._search_params(anime_name),
+                timeout=15
+            )
+            show_id = self._parse_search_response(response, anime_name)
+            if show_id:
+                await show_id_cache.set_async('allanime', anime_name, show_id)
+            return show_id
             
         except Exception as e:
             print(f"[ERROR] Search failed: {e}")
             return None
     
+    def _search_params(self, anime_name: str) -> Dict[str, str]:
+        """Build the query string for the shows search"""
+        # GraphQL query from ani-cli
+        search_gql = '''
+        query($search: SearchInput, $limit: Int, $page: Int, $translationType: VaildTranslationTypeEnumType) {
+            shows(search: $search, limit: $limit, page: $page, translationType: $translationType) {
+                edges {
+                    _id
+                    name
+                    availableEpisodes
+                    __typename
+                }
+            }
+        }
+        '''
+        
+        variables = {
+            "search": {
+                "allowAdult": False,
+                "allowUnknown": False,
+                "query": anime_name
+            },
+            "limit": 40,
+            "page": 1,
+            "translationType": "sub",
+            "countryOrigin": "ALL"
+        }
+        
+        return {
+            'variables': json.dumps(variables),
+            'query': search_gql
+        }
+    
+    def _parse_search_response(self, response, anime_name: str) -> Optional[str]:
+        """Pick the show ID out of a shows search response"""
+        print(f"[DEBUG] API Status: {response.status_code}")
+        print(f"[DEBUG] API Response length: {len(response.text)} bytes")
+        print(f"[DEBUG] Response preview: {response.text[:200]}")
+        
+        if response.status_code != 200:
+            print(f"[ERROR] Search API returned {response.status_code}")
+            print(f"[ERROR] Response: {response.text[:500]}")
+            return None
+        
+        data = response.json()
+        
+        if 'data' in data and 'shows' in data['data'] and 'edges' in data['data']['shows']:
+            shows = data['data']['shows']['edges']
+            if shows:
+                # Return the first show's ID
+                show_id = shows[0]['_id']
+                show_name = shows[0]['name']
+                print(f"[SUCCESS] Found: {show_name} (ID: {show_id})")
+                return show_id
+        
+        print(f"[WARNING] No shows found for: {anime_name}")
+        return None
+    
     def get_episode_url(self, anime_id: str, episode_num: int) -> Optional[str]:
         """
         For AllAnime API, we don't need episode URL
@@ -102,6 +191,10 @@ class AllAnimeScraper(BaseScraper):
         """
         return anime_id  # Return the show ID
     
+    async def get_episode_url_async(self, anime_id: str, episode_num: int) -> Optional[str]:
+        """No request needed, see get_episode_url"""
+        return anime_id
+    
     def extract_video_url(self, show_id: str, episode_num: int = None) -> Optional[Dict[str, str]]:
         """
         Extract video URLs using AllAnime API
@@ -112,52 +205,14 @@ class AllAnimeScraper(BaseScraper):
             return None
         
         try:
-            # GraphQL query for episode sources
-            episode_gql = '''
-            query ($showId: String!, $translationType: VaildTranslationTypeEnumType!, $episodeString: String!) {
-                episode(showId: $showId, translationType: $translationType, episodeString: $episodeString) {
-                    episodeString
-                    sourceUrls
-                }
-            }
-            '''
-            
-            variables = {
-                "showId": show_id,
-                "translationType": "sub",
-                "episodeString": str(episode_num)
-            }
-            
             print(f"[INFO] Fetching episode {episode_num} for show {show_id}")
             
             response = self.session.get(
                 f"{self.api_base}/api",
-                params={
-                    'variables': json.dumps(variables),
-                    'query': episode_gql
-                },
+                params=self._episode_params(show_id, episode_num),
                 timeout=15
             )
-            
-            if response.status_code != 200:
-                print(f"[ERROR] Episode API returned {response.status_code}")
-                return None
-            
-            data = response.json()
-            
-            if 'data' in data and 'episode' in data['data']:
-                episode_data = data['data']['episode']
-                source_urls = episode_data.get('sourceUrls', '')
-                
-                print(f"[INFO] Got source URLs data")
-                
-                # Parse source URLs (they're encoded)
-                video_urls = self._parse_source_urls(source_urls)
-                if video_urls:
-                    return video_urls
-            
-            print(f"[WARNING] No episode data found")
-            return None
+            return self._rank_sources(self._episode_sources(response))
             
         except Exception as e:
             print(f"[ERROR] Episode extraction failed: {e}")
@@ -165,8 +220,147 @@ class AllAnimeScraper(BaseScraper):
             traceback.print_exc()
             return None
     
+    async def extract_video_url_async(self, show_id: str, episode_num: int = None) -> Optional[Dict[str, str]]:
+        """Async version of extract_video_url"""
+        if episode_num is None:
+            print("[ERROR] Episode number required")
+            return None
+        
+        try:
+            print(f"[INFO] Fetching episode {episode_num} for show {show_id}")
+            
+            response = await self.async_get(
+                f"{self.api_base}/api",
+                params=self._episode_params(show_id, episode_num),
+                timeout=15
+            )
+            sources = self._episode_sources(response)
+            unreachable = await self._probe_sources(sources) if PROBE_SOURCES and sources else set()
+            return self._rank_sources(sources, unreachable)
+            
+        except Exception as e:
+            print(f"[ERROR] Episode extraction failed: {e}")
+            return None
+    
+    def _episode_params(self, show_id: str, episode_num: int) -> Dict[str, str]:
+        """Build the query string for an episode sources lookup"""
+        # GraphQL query for episode sources
+        episode_gql = '''
+        query ($showId: String!, $translationType: VaildTranslationTypeEnumType!, $episodeString: String!) {
+            episode(showId: $showId, translationType: $translationType, episodeString: $episodeString) {
+                episodeString
+                sourceUrls
+            }
+        }
+        '''
+        
+        variables = {
+            "showId": show_id,
+            "translationType": "sub",
+            "episodeString": str(episode_num)
+        }
+        
+        return {
+            'variables': json.dumps(variables),
+            'query': episode_gql
+        }
+    
+    def _episode_sources(self, response) -> List[Dict[str, str]]:
+        """Decode the video sources out of an episode sources response"""
+        if response.status_code != 200:
+            print(f"[ERROR] Episode API returned {response.status_code}")
+            return []
+        
+        data = response.json()
+        
+        if 'data' in data and data['data'].get('episode'):
+            episode_data = data['data']['episode']
+            source_urls = episode_data.get('sourceUrls', '')
+            
+            print(f"[INFO] Got source URLs data")
+            
+            # Decode source URLs (they're encoded)
+            sources = self._decode_sources(source_urls)
+            if sources:
+                return sources
+        
+        print(f"[WARNING] No episode data found")
+        return []
+    
+    async def extract_video_urls_batch_async(self, show_id: str,
+                                             episode_nums: List[int]) -> Dict[int, Optional[Dict[str, str]]]:
+        """
+        Resolve many episodes with a few requests
+        Each request asks for up to BATCH_SIZE episodes using GraphQL aliases
+        """
+        chunks = [episode_nums[i:i + BATCH_SIZE] for i in range(0, len(episode_nums), BATCH_SIZE)]
+        results: Dict[int, Optional[Dict[str, str]]] = {episode_num: None for episode_num in episode_nums}
+        
+        responses = await asyncio.gather(
+            *(self._fetch_episode_batch(show_id, chunk) for chunk in chunks),
+            return_exceptions=True
+        )
+        for chunk, chunk_results in zip(chunks, responses):
+            if isinstance(chunk_results, Exception):
+                print(f"[ERROR] Batch for episodes {chunk[0]}-{chunk[-1]} failed: {chunk_results}")
+                continue
+            results.update(chunk_results)
+        
+        return results
+    
+    async def _fetch_episode_batch(self, show_id: str,
+                                   episode_nums: List[int]) -> Dict[int, Optional[Dict[str, str]]]:
+        """One aliased GraphQL request for a chunk of episodes"""
+        print(f"[INFO] Fetching episodes {episode_nums[0]}-{episode_nums[-1]} for show {show_id}")
+        
+        response = await self.async_get(
+            f"{self.api_base}/api",
+            params=self._batch_params(show_id, episode_nums),
+            timeout=30
+        )
+        
+        if response.status_code != 200:
+            print(f"[ERROR] Batch episode API returned {response.status_code}")
+            return {}
+        
+        data = response.json().get('data') or {}
+        results = {}
+        for episode_num in episode_nums:
+            episode_data = data.get(f"e{episode_num}")
+            if episode_data:
+                results[episode_num] = self._parse_source_urls(episode_data.get('sourceUrls', ''))
+        return results
+    
+    def _batch_params(self, show_id: str, episode_nums: List[int]) -> Dict[str, str]:
+        """Build the query string for an aliased multi-episode lookup"""
+        # Episode numbers are ints, so inlining them in the query is safe
+        fields = '\n'.join(
+            f'e{episode_num}: episode(showId: $showId, translationType: $translationType, '
+            f'episodeString: "{int(episode_num)}") {{ episodeString sourceUrls }}'
+            for episode_num in episode_nums
+        )
+        batch_gql = (
+            'query ($showId: String!, $translationType: VaildTranslationTypeEnumType!) {\n'
+            f'{fields}\n'
+            '}'
+        )
+        
+        variables = {
+            "showId": show_id,
+            "translationType": "sub"
+        }
+        
+        return {
+            'variables': json.dumps(variables),
+            'query': batch_gql
+        }
+    
     def _parse_source_urls(self, source_urls_str: str) -> Optional[Dict[str, str]]:
-        """Parse the source URLs from API response"""
+        """Ranked video URLs from the sourceUrls of an API response (no probing)"""
+        return self._rank_sources(self._decode_sources(source_urls_str))
+    
+    def _decode_sources(self, source_urls_str: str) -> List[Dict[str, str]]:
+        """Every decodable source as {'url', 'provider', 'priority'}, in API order"""
         try:
             # Source URLs come as JSON array
             # Format: [{"sourceUrl":"--ENCODED_URL","sourceName":"PROVIDER"}]
@@ -178,9 +372,10 @@ class AllAnimeScraper(BaseScraper):
                 sources = source_urls_str
             
             if not sources:
-                return None
+                return []
             
-            # Extract URLs from sources
+            decoded = []
+            seen = set()
             for source in sources:
                 if isinstance(source, dict):
                     source_url = source.get('sourceUrl', '')
@@ -190,19 +385,81 @@ class AllAnimeScraper(BaseScraper):
                         # Decode the URL (ani-cli uses sed substitution)
                         decoded_url = self._decode_allanime_url(source_url[2:])
                         
-                        if decoded_url:
-                            print(f"[SUCCESS] Found video URL from {source_name}")
-                            return {
-                                'default': decoded_url,
-                                '720p': decoded_url,
-                                'provider': source_name
-                            }
+                        if decoded_url and decoded_url not in seen:
+                            seen.add(decoded_url)
+                            priority = source.get('priority')
+                            decoded.append({
+                                'url': decoded_url,
+                                'provider': source_name,
+                                'priority': priority if isinstance(priority, (int, float)) else 0,
+                            })
             
-            return None
+            print(f"[INFO] Decoded {len(decoded)} sources")
+            return decoded
             
         except Exception as e:
             print(f"[ERROR] Failed to parse source URLs: {e}")
+            return []
+    
+    def _rank_sources(self, sources: List[Dict[str, str]],
+                      unreachable: Optional[Set[str]] = None) -> Optional[Dict[str, str]]:
+        """
+        Best source as 'default' / '720p' / 'provider', the rest under 'alternates'
+        Order: reachable first (not failing a probe just now, not cooling
+        down after failed probes), then SOURCE_PRIORITY, then the measured
+        health, then the API's priority.
+        """
+        if not sources:
             return None
+        unreachable = unreachable or set()
+        
+        health_order = source_health.ranked(list({source['provider'] for source in sources}))
+        
+        def key(source):
+            name = source['provider']
+            return (
+                source['url'] in unreachable or source_health.is_open(name),
+                source_preference(name),
+                health_order.index(name),
+                -source['priority'],
+            )
+        
+        ranked = sorted(sources, key=key)
+        best = ranked[0]
+        print(f"[SUCCESS] Found video URL from {best['provider']} ({len(ranked) - 1} alternates)")
+        return {
+            'default': best['url'],
+            '720p': best['url'],
+            'provider': best['provider'],
+            'alternates': [{'url': source['url'], 'provider': source['provider']} for source in ranked[1:]],
+        }
+    
+    async def _probe_sources(self, sources: List[Dict[str, str]]) -> Set[str]:
+        """
+        Check that the best few absolute source URLs answer (HEAD), recording
+        the results per source name; returns the URLs that failed
+        """
+        if len(sources) < 2:
+            return set()  # Nothing to choose between
+        
+        # Relative paths are AllAnime's own clock endpoints, not probed
+        candidates = [source for source in sources if source['url'].startswith('http')]
+        candidates.sort(key=lambda source: source_preference(source['provider']))
+        candidates = candidates[:PROBE_MAX]
+        
+        async def probe(source) -> bool:
+            started = time.monotonic()
+            try:
+                response = await self.async_head(source['url'], timeout=PROBE_TIMEOUT, allow_redirects=True)
+                # Some file hosts refuse HEAD but are up
+                ok = response.status_code < 400 or response.status_code == 405
+            except Exception:
+                ok = False
+            source_health.record(source['provider'], ok, time.monotonic() - started)
+            return ok
+        
+        results = await asyncio.gather(*(probe(source) for source in candidates))
+        return {source['url'] for source, ok in zip(candidates, results) if not ok}
     
     def _decode_allanime_url(self, encoded: str) -> Optional[str]:
         """
@@ -210,35 +467,14 @@ class AllAnimeScraper(BaseScraper):
         Based on the hex substitution pattern in ani-cli
         """
         try:
-            # Convert hex pairs to characters
-            # This is a simplified version of ani-cli's sed substitution
-            decode_map = {
-                '79': 'A', '7a': 'B', '7b': 'C', '7c': 'D', '7d': 'E', '7e': 'F',
-                '7f': 'G', '70': 'H', '71': 'I', '72': 'J', '73': 'K', '74': 'L',
-                '75': 'M', '76': 'N', '77': 'O', '68': 'P', '69': 'Q', '6a': 'R',
-                '6b': 'S', '6c': 'T', '6d': 'U', '6e': 'V', '6f': 'W', '60': 'X',
-                '61': 'Y', '62': 'Z', '59': 'a', '5a': 'b', '5b': 'c', '5c': 'd',
-                '5d': 'e', '5e': 'f', '5f': 'g', '50': 'h', '51': 'i', '52': 'j',
-                '53': 'k', '54': 'l', '55': 'm', '56': 'n', '57': 'o', '48': 'p',
-                '49': 'q', '4a': 'r', '4b': 's', '4c': 't', '4d': 'u', '4e': 'v',
-                '4f': 'w', '40': 'x', '41': 'y', '42': 'z', '08': '0', '09': '1',
-                '0a': '2', '0b': '3', '0c': '4', '0d': '5', '0e': '6', '0f': '7',
-                '00': '8', '01': '9', '15': '-', '16': '.', '67': '_', '46': '~',
-                '02': ':', '17': '/', '07': '?', '1b': '#', '63': '[', '65': ']',
-                '78': '@', '19': '!', '1c': '$', '1e': '&', '10': '(', '11': ')',
-                '12': '*', '13': '+', '14': ',', '03': ';', '05': '=', '1d': '%'
-            }
-            
-            # Split into pairs and decode
-            result = []
-            for i in range(0, len(encoded), 2):
-                hex_pair = encoded[i:i+2]
-                if hex_pair in decode_map:
-                    result.append(decode_map[hex_pair])
-                else:
-                    result.append('?')  # Unknown character
-            
-            decoded = ''.join(result)
+            try:
+                # Whole string at once: hex -> bytes -> translation table
+                decoded = bytes.fromhex(encoded).translate(DECODE_TABLE).decode('ascii')
+            except ValueError:
+                # Odd length or non-hex characters: decode pair by pair
+                decoded = ''.join(
+                    DECODE_MAP.get(encoded[i:i + 2], '?') for i in range(0, len(encoded), 2)
+                )
             
             # Fix the clock URL pattern (from ani-cli)
             decoded = decoded.replace('/clock', '/clock.json')
@@ -253,15 +489,28 @@ class AllAnimeScraper(BaseScraper):
         """Override to handle episode number properly"""
         try:
             # Search for anime
-            show_id = self.search_anime(anime_name)
+            show_id = self.run_stage('search_anime', self.search_anime, anime_name)
             if not show_id:
                 return None
             
             # Extract video URL (needs episode number)
-            video_urls = self.extract_video_url(show_id, episode_num)
+            video_urls = self.run_stage('extract_video_url', self.extract_video_url, show_id, episode_num)
             return video_urls
             
         except Exception as e:
             print(f"Error in {self.__class__.__name__}: {e}")
             return None
-
+    
+    async def get_video_async(self, anime_name: str, episode_num: int) -> Optional[Dict[str, str]]:
+        """Async version of get_video"""
+        try:
+            show_id = await self.run_stage_async('search_anime', self.search_anime_async, anime_name)
+            if not show_id:
+                return None
+            
+            return await self.run_stage_async('extract_video_url', self.extract_video_url_async,
+                                              show_id, episode_num)
+            
+        except Exception as e:
+            print(f"Error in {self.__class__.__name__}: {e}")
+            return None
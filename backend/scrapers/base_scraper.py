@@ -2,14 +2,88 @@
 Base scraper class for video providers
 """
 from abc import ABC, abstractmethod
+import asyncio
+import json
+import os
 import requests
-from typing import Optional, Dict, List
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional, Dict, List
+from urllib.parse import urlparse
+import aiohttp
 import cloudscraper
 
+from . import fixtures
+from .health import is_mirror_failure
+from .page_stream import SCRAPER_STREAM, AsyncPageStream, PageStream, ThreadedPageStream
+
+
+# Connection pool size for the async (aiohttp) session of each scraper
+ASYNC_POOL_SIZE = int(os.getenv('SCRAPER_POOL_SIZE', 100))
+
+# Upstream errors seen during the current lookup (see track_upstream_errors)
+_upstream_errors: ContextVar[Optional[List[str]]] = ContextVar('upstream_errors', default=None)
+
+
+@contextmanager
+def track_upstream_errors():
+    """
+    Collect the upstream errors (connection failures, 5xx/403/429 answers)
+    scrapers run into inside the block, including in tasks and threads
+    started from it. The scrapers swallow these errors, so this is how a
+    lookup tells "not found" from "providers failing". A nested block also
+    passes its errors on to the enclosing one.
+    """
+    errors: List[str] = []
+    enclosing = _upstream_errors.get()
+    token = _upstream_errors.set(errors)
+    try:
+        yield errors
+    finally:
+        _upstream_errors.reset(token)
+        if enclosing is not None:
+            enclosing.extend(errors)
+
+
+def is_cloudflare_challenge(status: int, headers) -> bool:
+    """Cloudflare challenge page (what cloudscraper solves and a plain aiohttp request cannot)"""
+    if headers.get('cf-mitigated', '').lower() == 'challenge':
+        return True
+    return status in (403, 429, 503) and headers.get('server', '').lower().startswith('cloudflare')
+
+
+def note_upstream_error(description: str):
+    errors = _upstream_errors.get()
+    if errors is not None:
+        errors.append(description)
+
+
+class AsyncResponse:
+    """
+    Minimal response object returned by the async request helpers
+    Mirrors the parts of requests.Response the scrapers use
+    """
+    
+    def __init__(self, status_code: int, text: str, headers, url: str):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.url = url
+    
+    def json(self):
+        return json.loads(self.text)
+
 
 class BaseScraper(ABC):
     """Abstract base class for video scrapers"""
     
+    # Optional HostRateLimiter applied to every async request (see rate_limit.py)
+    rate_limiter = None
+    # Seconds the video URLs this provider returns stay playable (None = unknown)
+    url_lifetime: Optional[int] = None
+    # Optional metrics.StageTimer fed with the latency of every stage (set by main.py)
+    stage_timer = None
+    
     def __init__(self):
         self.session = cloudscraper.create_scraper()
         self.session.headers.update({
@@ -21,6 +95,41 @@ class BaseScraper(ABC):
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1'
         })
+        self.session.request = self._tracked_request(self.session.request)
+        # Record/replay upstream responses (SCRAPER_FIXTURES, see fixtures.py)
+        fixtures.install(self.session)
+        # Created lazily inside the running event loop (see _get_async_session)
+        self._async_session: Optional[aiohttp.ClientSession] = None
+        self._async_loop = None
+        # Hosts that answered with a Cloudflare challenge: the async path sends
+        # their requests through the cloudscraper session in a worker thread
+        self._challenged_hosts = set()
+    
+    @staticmethod
+    def _tracked_request(request):
+        """Wrap session.request so upstream errors are noted (see track_upstream_errors)"""
+        def tracked(method, url, *args, **kwargs):
+            try:
+                response = request(method, url, *args, **kwargs)
+            except Exception as e:
+                note_upstream_error(f"{method} {url}: {e}")
+                raise
+            if is_mirror_failure(response.status_code):
+                note_upstream_error(f"{method} {url}: HTTP {response.status_code}")
+            return response
+        return tracked
+    
+    def run_stage(self, stage: str, fn, *args):
+        """fn(*args), timed as stage of this provider when a stage_timer is set"""
+        if self.stage_timer is None:
+            return fn(*args)
+        return self.stage_timer.run(self.__class__.__name__, stage, fn, *args)
+    
+    async def run_stage_async(self, stage: str, fn, *args):
+        """Async version of run_stage (fn returns an awaitable)"""
+        if self.stage_timer is None:
+            return await fn(*args)
+        return await self.stage_timer.run_async(self.__class__.__name__, stage, fn, *args)
     
     @abstractmethod
     def search_anime(self, anime_name: str) -> Optional[str]:
@@ -41,20 +150,173 @@ class BaseScraper(ABC):
         """Main method to get video URLs"""
         try:
             # Search for anime
-            anime_id = self.search_anime(anime_name)
+            anime_id = self.run_stage('search_anime', self.search_anime, anime_name)
             if not anime_id:
                 return None
             
             # Get episode URL
-            episode_url = self.get_episode_url(anime_id, episode_num)
+            episode_url = self.run_stage('get_episode_url', self.get_episode_url, anime_id, episode_num)
             if not episode_url:
                 return None
             
             # Extract video URLs
-            video_urls = self.extract_video_url(episode_url)
+            video_urls = self.run_stage('extract_video_url', self.extract_video_url, episode_url)
             return video_urls
+        
+        except Exception as e:
+            print(f"Error in {self.__class__.__name__}: {e}")
+            return None
+    
+    # ------------------------------------------------------------------
+    # Async path
+    #
+    # The default implementations run the sync methods in a worker thread
+    # so every scraper can be awaited without blocking the event loop.
+    # Scrapers override them with native aiohttp versions.
+    # ------------------------------------------------------------------
+    
+    async def search_anime_async(self, anime_name: str) -> Optional[str]:
+        """Async version of search_anime"""
+        return await asyncio.to_thread(self.search_anime, anime_name)
+    
+    async def get_episode_url_async(self, anime_id: str, episode_num: int) -> Optional[str]:
+        """Async version of get_episode_url"""
+        return await asyncio.to_thread(self.get_episode_url, anime_id, episode_num)
+    
+    async def extract_video_url_async(self, episode_url: str) -> Optional[Dict[str, str]]:
+        """Async version of extract_video_url"""
+        return await asyncio.to_thread(self.extract_video_url, episode_url)
+    
+    async def get_video_async(self, anime_name: str, episode_num: int) -> Optional[Dict[str, str]]:
+        """Async version of get_video"""
+        try:
+            anime_id = await self.run_stage_async('search_anime', self.search_anime_async, anime_name)
+            if not anime_id:
+                return None
             
+            episode_url = await self.run_stage_async('get_episode_url', self.get_episode_url_async,
+                                                     anime_id, episode_num)
+            if not episode_url:
+                return None
+            
+            return await self.run_stage_async('extract_video_url', self.extract_video_url_async, episode_url)
+        
         except Exception as e:
             print(f"Error in {self.__class__.__name__}: {e}")
             return None
-
+    
+    async def _get_async_session(self) -> aiohttp.ClientSession:
+        """Return the pooled aiohttp session, creating it for the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._async_session is None or self._async_session.closed or self._async_loop is not loop:
+            self._async_session = fixtures.async_session(lambda: aiohttp.ClientSession(
+                headers=dict(self.session.headers),
+                connector=aiohttp.TCPConnector(limit=ASYNC_POOL_SIZE, ttl_dns_cache=300),
+            ))
+            self._async_loop = loop
+        return self._async_session
+    
+    def _challenged(self, url: str, status: int, headers) -> bool:
+        """True (and remember the host) when an async request ran into a Cloudflare challenge"""
+        if not is_cloudflare_challenge(status, headers):
+            return False
+        host = urlparse(url).netloc
+        if host not in self._challenged_hosts:
+            print(f"[DEBUG] Cloudflare challenge on {host}, using cloudscraper for it")
+            self._challenged_hosts.add(host)
+        return True
+    
+    @staticmethod
+    async def _in_thread(fn, *args, **kwargs):
+        """Run a cloudscraper call in a worker thread; its errors are raised as aiohttp.ClientError"""
+        try:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        except requests.RequestException as e:
+            raise aiohttp.ClientError(str(e)) from e
+    
+    async def _async_request(self, method: str, url: str, timeout: float = 15, **kwargs) -> AsyncResponse:
+        """Perform a request on the async session and read the whole body"""
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(url)
+        if urlparse(url).netloc not in self._challenged_hosts:
+            session = await self._get_async_session()
+            try:
+                async with session.request(
+                    method,
+                    url,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                    **kwargs
+                ) as response:
+                    text = await response.text(errors='replace')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                note_upstream_error(f"{method} {url}: {e!r}")
+                raise
+            if not self._challenged(url, response.status, response.headers):
+                if is_mirror_failure(response.status):
+                    note_upstream_error(f"{method} {url}: HTTP {response.status}")
+                return AsyncResponse(response.status, text, response.headers, str(response.url))
+        
+        response = await self._in_thread(self.session.request, method, url, timeout=timeout, **kwargs)
+        return AsyncResponse(response.status_code, response.text, response.headers, response.url)
+    
+    @contextmanager
+    def stream_page(self, url: str, timeout: float = 15, **kwargs) -> Iterator[PageStream]:
+        """
+        GET a page and read its body incrementally (see page_stream.py)
+        The connection is closed on exit, so leaving the block early skips
+        the rest of the page. With SCRAPER_STREAM off the body is read up front.
+        """
+        page = PageStream(self.session.get(url, timeout=timeout, stream=True, **kwargs))
+        try:
+            if not SCRAPER_STREAM:
+                page.read_all()
+            yield page
+        finally:
+            page.close()
+    
+    @asynccontextmanager
+    async def async_stream_page(self, url: str, timeout: float = 15, **kwargs) -> AsyncIterator[AsyncPageStream]:
+        """Async version of stream_page"""
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(url)
+        page = None
+        if urlparse(url).netloc not in self._challenged_hosts:
+            session = await self._get_async_session()
+            try:
+                response = await session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                note_upstream_error(f"GET {url}: {e!r}")
+                raise
+            if self._challenged(url, response.status, response.headers):
+                response.close()
+            else:
+                if is_mirror_failure(response.status):
+                    note_upstream_error(f"GET {url}: HTTP {response.status}")
+                page = AsyncPageStream(response)
+        if page is None:
+            page = ThreadedPageStream(await self._in_thread(
+                lambda: PageStream(self.session.get(url, timeout=timeout, stream=True, **kwargs))
+            ))
+        try:
+            if not SCRAPER_STREAM:
+                await page.read_all()
+            yield page
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            note_upstream_error(f"GET {url}: {e!r}")
+            raise
+        finally:
+            page.close()
+    
+    async def async_get(self, url: str, **kwargs) -> AsyncResponse:
+        """Async equivalent of self.session.get"""
+        return await self._async_request('GET', url, **kwargs)
+    
+    async def async_head(self, url: str, **kwargs) -> AsyncResponse:
+        """Async equivalent of self.session.head"""
+        return await self._async_request('HEAD', url, **kwargs)
+    
+    async def close_async(self):
+        """Close the async session (call on application shutdown)"""
+        if self._async_session is not None and not self._async_session.closed:
+            await self._async_session.close()
+        self._async_session = None
@@ -5,25 +5,47 @@ Does NOT use ani-cli - pure Python implementation
 import re
 import json
 import base64
-from bs4 import BeautifulSoup
-from typing import Optional, Dict
-from .base_scraper import BaseScraper
+from typing import Optional, Dict, List
+from .embeds import first_embed, first_embed_async
+from .mirrored_scraper import MirroredScraper
+from .html_parser import html_parser
+from .page_stream import early_hit, early_hit_async, stream_values, stream_values_async
+from .url_scanner import Hit, PatternScanner
 from urllib.parse import urljoin, urlparse
 
 
-class DirectWebScraper(BaseScraper):
+# Common places player scripts keep the video URL, in priority order
+JS_VIDEO_PATTERNS = PatternScanner([
+    r'sources:\s*\[\s*{\s*file:\s*["\']([^"\']+)["\']',
+    r'source:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
+    r'file:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
+    r'url:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
+    r'videoUrl:\s*["\']([^"\']+)["\']',
+], re.IGNORECASE)
+
+# Bare video URLs anywhere in a page
+TEXT_VIDEO_PATTERNS = PatternScanner([
+    r'(https?://[^\s"\'<>]+\.m3u8[^\s"\'<>]*)',
+    r'(https?://[^\s"\'<>]+/playlist\.m3u8[^\s"\'<>]*)',
+    r'(https?://[^\s"\'<>]+\.mp4[^\s"\'<>]*)',
+])
+
+
+class DirectWebScraper(MirroredScraper):
     """
     Direct web scraper that extracts video URLs from anime streaming pages
     This is a pure Python implementation without external dependencies
     """
     
+    # Page-embedded sources are usually tokenised player links
+    url_lifetime = 1800
+    
     def __init__(self):
-        super().__init__()
         # Updated working mirrors
-        self.mirrors = [
+        super().__init__([
             "https://anitaku.pe",
             "https://anitaku.to",
-        ]
+        ])
         self.base_url = self.mirrors[0]
         
     def search_anime(self, anime_name: str) -> Optional[str]:
@@ -33,113 +55,109 @@ class DirectWebScraper(BaseScraper):
             return "one-piece"
         return None
     
-    def get_episode_url(self, anime_id: str, episode_num: int) -> Optional[str]:
-        """Get episode page URL"""
-        # Try different URL formats
-        url_patterns = [
+    def _episode_slugs(self, anime_id: str, episode_num: int) -> List[str]:
+        """Episode page slugs to try on each mirror"""
+        return [
             f"{anime_id}-episode-{episode_num}",
         ]
+    
+    def _extract_from_episode(self, page, episode_url: str) -> Optional[Dict[str, str]]:
+        """Uses multiple extraction methods on the streamed episode page"""
+        # Method 1: Extract from iframe sources
+        video_url = self._extract_from_iframes(page, episode_url)
+        if video_url:
+            return video_url
         
-        for mirror in self.mirrors:
-            for pattern in url_patterns:
-                url = f"{mirror}/{pattern}"
-                try:
-                    response = self.session.head(url, timeout=10, allow_redirects=True)
-                    if response.status_code == 200:
-                        self.base_url = mirror
-                        return url
-                except:
-                    continue
-        return None
+        # Method 2 and 3: JavaScript variables and page source
+        return self._extract_from_html(page.read_all())
     
-    def extract_video_url(self, episode_url: str) -> Optional[Dict[str, str]]:
-        """
-        Extract video URLs from episode page
-        Uses multiple extraction methods
-        """
-        try:
-            print(f"[INFO] Fetching: {episode_url}")
-            response = self.session.get(episode_url, timeout=15)
-            
-            if response.status_code != 200:
-                return None
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Method 1: Extract from iframe sources
-            video_url = self._extract_from_iframes(soup, episode_url)
-            if video_url:
-                return video_url
-            
-            # Method 2: Extract from JavaScript variables
-            video_url = self._extract_from_js_vars(response.text)
-            if video_url:
-                return video_url
-            
-            # Method 3: Extract from page sources
-            video_url = self._extract_from_page_source(response.text)
-            if video_url:
-                return video_url
-            
-            print(f"[WARNING] No video URLs found")
-            return None
-            
-        except Exception as e:
-            print(f"[ERROR] Extraction failed: {e}")
-            return None
+    async def _extract_from_episode_async(self, page, episode_url: str) -> Optional[Dict[str, str]]:
+        """Async version of _extract_from_episode"""
+        video_url = await self._extract_from_iframes_async(page, episode_url)
+        if video_url:
+            return video_url
+        
+        return self._extract_from_html(await page.read_all())
     
-    def _extract_from_iframes(self, soup, base_url) -> Optional[Dict[str, str]]:
-        """Extract from iframe embed players"""
-        iframes = soup.find_all('iframe')
+    def _extract_from_html(self, html_text) -> Optional[Dict[str, str]]:
+        """Methods that only need the episode page itself"""
+        # Method 2: Extract from JavaScript variables
+        video_url = self._extract_from_js_vars(html_text)
+        if video_url:
+            return video_url
+        
+        # Method 3: Extract from page sources
+        video_url = self._extract_from_page_source(html_text)
+        if video_url:
+            return video_url
         
-        for iframe in iframes:
-            src = iframe.get('src', '')
+        print(f"[WARNING] No video URLs found")
+        return None
+    
+    def _iframe_sources(self, html_text, base_url) -> List[str]:
+        """Absolute src of the iframes that may hold a video player"""
+        sources = []
+        for src in html_parser.attr_values(html_text, 'iframe', 'src'):
             if not src:
                 continue
                 
             if not src.startswith('http'):
                 src = urljoin(base_url, src)
             
-            print(f"[INFO] Checking iframe: {src[:60]}...")
-            
             # Skip ads and non-video iframes
             if any(skip in src.lower() for skip in ['ads', 'banner', 'promo']):
                 continue
             
-            try:
-                embed_response = self.session.get(src, timeout=15)
-                if embed_response.status_code == 200:
-                    # Look for video URLs in embed page
-                    video_urls = self._find_video_urls_in_text(embed_response.text)
-                    if video_urls:
-                        return video_urls
-            except:
-                continue
-        
-        return None
+            sources.append(src)
+        return sources
+    
+    def _extract_from_iframes(self, page, base_url) -> Optional[Dict[str, str]]:
+        """Extract from iframe embed players, fetched concurrently as they arrive (first video wins)"""
+        sources = stream_values(page, '<iframe', lambda html_text: self._iframe_sources(html_text, base_url))
+        return first_embed(sources, self._extract_from_embed)
+    
+    async def _extract_from_iframes_async(self, page, base_url) -> Optional[Dict[str, str]]:
+        """Async version of _extract_from_iframes"""
+        sources = stream_values_async(page, '<iframe', lambda html_text: self._iframe_sources(html_text, base_url))
+        return await first_embed_async(sources, self._extract_from_embed_async)
+    
+    def _extract_from_embed(self, src) -> Optional[Dict[str, str]]:
+        """Video URL in one embed page"""
+        print(f"[INFO] Checking iframe: {src[:60]}...")
+        try:
+            with self.stream_page(src, timeout=15) as embed:
+                if embed.status_code != 200:
+                    return None
+                # Look for video URLs in embed page, stopping at the first certain one
+                hit = early_hit(embed, TEXT_VIDEO_PATTERNS.stream(accept=self._accepts_video_url))
+                return self._direct_result(hit) if hit else self._find_video_urls_in_text(embed.text)
+        except:
+            return None
+    
+    async def _extract_from_embed_async(self, src) -> Optional[Dict[str, str]]:
+        """Async version of _extract_from_embed"""
+        print(f"[INFO] Checking iframe: {src[:60]}...")
+        try:
+            async with self.async_stream_page(src, timeout=15) as embed:
+                if embed.status_code != 200:
+                    return None
+                hit = await early_hit_async(embed, TEXT_VIDEO_PATTERNS.stream(accept=self._accepts_video_url))
+                return self._direct_result(hit) if hit else self._find_video_urls_in_text(embed.text)
+        except Exception:
+            return None
     
     def _extract_from_js_vars(self, html_text) -> Optional[Dict[str, str]]:
         """Extract from JavaScript variables in page source"""
         # Look for common patterns where video URLs are stored
-        js_patterns = [
-            r'sources:\s*\[\s*{\s*file:\s*["\']([^"\']+)["\']',
-            r'source:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-            r'file:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-            r'url:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-            r'videoUrl:\s*["\']([^"\']+)["\']',
-        ]
-        
-        for pattern in js_patterns:
-            matches = re.findall(pattern, html_text, re.IGNORECASE)
-            if matches:
-                url = matches[0].replace('\\/', '/')
-                if 'm3u8' in url or 'mp4' in url:
-                    print(f"[SUCCESS] Found video URL in JS: {url[:60]}...")
-                    return {
-                        'default': url,
-                        '720p': url,
-                        'source': 'javascript'
-                    }
+        hit = JS_VIDEO_PATTERNS.first(html_text, accept=lambda value: 'm3u8' in value or 'mp4' in value)
+        if hit:
+            url = hit.value.replace('\\/', '/')
+            print(f"[SUCCESS] Found video URL in JS: {url[:60]}...")
+            return {
+                'default': url,
+                '720p': url,
+                'source': 'javascript'
+            }
         
         return None
     
@@ -149,29 +167,31 @@ class DirectWebScraper(BaseScraper):
     
     def _find_video_urls_in_text(self, text) -> Optional[Dict[str, str]]:
         """Find video URLs in any text"""
-        # Comprehensive video URL patterns
-        patterns = [
-            r'(https?://[^\s"\'<>]+\.m3u8[^\s"\'<>]*)',
-            r'(https?://[^\s"\'<>]+/playlist\.m3u8[^\s"\'<>]*)',
-            r'(https?://[^\s"\'<>]+\.mp4[^\s"\'<>]*)',
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                url = matches[0]
-                # Clean up the URL
-                url = url.replace('\\/', '/').replace('\\', '')
-                
-                # Validate URL
-                if url.startswith('http') and ('m3u8' in url or 'mp4' in url):
-                    print(f"[SUCCESS] Found video URL: {url[:60]}...")
-                    return {
-                        'default': url,
-                        '720p': url,
-                        '1080p': url,
-                        'source': 'direct'
-                    }
+        hit = TEXT_VIDEO_PATTERNS.first(text, accept=self._accepts_video_url)
+        if hit:
+            return self._direct_result(hit)
         
         return None
+    
+    def _direct_result(self, hit: Hit) -> Dict[str, str]:
+        url = self._clean_url(hit.value)
+        print(f"[SUCCESS] Found video URL: {url[:60]}...")
+        return {
+            'default': url,
+            '720p': url,
+            '1080p': url,
+            'source': 'direct'
+        }
+    
+    @classmethod
+    def _accepts_video_url(cls, value: str) -> bool:
+        return cls._is_video_url(cls._clean_url(value))
+    
+    @staticmethod
+    def _clean_url(url: str) -> str:
+        return url.replace('\\/', '/').replace('\\', '')
+    
+    @staticmethod
+    def _is_video_url(url: str) -> bool:
+        return url.startswith('http') and ('m3u8' in url or 'mp4' in url)
 
@@ -0,0 +1,162 @@
+"""
+Concurrent embed resolution
+An episode page usually carries several iframes (ads, dead hosts, the
+real player). Fetching them one by one means every bad iframe costs up to
+a full timeout before the player is tried. Here up to
+SCRAPER_EMBED_CONCURRENCY embeds are fetched at once, starting each as soon
+as its iframe has streamed in; the first one that yields a video URL wins
+and the others are cancelled. Hosts that keep failing are skipped for a
+while (embed_health).
+"""
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, Set
+from urllib.parse import urlparse
+
+from .health import embed_health
+
+
+EMBED_CONCURRENCY = max(1, int(os.getenv('SCRAPER_EMBED_CONCURRENCY', 4)))  # Embeds fetched at once per page
+
+Resolve = Callable[[str], Optional[Dict[str, str]]]
+AsyncResolve = Callable[[str], Awaitable[Optional[Dict[str, str]]]]
+
+
+def embed_host(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def _allowed(src: str) -> bool:
+    if embed_health.allow(embed_host(src)):
+        return True
+    print(f"[DEBUG] Skipping embed on failing host {embed_host(src)}")
+    return False
+
+
+def _record(src: str, ok: bool, started: float):
+    embed_health.record(embed_host(src), ok, time.monotonic() - started)
+
+
+def _resolve_timed(resolve: Resolve, src: str) -> Optional[Dict[str, str]]:
+    """resolve() that feeds embed_health"""
+    started = time.monotonic()
+    try:
+        result = resolve(src)
+    except Exception:
+        _record(src, False, started)
+        raise
+    _record(src, bool(result), started)
+    return result
+
+
+async def _resolve_timed_async(resolve: AsyncResolve, src: str) -> Optional[Dict[str, str]]:
+    """Async version of _resolve_timed (cancelled attempts are not counted)"""
+    started = time.monotonic()
+    try:
+        result = await resolve(src)
+    except Exception:
+        _record(src, False, started)
+        raise
+    _record(src, bool(result), started)
+    return result
+
+
+def first_embed(sources: Iterator[str], resolve: Resolve,
+                limit: int = EMBED_CONCURRENCY) -> Optional[Dict[str, str]]:
+    """
+    First video found by resolve() over the embed URLs from sources, up to
+    limit at a time in worker threads. Threads cannot be interrupted, so
+    fetches still running when a winner is found finish in the background
+    and their results are dropped.
+    """
+    pool = ThreadPoolExecutor(max_workers=limit, thread_name_prefix='embed')
+    running: Set[Future] = set()
+    
+    def collect(done) -> Optional[Dict[str, str]]:
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[DEBUG] Embed failed: {e}")
+                continue
+            if result:
+                return result
+        return None
+    
+    try:
+        for src in sources:
+            if not _allowed(src):
+                continue
+            while len(running) >= limit:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                result = collect(done)
+                if result:
+                    return result
+            # Copy the context so upstream errors are still tracked (see track_upstream_errors)
+            running.add(pool.submit(contextvars.copy_context().run, _resolve_timed, resolve, src))
+            
+            # Finished while the page was being read
+            done = {future for future in running if future.done()}
+            running -= done
+            result = collect(done)
+            if result:
+                return result
+        
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            result = collect(done)
+            if result:
+                return result
+        return None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def first_embed_async(sources: AsyncIterator[str], resolve: AsyncResolve,
+                            limit: int = EMBED_CONCURRENCY) -> Optional[Dict[str, str]]:
+    """
+    Async version of first_embed: the embeds run as tasks next to the read
+    of the page itself, and the losers are cancelled as soon as one wins
+    """
+    running: Set[asyncio.Task] = set()
+    next_source: Optional[asyncio.Task] = None
+    exhausted = False
+    
+    try:
+        while True:
+            if next_source is None and not exhausted and len(running) < limit:
+                next_source = asyncio.ensure_future(sources.__anext__())
+            waiting = running | ({next_source} if next_source else set())
+            if not waiting:
+                return None
+            
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            
+            if next_source in done:
+                try:
+                    src = next_source.result()
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    if _allowed(src):
+                        running.add(asyncio.create_task(_resolve_timed_async(resolve, src)))
+                next_source = None
+            
+            for task in done & running:
+                running.discard(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    print(f"[DEBUG] Embed failed: {e}")
+                    continue
+                if result:
+                    return result
+    finally:
+        pending = running | ({next_source} if next_source else set())
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
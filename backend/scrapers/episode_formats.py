@@ -0,0 +1,56 @@
+"""
+Per-mirror episode URL formats
+Mirrors differ in how they name episode pages (`-episode-N` vs
+`-episode-N-english-subbed`), so get_episode_url used to HEAD every
+mirror x format combination before the page was fetched. Once a format
+has worked on a mirror it is remembered here and the episode URL is built
+without any request. A 404 does not forget it (the episode may just not
+be out yet): the format is only replaced when another slug answers on
+that mirror.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Episode URLs remembered until their page is fetched (get_episode_url without a matching extract)
+MAX_PENDING = 256
+
+
+class EpisodeFormats:
+    """Slug format index that last worked on each mirror"""
+    
+    def __init__(self):
+        self._formats: Dict[str, int] = {}
+        # Handed out but not yet fetched URLs -> (mirror, anime_id, episode_num)
+        self._pending: 'OrderedDict[str, Tuple[str, str, int]]' = OrderedDict()
+    
+    def learn(self, mirror: str, index: int):
+        """slugs[index] answered 200 on mirror"""
+        self._formats[mirror] = index
+    
+    def known(self, mirror: str) -> Optional[int]:
+        """Slug format index that works on mirror, None if not known"""
+        return self._formats.get(mirror)
+    
+    def expect(self, url: str, mirror: str, anime_id: str, episode_num: int):
+        """Remember what url was built for until its page is fetched (see fetched)"""
+        self._pending[url] = (mirror, anime_id, episode_num)
+        self._pending.move_to_end(url)
+        while len(self._pending) > MAX_PENDING:
+            self._pending.popitem(last=False)
+    
+    def guess(self, mirrors: Iterable[str], slugs: List[str], anime_id: str,
+              episode_num: int) -> Optional[Tuple[str, str]]:
+        """(mirror, episode URL) on the first of mirrors with a known format, None if none has one"""
+        for mirror in mirrors:
+            index = self._formats.get(mirror)
+            if index is None or index >= len(slugs):
+                continue
+            url = f"{mirror}/{slugs[index]}"
+            self.expect(url, mirror, anime_id, episode_num)
+            return mirror, url
+        return None
+    
+    def fetched(self, url: str) -> Optional[Tuple[str, str, int]]:
+        """(mirror, anime_id, episode_num) url was built for, None if it did not come from here"""
+        return self._pending.pop(url, None)
@@ -0,0 +1,309 @@
+"""
+Record/replay of upstream HTTP traffic
+With SCRAPER_FIXTURES=record every response the scrapers receive (sync
+cloudscraper session and async aiohttp session alike) is saved as a JSON
+file under SCRAPER_FIXTURE_DIR. With SCRAPER_FIXTURES=replay the same
+requests are answered from those files without touching the network,
+each after SCRAPER_FIXTURE_LATENCY seconds ("recorded" replays the time
+the request took while recording). A request without a fixture fails
+like an unreachable host.
+
+Used by benchmarks/scrapers.py to time the scrapers offline.
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import aiohttp
+import requests
+from multidict import CIMultiDict, CIMultiDictProxy
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from yarl import URL
+
+
+SCRAPER_FIXTURES = os.getenv('SCRAPER_FIXTURES', 'off').lower()  # off, record or replay
+SCRAPER_FIXTURE_DIR = os.getenv(
+    'SCRAPER_FIXTURE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+)
+SCRAPER_FIXTURE_LATENCY = os.getenv('SCRAPER_FIXTURE_LATENCY', '0')  # Seconds per response, or "recorded"
+
+# Stored bodies are decoded, so these no longer describe them
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 10
+CHARSET = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+def canonical_url(url: str) -> str:
+    """URL with sorted query parameters, so requests and aiohttp (params=) build the same key"""
+    parsed = URL(url)
+    return str(parsed.with_query(sorted(parsed.query.items())).with_fragment(None))
+
+
+class FixtureStore:
+    """One JSON file per (method, URL, body) under directory/<host>/"""
+    
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+    
+    def path(self, method: str, url: str, body: bytes = b'') -> Path:
+        url = canonical_url(url)
+        digest = hashlib.sha1(f"{method.upper()} {url}".encode() + b'\0' + (body or b'')).hexdigest()
+        host = URL(url).host or 'unknown'
+        return self.directory / host / f"{method.lower()}-{digest[:20]}.json"
+    
+    def load(self, method: str, url: str, body: bytes = b'') -> Optional[Dict]:
+        try:
+            with open(self.path(method, url, body), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def save(self, method: str, url: str, body: bytes, status: int, headers, content: bytes,
+             elapsed: float) -> Dict:
+        record = {
+            'method': method.upper(),
+            'url': url,
+            'status': status,
+            'headers': [[name, value] for name, value in headers.items() if name.lower() not in DROPPED_HEADERS],
+            'elapsed': round(elapsed, 4),
+        }
+        try:
+            record['body'] = content.decode('utf-8')
+        except UnicodeDecodeError:
+            record['body_base64'] = base64.b64encode(content).decode('ascii')
+        
+        path = self.path(method, url, body)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, indent=1)
+        os.replace(tmp_path, path)
+        return record
+
+
+def record_body(record: Dict) -> bytes:
+    if 'body_base64' in record:
+        return base64.b64decode(record['body_base64'])
+    return record.get('body', '').encode('utf-8')
+
+
+def replay_delay(record: Dict) -> float:
+    """Seconds to wait before a replayed response (SCRAPER_FIXTURE_LATENCY)"""
+    if SCRAPER_FIXTURE_LATENCY == 'recorded':
+        return record.get('elapsed', 0.0)
+    return float(SCRAPER_FIXTURE_LATENCY)
+
+
+def _request_body(body) -> bytes:
+    if body is None:
+        return b''
+    return body.encode('utf-8') if isinstance(body, str) else bytes(body)
+
+
+_stores: Dict[str, FixtureStore] = {}
+
+
+def fixture_store() -> FixtureStore:
+    """Store for the current SCRAPER_FIXTURE_DIR"""
+    store = _stores.get(SCRAPER_FIXTURE_DIR)
+    if store is None:
+        store = _stores[SCRAPER_FIXTURE_DIR] = FixtureStore(SCRAPER_FIXTURE_DIR)
+    return store
+
+
+# ----------------------------------------------------------------------
+# Sync: transport adapter mounted on the requests/cloudscraper session
+# ----------------------------------------------------------------------
+
+class FixtureAdapter(HTTPAdapter):
+    """
+    Records the responses of the wrapped adapter, or replays them when there
+    is none. Every redirect hop goes through send() and is stored on its own.
+    """
+    
+    def __init__(self, store: FixtureStore, inner: Optional[HTTPAdapter] = None):
+        super().__init__()
+        self.store = store
+        self.inner = inner
+    
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        body = _request_body(request.body)
+        if self.inner is not None:
+            started = time.monotonic()
+            response = self.inner.send(request, stream=False, timeout=timeout, verify=verify,
+                                       cert=cert, proxies=proxies)
+            record = self.store.save(request.method, request.url, body, response.status_code,
+                                     response.headers, response.content, time.monotonic() - started)
+        else:
+            record = self.store.load(request.method, request.url, body)
+            if record is None:
+                raise requests.exceptions.ConnectionError(
+                    f"No fixture for {request.method} {request.url}", request=request
+                )
+            time.sleep(replay_delay(record))
+        
+        raw = HTTPResponse(
+            body=io.BytesIO(record_body(record)),
+            headers=record['headers'],
+            status=record['status'],
+            preload_content=False,
+            request_method=request.method,
+        )
+        return self.build_response(request, raw)
+
+
+def install(session: requests.Session):
+    """Mount the fixture adapters on a scraper session (no-op with SCRAPER_FIXTURES=off)"""
+    if SCRAPER_FIXTURES not in ('record', 'replay'):
+        return
+    store = fixture_store()
+    for prefix in ('https://', 'http://'):
+        inner = session.get_adapter(prefix) if SCRAPER_FIXTURES == 'record' else None
+        session.mount(prefix, FixtureAdapter(store, inner))
+
+
+# ----------------------------------------------------------------------
+# Async: stand-in for the aiohttp.ClientSession of a scraper
+# ----------------------------------------------------------------------
+
+class _FixtureContent:
+    """response.content (StreamReader) of a replayed response"""
+    
+    def __init__(self, body: bytes):
+        self._body = io.BytesIO(body)
+    
+    async def read(self, n: int = -1) -> bytes:
+        return self._body.read(n)
+
+
+class FixtureAsyncResponse:
+    """The parts of aiohttp.ClientResponse the scrapers use"""
+    
+    def __init__(self, record: Dict, url: str):
+        self.status = record['status']
+        self.headers = CIMultiDictProxy(CIMultiDict(record['headers']))
+        self.url = URL(url)
+        self._body = record_body(record)
+        self.content = _FixtureContent(self._body)
+        match = CHARSET.search(self.headers.get('Content-Type', ''))
+        self.charset = match.group(1) if match else None
+    
+    async def read(self) -> bytes:
+        return self._body
+    
+    async def text(self, encoding: Optional[str] = None, errors: str = 'strict') -> str:
+        return self._body.decode(encoding or self.charset or 'utf-8', errors)
+    
+    async def json(self, **kwargs):
+        return json.loads(self._body)
+    
+    def release(self):
+        pass
+    
+    def close(self):
+        pass
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class _FixtureRequest:
+    """Result of FixtureAsyncSession.request: awaitable and an async context manager, like aiohttp's"""
+    
+    def __init__(self, coroutine):
+        self._coroutine = coroutine
+    
+    def __await__(self):
+        return self._coroutine.__await__()
+    
+    async def __aenter__(self) -> FixtureAsyncResponse:
+        return await self._coroutine
+    
+    async def __aexit__(self, *exc):
+        pass
+
+
+class FixtureAsyncSession:
+    """
+    Records through a real aiohttp session, or replays when there is none
+    Redirects are followed here one hop at a time (like requests does), so
+    both paths store and find the same per-hop fixtures.
+    """
+    
+    def __init__(self, store: FixtureStore, session: Optional[aiohttp.ClientSession] = None):
+        self.store = store
+        self.session = session
+        self._closed = False
+    
+    @property
+    def closed(self) -> bool:
+        return self.session.closed if self.session is not None else self._closed
+    
+    def request(self, method: str, url: str, **kwargs) -> _FixtureRequest:
+        return _FixtureRequest(self._request(method, url, **kwargs))
+    
+    def get(self, url: str, **kwargs) -> _FixtureRequest:
+        return self.request('GET', url, **kwargs)
+    
+    def head(self, url: str, **kwargs) -> _FixtureRequest:
+        return self.request('HEAD', url, **kwargs)
+    
+    async def _request(self, method: str, url: str, params=None, allow_redirects: bool = True,
+                       **kwargs) -> FixtureAsyncResponse:
+        url = str(URL(url).update_query(params)) if params else url
+        for _ in range(MAX_REDIRECTS):
+            record = await self._hop(method, url, kwargs)
+            location = dict((name.lower(), value) for name, value in record['headers']).get('location')
+            if not allow_redirects or record['status'] not in REDIRECT_STATUSES or not location:
+                break
+            url = str(URL(url).join(URL(location)))
+            if record['status'] == 303 or (record['status'] in (301, 302) and method == 'POST'):
+                method = 'GET'
+                kwargs = {name: value for name, value in kwargs.items() if name not in ('data', 'json')}
+        return FixtureAsyncResponse(record, url)
+    
+    async def _hop(self, method: str, url: str, kwargs: Dict) -> Dict:
+        """One request without following redirects"""
+        body = _request_body(json.dumps(kwargs['json']) if kwargs.get('json') is not None else kwargs.get('data'))
+        if self.session is not None:
+            started = time.monotonic()
+            async with self.session.request(method, url, allow_redirects=False, **kwargs) as response:
+                content = await response.read()
+            return await asyncio.to_thread(
+                self.store.save, method, url, body, response.status, response.headers, content,
+                time.monotonic() - started
+            )
+        
+        record = self.store.load(method, url, body)
+        if record is None:
+            raise aiohttp.ClientConnectionError(f"No fixture for {method} {url}")
+        await asyncio.sleep(replay_delay(record))
+        return record
+    
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+        self._closed = True
+
+
+def async_session(create: Callable[[], aiohttp.ClientSession]):
+    """The scraper's async session: create() itself, or its fixture stand-in"""
+    if SCRAPER_FIXTURES == 'replay':
+        return FixtureAsyncSession(fixture_store())
+    if SCRAPER_FIXTURES == 'record':
+        return FixtureAsyncSession(fixture_store(), create())
+    return create()
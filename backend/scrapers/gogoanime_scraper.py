@@ -4,25 +4,50 @@ Based on ani-cli's gogoanime provider
 """
 import re
 import json
-from bs4 import BeautifulSoup
-from typing import Optional, Dict
+import time
+from typing import Optional, Dict, List
 from urllib.parse import urljoin, urlparse, parse_qs
-from .base_scraper import BaseScraper
+from .embeds import first_embed, first_embed_async
+from .health import mirror_health, is_mirror_failure
+from .mirrored_scraper import MirroredScraper
+from .html_parser import html_parser
+from .page_stream import early_hit, early_hit_async, stream_values, stream_values_async
+from .url_scanner import Hit, PatternScanner
 
 
-class GogoAnimeScraper(BaseScraper):
+# Method 3: video URLs anywhere in the episode page, in priority order
+PAGE_VIDEO_PATTERNS = PatternScanner([
+    r'https?://[^\s"\'<>]+\.m3u8',
+    r'https?://[^\s"\'<>]+/playlist\.m3u8',
+    r'file:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
+])
+
+# Video sources in embed player pages, in priority order
+EMBED_VIDEO_PATTERNS = PatternScanner([
+    r'"file":\s*"(https?://[^"]+\.m3u8[^"]*)"',
+    r'"src":\s*"(https?://[^"]+\.m3u8[^"]*)"',
+    r"'file':\s*'(https?://[^']+\.m3u8[^']*)'",
+    r'source.*?src=[\'"](https?://[^"\']+)["\']',
+    r'(https://[^\s"\'<>]+\.m3u8[^\s"\'<>]*)',
+    r'"sources":\s*\[\s*{\s*"file":\s*"([^"]+)"',
+], re.IGNORECASE)
+
+
+class GogoAnimeScraper(MirroredScraper):
     """Scraper for GogoAnime (similar to ani-cli implementation)"""
     
+    # Embed player links carry short-lived tokens
+    url_lifetime = 1800
+    
     def __init__(self):
-        super().__init__()
         # Note: These URLs might need to be updated as sites change domains
         # Try multiple mirrors in case one is down
-        self.mirrors = [
+        super().__init__([
             "https://anitaku.pe",
             "https://anitaku.to",
             "https://gogoanime3.co",
             "https://www1.gogoanime.bid"
-        ]
+        ])
         self.base_url = self.mirrors[0]
         self.search_url = f"{self.base_url}/search.html"
     
@@ -35,30 +60,24 @@ class GogoAnimeScraper(BaseScraper):
                 return "one-piece"
             
             # Try each mirror until one works
-            for mirror in self.mirrors:
+            for mirror in mirror_health.ordered(self.mirrors):
+                started = time.monotonic()
                 try:
                     search_url = f"{mirror}/search.html"
                     params = {'keyword': anime_name}
                     response = self.session.get(search_url, params=params, timeout=10)
+                    mirror_health.record(mirror, not is_mirror_failure(response.status_code),
+                                         time.monotonic() - started)
                     
                     if response.status_code != 200:
                         continue
                     
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Find first search result
-                    result = soup.find('li')
-                    if result:
-                        link = result.find('a')
-                        if link and link.get('href'):
-                            # Extract anime ID from URL
-                            href = link.get('href')
-                            anime_id = href.split('/')[-1]
-                            print(f"[DEBUG] Found anime ID: {anime_id}")
-                            self.base_url = mirror  # Use this mirror for future requests
-                            return anime_id
+                    anime_id = self._parse_search_page(response.text)
+                    if anime_id:
+                        return anime_id
                 except Exception as e:
                     print(f"[DEBUG] Mirror {mirror} failed: {e}")
+                    mirror_health.record(mirror, False, time.monotonic() - started)
                     continue
             
             return None
@@ -67,158 +86,188 @@ class GogoAnimeScraper(BaseScraper):
             print(f"Search error: {e}")
             return None
     
-    def get_episode_url(self, anime_id: str, episode_num: int) -> Optional[str]:
-        """Construct the episode URL"""
+    async def search_anime_async(self, anime_name: str) -> Optional[str]:
+        """Async version of search_anime"""
         try:
-            # Try different URL formats and mirrors
-            url_formats = [
-                f"{anime_id}-episode-{episode_num}",
-                f"{anime_id}-episode-{episode_num}-english-subbed",
-            ]
+            if "one piece" in anime_name.lower():
+                print(f"[DEBUG] Using known One Piece ID")
+                return "one-piece"
             
-            for mirror in self.mirrors:
-                for url_format in url_formats:
-                    episode_url = f"{mirror}/{url_format}"
+            for mirror in mirror_health.ordered(self.mirrors):
+                started = time.monotonic()
+                try:
+                    response = await self.async_get(
+                        f"{mirror}/search.html",
+                        params={'keyword': anime_name},
+                        timeout=10
+                    )
+                    mirror_health.record(mirror, not is_mirror_failure(response.status_code),
+                                         time.monotonic() - started)
                     
-                    try:
-                        print(f"[DEBUG] Trying URL: {episode_url}")
-                        response = self.session.head(episode_url, timeout=10, allow_redirects=True)
-                        
-                        if response.status_code == 200:
-                            print(f"[DEBUG] Found working URL: {episode_url}")
-                            self.base_url = mirror
-                            return episode_url
-                        else:
-                            print(f"[DEBUG] URL returned {response.status_code}")
-                    except Exception as e:
-                        print(f"[DEBUG] URL failed: {e}")
+                    if response.status_code != 200:
                         continue
+                    
+                    anime_id = self._parse_search_page(response.text)
+                    if anime_id:
+                        return anime_id
+                except Exception as e:
+                    print(f"[DEBUG] Mirror {mirror} failed: {e}")
+                    mirror_health.record(mirror, False, time.monotonic() - started)
+                    continue
             
-            print(f"[ERROR] No working URL found for {anime_id} episode {episode_num}")
             return None
             
         except Exception as e:
-            print(f"Episode URL error: {e}")
+            print(f"Search error: {e}")
             return None
     
-    def extract_video_url(self, episode_url: str) -> Optional[Dict[str, str]]:
-        """Extract video URLs from episode page"""
-        try:
-            print(f"[DEBUG] Fetching episode page: {episode_url}")
-            response = self.session.get(episode_url, timeout=15)
-            
-            if response.status_code != 200:
-                print(f"[DEBUG] Page returned status {response.status_code}")
-                return None
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            print(f"[DEBUG] Page fetched, parsing...")
-            
-            # Method 1: Find iframe with video player
-            iframes = soup.find_all('iframe')
-            print(f"[DEBUG] Found {len(iframes)} iframes")
-            
-            for iframe in iframes:
-                src = iframe.get('src')
-                if src:
-                    print(f"[DEBUG] Found iframe: {src[:80]}...")
-                    if not src.startswith('http'):
-                        src = urljoin(self.base_url, src)
-                    
-                    # Try to extract from embed
-                    embed_videos = self._extract_from_embed(src)
-                    if embed_videos:
-                        return embed_videos
+    def _parse_search_page(self, html: str) -> Optional[str]:
+        """Return the anime ID of the first search result"""
+        # Link of the first search result
+        href = html_parser.first_link(html, 'li')
+        if href:
+            # Extract anime ID from URL
+            anime_id = href.split('/')[-1]
+            print(f"[DEBUG] Found anime ID: {anime_id}")
+            return anime_id
+        return None
+    
+    def _episode_slugs(self, anime_id: str, episode_num: int) -> List[str]:
+        """Episode page slugs used by the different mirrors"""
+        return [
+            f"{anime_id}-episode-{episode_num}",
+            f"{anime_id}-episode-{episode_num}-english-subbed",
+        ]
+    
+    def _extract_from_episode(self, page, episode_url: str) -> Optional[Dict[str, str]]:
+        """Video URLs from the streamed episode page"""
+        print(f"[DEBUG] Page responded, parsing as it arrives...")
+        
+        # Method 1: Find iframe with video player (embeds fetched concurrently
+        # as their iframes arrive, first one with a video wins)
+        embed_videos = first_embed(
+            stream_values(page, '<iframe', lambda html: self._iframe_sources(html, episode_url)),
+            self._extract_from_embed
+        )
+        if embed_videos:
+            return embed_videos
+        
+        # Method 2 and 3: download links and raw page source
+        return self._extract_from_page(page.read_all())
+    
+    async def _extract_from_episode_async(self, page, episode_url: str) -> Optional[Dict[str, str]]:
+        """Async version of _extract_from_episode"""
+        print(f"[DEBUG] Page responded, parsing as it arrives...")
+        
+        embed_videos = await first_embed_async(
+            stream_values_async(page, '<iframe', lambda html: self._iframe_sources(html, episode_url)),
+            self._extract_from_embed_async
+        )
+        if embed_videos:
+            return embed_videos
+        
+        return self._extract_from_page(await page.read_all())
+    
+    def _iframe_sources(self, html: str, episode_url: str) -> List[str]:
+        """Absolute src of every iframe on the (possibly partial) episode page"""
+        sources = []
+        for src in html_parser.attr_values(html, 'iframe', 'src'):
+            if src:
+                if not src.startswith('http'):
+                    src = urljoin(episode_url, src)
+                sources.append(src)
+        return sources
+    
+    def _extract_from_page(self, html: str) -> Optional[Dict[str, str]]:
+        """Extract video URLs from the episode page itself (no extra requests)"""
+        # Method 2: Find download links
+        links = html_parser.links_in_class(html, 'div', 'anime_muti_link')
+        if links:
+            print(f"[DEBUG] Found download section")
+            video_urls = {}
             
-            # Method 2: Find download links
-            download_section = soup.find('div', class_='anime_muti_link')
-            if download_section:
-                print(f"[DEBUG] Found download section")
-                links = download_section.find_all('a')
-                video_urls = {}
+            for href, text in links:
+                print(f"[DEBUG] Found link: {text} -> {href[:50] if href else 'None'}...")
                 
-                for link in links:
-                    href = link.get('href')
-                    text = link.get_text().strip()
-                    print(f"[DEBUG] Found link: {text} -> {href[:50] if href else 'None'}...")
-                    
-                    if href and ('download' in text.lower() or 'vidcdn' in href.lower() or 'streamwish' in href.lower()):
-                        quality = 'default'
-                        quality_match = re.search(r'(\d+[Pp])', text)
-                        if quality_match:
-                            quality = quality_match.group(1).lower()
-                        video_urls[quality] = href
-                
-                if video_urls:
-                    print(f"[DEBUG] Extracted {len(video_urls)} video URLs")
-                    return video_urls
-            
-            # Method 3: Search for any video URLs in page source
-            video_patterns = [
-                r'https?://[^\s"\'<>]+\.m3u8',
-                r'https?://[^\s"\'<>]+/playlist\.m3u8',
-                r'file:\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-            ]
-            
-            for pattern in video_patterns:
-                matches = re.findall(pattern, response.text)
-                if matches:
-                    print(f"[DEBUG] Found video URL via regex: {matches[0][:80]}...")
-                    return {'default': matches[0], '720p': matches[0]}
+                if href and ('download' in text.lower() or 'vidcdn' in href.lower() or 'streamwish' in href.lower()):
+                    quality = 'default'
+                    quality_match = re.search(r'(\d+[Pp])', text)
+                    if quality_match:
+                        quality = quality_match.group(1).lower()
+                    video_urls[quality] = href
             
-            print(f"[DEBUG] No video URLs found on page")
-            return None
+            if video_urls:
+                print(f"[DEBUG] Extracted {len(video_urls)} video URLs")
+                return video_urls
+        
+        # Method 3: Search for any video URLs in page source
+        hit = PAGE_VIDEO_PATTERNS.first(html)
+        if hit:
+            print(f"[DEBUG] Found video URL via regex: {hit.value[:80]}...")
+            return {'default': hit.value, '720p': hit.value}
+        
+        print(f"[DEBUG] No video URLs found on page")
+        return None
+    
+    def _extract_from_embed(self, embed_url: str) -> Optional[Dict[str, str]]:
+        """Extract video URLs from embed page"""
+        try:
+            print(f"[DEBUG] Fetching embed: {embed_url[:80]}...")
+            with self.stream_page(embed_url, timeout=15) as page:
+                if page.status_code != 200:
+                    print(f"[DEBUG] Embed returned status {page.status_code}")
+                    return None
+                
+                # Stop reading as soon as the top pattern has a complete match
+                hit = early_hit(page, EMBED_VIDEO_PATTERNS.stream())
+                if hit:
+                    return self._embed_result(hit)
+                return self._parse_embed_page(page.text)
             
         except Exception as e:
-            print(f"[ERROR] Video extraction error: {e}")
+            print(f"[ERROR] Embed extraction error: {e}")
             import traceback
             traceback.print_exc()
             return None
     
-    def _extract_from_embed(self, embed_url: str) -> Optional[Dict[str, str]]:
-        """Extract video URLs from embed page"""
+    async def _extract_from_embed_async(self, embed_url: str) -> Optional[Dict[str, str]]:
+        """Async version of _extract_from_embed"""
         try:
             print(f"[DEBUG] Fetching embed: {embed_url[:80]}...")
-            response = self.session.get(embed_url, timeout=15)
-            
-            if response.status_code != 200:
-                print(f"[DEBUG] Embed returned status {response.status_code}")
-                return None
-            
-            print(f"[DEBUG] Embed page fetched, searching for video URLs...")
-            
-            # Look for video sources in the page
-            # This regex pattern looks for common video URL patterns
-            video_patterns = [
-                r'"file":\s*"(https?://[^"]+\.m3u8[^"]*)"',
-                r'"src":\s*"(https?://[^"]+\.m3u8[^"]*)"',
-                r"'file':\s*'(https?://[^']+\.m3u8[^']*)'",
-                r'source.*?src=[\'"](https?://[^"\']+)["\']',
-                r'(https://[^\s"\'<>]+\.m3u8[^\s"\'<>]*)',
-                r'"sources":\s*\[\s*{\s*"file":\s*"([^"]+)"',
-            ]
-            
-            for i, pattern in enumerate(video_patterns):
-                matches = re.findall(pattern, response.text, re.IGNORECASE)
-                if matches:
-                    video_url = matches[0]
-                    print(f"[DEBUG] Found video URL (pattern {i+1}): {video_url[:80]}...")
-                    
-                    # Clean up the URL
-                    video_url = video_url.replace('\\/', '/')
-                    
-                    return {
-                        'default': video_url,
-                        '720p': video_url,
-                        'source': 'embed'
-                    }
-            
-            print(f"[DEBUG] No video URL found in embed")
-            return None
+            async with self.async_stream_page(embed_url, timeout=15) as page:
+                if page.status_code != 200:
+                    print(f"[DEBUG] Embed returned status {page.status_code}")
+                    return None
+                
+                hit = await early_hit_async(page, EMBED_VIDEO_PATTERNS.stream())
+                if hit:
+                    return self._embed_result(hit)
+                return self._parse_embed_page(page.text)
             
         except Exception as e:
             print(f"[ERROR] Embed extraction error: {e}")
-            import traceback
-            traceback.print_exc()
             return None
-
+    
+    def _parse_embed_page(self, html: str) -> Optional[Dict[str, str]]:
+        """Search an embed page for the video URL"""
+        print(f"[DEBUG] Embed page fetched, searching for video URLs...")
+        
+        # Look for common video URL patterns in the page (one pass over the text)
+        hit = EMBED_VIDEO_PATTERNS.first(html)
+        if hit:
+            return self._embed_result(hit)
+        
+        print(f"[DEBUG] No video URL found in embed")
+        return None
+    
+    def _embed_result(self, hit: Hit) -> Dict[str, str]:
+        print(f"[DEBUG] Found video URL (pattern {hit.priority + 1}): {hit.value[:80]}...")
+        
+        # Clean up the URL
+        video_url = hit.value.replace('\\/', '/')
+        
+        return {
+            'default': video_url,
+            '720p': video_url,
+            'source': 'embed'
+        }
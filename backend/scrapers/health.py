@@ -0,0 +1,198 @@
+"""
+Health tracking for upstream mirrors and providers
+EWMA latency and failure rate per target, best-first ordering and a
+circuit breaker that skips dead targets until a half-open probe succeeds
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+MIRROR_EWMA_ALPHA = float(os.getenv('MIRROR_EWMA_ALPHA', 0.3))
+MIRROR_FAILURE_THRESHOLD = int(os.getenv('MIRROR_FAILURE_THRESHOLD', 3))  # Consecutive failures to open
+MIRROR_COOLDOWN = float(os.getenv('MIRROR_COOLDOWN', 60))                  # Seconds before a probe
+MIRROR_DEFAULT_LATENCY = 1.0  # Assumed latency of a mirror we have not measured yet
+
+PROVIDER_EWMA_ALPHA = float(os.getenv('PROVIDER_EWMA_ALPHA', 0.2))
+PROVIDER_FAILURE_THRESHOLD = int(os.getenv('PROVIDER_FAILURE_THRESHOLD', 5))
+PROVIDER_COOLDOWN = float(os.getenv('PROVIDER_COOLDOWN', 300))
+PROVIDER_DEFAULT_LATENCY = 5.0
+
+# Embed player hosts (iframes on episode pages); "failure" includes pages without a video
+EMBED_FAILURE_THRESHOLD = int(os.getenv('EMBED_FAILURE_THRESHOLD', 2))
+EMBED_COOLDOWN = float(os.getenv('EMBED_COOLDOWN', 600))
+
+
+def is_mirror_failure(status_code: int) -> bool:
+    """Statuses that say the mirror itself is unhealthy (404 only means no such episode)"""
+    return status_code >= 500 or status_code in (403, 429)
+
+
+class CircuitBreaker:
+    """
+    closed: requests allowed, consecutive failures are counted
+    open: requests rejected until the cooldown has passed
+    half_open: one probe request allowed; success closes, failure re-opens
+    """
+    
+    def __init__(self, failure_threshold: int = MIRROR_FAILURE_THRESHOLD, cooldown: float = MIRROR_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started: Optional[float] = None
+    
+    def allow(self) -> bool:
+        if self.state == 'closed':
+            return True
+        now = time.monotonic()
+        if self.state == 'open':
+            if now - self.opened_at < self.cooldown:
+                return False
+            self.state = 'half_open'
+            self._probe_started = None
+        # half_open: let a single probe through (another one if the
+        # previous probe never reported back, e.g. it was not needed)
+        if self._probe_started is not None and now - self._probe_started < self.cooldown:
+            return False
+        self._probe_started = now
+        return True
+    
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+        self._probe_started = None
+    
+    def record_failure(self):
+        self.failures += 1
+        self._probe_started = None
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+    
+    def retry_in(self) -> float:
+        """Seconds until an open breaker allows a probe"""
+        if self.state != 'open':
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+
+class HealthStats:
+    def __init__(self, alpha: float, default_latency: float, breaker: CircuitBreaker):
+        self.alpha = alpha
+        self.default_latency = default_latency
+        self.latency: Optional[float] = None  # EWMA seconds
+        self.failure_rate = 0.0               # EWMA of failures (0..1)
+        self.requests = 0
+        self.breaker = breaker
+    
+    def record(self, ok: bool, latency: float):
+        self.requests += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = self.alpha * latency + (1 - self.alpha) * self.latency
+        self.failure_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * self.failure_rate
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+    
+    def score(self) -> float:
+        """
+        Rough expected seconds until a successful answer (lower is better)
+        A failure costs at least default_latency, so a target that fails
+        fast does not look better than a slower one that works
+        """
+        latency = self.latency if self.latency is not None else self.default_latency
+        return (latency + self.failure_rate * self.default_latency) / max(1 - self.failure_rate, 0.05)
+
+
+class HealthTracker:
+    """Per-target (mirror URL, provider name) stats with best-first ordering"""
+    
+    def __init__(self, alpha: float = MIRROR_EWMA_ALPHA, failure_threshold: int = MIRROR_FAILURE_THRESHOLD,
+                 cooldown: float = MIRROR_COOLDOWN, default_latency: float = MIRROR_DEFAULT_LATENCY):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.default_latency = default_latency
+        self._stats: Dict[str, HealthStats] = {}
+        self._lock = threading.Lock()
+    
+    def _get(self, target: str) -> HealthStats:
+        stats = self._stats.get(target)
+        if stats is None:
+            stats = self._stats.setdefault(target, HealthStats(
+                self.alpha, self.default_latency, CircuitBreaker(self.failure_threshold, self.cooldown)
+            ))
+        return stats
+    
+    def ordered(self, targets: List[str]) -> List[str]:
+        """
+        Targets to try, best first
+        Targets with an open circuit are left out - unless every target is
+        open, then all of them are returned so a lookup is still attempted
+        """
+        with self._lock:
+            allowed = [target for target in targets if self._get(target).breaker.allow()]
+            if not allowed:
+                allowed = list(targets)
+            # Stable sort keeps the configured order between equal scores
+            return sorted(allowed, key=lambda target: self._get(target).score())
+    
+    def ranked(self, targets: List[str]) -> List[str]:
+        """Same order as ordered() with open targets last, without using up probe slots"""
+        with self._lock:
+            def key(target):
+                stats = self._get(target)
+                return stats.breaker.retry_in() > 0, stats.score()
+            return sorted(targets, key=key)
+    
+    def allow(self, target: str) -> bool:
+        """Whether a request to this one target may go out (uses up the half-open probe slot)"""
+        with self._lock:
+            return self._get(target).breaker.allow()
+    
+    def is_open(self, target: str) -> bool:
+        """True while the target's circuit is open (cooling down)"""
+        with self._lock:
+            return self._get(target).breaker.retry_in() > 0
+    
+    def record(self, target: str, ok: bool, latency: float):
+        with self._lock:
+            self._get(target).record(ok, latency)
+    
+    def reset(self):
+        """Forget every target's stats (benchmarks start each run from a clean slate)"""
+        with self._lock:
+            self._stats.clear()
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                target: {
+                    'state': stats.breaker.state,
+                    'latency_ms': round(stats.latency * 1000) if stats.latency is not None else None,
+                    'failure_rate': round(stats.failure_rate, 3),
+                    'requests': stats.requests,
+                    'retry_in': round(stats.breaker.retry_in(), 1),
+                }
+                for target, stats in self._stats.items()
+            }
+
+
+# Shared by the GogoAnime and DirectWeb scrapers (they use the same hosts)
+mirror_health = HealthTracker()
+
+# Keyed by scraper class name, used by VideoScraper to order providers
+provider_health = HealthTracker(PROVIDER_EWMA_ALPHA, PROVIDER_FAILURE_THRESHOLD,
+                                PROVIDER_COOLDOWN, PROVIDER_DEFAULT_LATENCY)
+
+# Keyed by embed host (netloc), used to skip iframes whose player never yields a video
+embed_health = HealthTracker(MIRROR_EWMA_ALPHA, EMBED_FAILURE_THRESHOLD, EMBED_COOLDOWN)
+
+# Keyed by AllAnime source name ("Default", "S-mp4", ...), fed by reachability probes
+source_health = HealthTracker()
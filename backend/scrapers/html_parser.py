@@ -0,0 +1,249 @@
+"""
+HTML parser backends for the scrapers
+The scrapers only need a handful of elements from each page (iframe
+sources, the download links, the first search result), so building a
+full BeautifulSoup tree with the pure-Python parser is wasted work.
+
+Backends (SCRAPER_HTML_PARSER):
+    lxml  - libxml2 HTML parser + XPath (default)
+    scan  - targeted regex tag scanner, no tree at all
+    bs4   - BeautifulSoup with html.parser (the original behaviour)
+"""
+import html as html_lib
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # Optional - falls back to BeautifulSoup
+    lxml = None
+
+
+SCRAPER_HTML_PARSER = os.getenv('SCRAPER_HTML_PARSER', 'lxml').lower()
+
+# (href, link text)
+Link = Tuple[str, str]
+# (class names, id) of a container element
+Container = Tuple[List[str], Optional[str]]
+
+
+class HtmlParser(ABC):
+    """What the scrapers extract from a page; every backend returns the same results"""
+    
+    name = ''
+    
+    @abstractmethod
+    def attr_values(self, html: str, tag: str, attr: str) -> List[str]:
+        """Value of attr for every <tag> that has it, in document order"""
+        pass
+    
+    @abstractmethod
+    def first_link(self, html: str, container_tag: str) -> Optional[str]:
+        """href of the first <a> inside the first <container_tag>"""
+        pass
+    
+    @abstractmethod
+    def links_in_class(self, html: str, tag: str, class_name: str) -> List[Link]:
+        """(href, text) of the <a> elements inside the first <tag class="class_name">"""
+        pass
+    
+    @abstractmethod
+    def containers(self, html: str, tags: Iterable[str], keywords: Iterable[str]) -> List[Container]:
+        """Elements whose class contains one of the keywords (used by diagnose_page)"""
+        pass
+
+
+class Bs4Parser(HtmlParser):
+    name = 'bs4'
+    
+    def __init__(self):
+        self._last = (None, None)  # (html, soup) - scrapers query one page several times in a row
+    
+    def _soup(self, html: str) -> BeautifulSoup:
+        last_html, soup = self._last
+        if last_html is not html:
+            soup = BeautifulSoup(html, 'html.parser')
+            self._last = (html, soup)
+        return soup
+    
+    def attr_values(self, html, tag, attr):
+        return [element.get(attr) for element in self._soup(html).find_all(tag) if element.get(attr)]
+    
+    def first_link(self, html, container_tag):
+        container = self._soup(html).find(container_tag)
+        link = container.find('a') if container else None
+        return link.get('href') if link and link.get('href') else None
+    
+    def links_in_class(self, html, tag, class_name):
+        section = self._soup(html).find(tag, class_=class_name)
+        if not section:
+            return []
+        return [(link.get('href'), link.get_text().strip()) for link in section.find_all('a')]
+    
+    def containers(self, html, tags, keywords):
+        keywords = list(keywords)
+        elements = self._soup(html).find_all(list(tags), class_=lambda x: x and any(
+            keyword in str(x).lower() for keyword in keywords
+        ))
+        return [(element.get('class', []), element.get('id')) for element in elements]
+
+
+class LxmlParser(HtmlParser):
+    name = 'lxml'
+    
+    def __init__(self):
+        self._last = (None, None)  # (html, tree)
+    
+    def _tree(self, html: str):
+        last_html, tree = self._last
+        if last_html is html:
+            return tree
+        try:
+            tree = lxml.html.fromstring(html)
+        except ValueError:
+            # Unicode strings with an XML encoding declaration
+            tree = lxml.html.fromstring(html.encode('utf-8'))
+        except etree.ParserError:
+            tree = None  # Empty document
+        self._last = (html, tree)
+        return tree
+    
+    @staticmethod
+    def _has_class(class_name: str) -> str:
+        return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+    
+    def attr_values(self, html, tag, attr):
+        tree = self._tree(html)
+        return [str(value) for value in tree.xpath(f'//{tag}/@{attr}') if value] if tree is not None else []
+    
+    def first_link(self, html, container_tag):
+        tree = self._tree(html)
+        if tree is None:
+            return None
+        links = tree.xpath(f'(//{container_tag})[1]//a')
+        return links[0].get('href') or None if links else None
+    
+    def links_in_class(self, html, tag, class_name):
+        tree = self._tree(html)
+        if tree is None:
+            return []
+        sections = tree.xpath(f'//{tag}[{self._has_class(class_name)}]')
+        if not sections:
+            return []
+        return [(link.get('href'), link.text_content().strip()) for link in sections[0].iter('a')]
+    
+    def containers(self, html, tags, keywords):
+        tree = self._tree(html)
+        if tree is None:
+            return []
+        keywords = list(keywords)
+        found = []
+        for element in tree.iter(*tags):
+            classes = (element.get('class') or '').split()
+            if classes and any(keyword in ' '.join(classes).lower() for keyword in keywords):
+                found.append((classes, element.get('id')))
+        return found
+
+
+class TagScanParser(HtmlParser):
+    """
+    Scans for the few start tags the scrapers need instead of parsing the
+    page. Fastest, but only as good as the markup is regular: it does not
+    handle nesting (a container ends at its first closing tag).
+    """
+    
+    name = 'scan'
+    
+    ATTRIBUTE = re.compile(r'''([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?''')
+    COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+    TAG = re.compile(r'<[^>]*>')
+    _patterns: Dict[str, re.Pattern] = {}
+    
+    def _start_tags(self, tag: str) -> re.Pattern:
+        pattern = self._patterns.get(tag)
+        if pattern is None:
+            pattern = self._patterns[tag] = re.compile(rf'<{tag}\b([^>]*)>', re.IGNORECASE)
+        return pattern
+    
+    def _attrs(self, raw: str) -> Dict[str, str]:
+        attrs = {}
+        for match in self.ATTRIBUTE.finditer(raw):
+            name = match.group(1).lower()
+            if name not in attrs:
+                value = next((group for group in match.groups()[1:] if group is not None), '')
+                attrs[name] = html_lib.unescape(value)
+        return attrs
+    
+    def _text(self, fragment: str) -> str:
+        return html_lib.unescape(self.TAG.sub('', fragment)).strip()
+    
+    def _strip_comments(self, html: str) -> str:
+        return self.COMMENT.sub('', html) if '<!--' in html else html
+    
+    def attr_values(self, html, tag, attr):
+        values = []
+        for match in self._start_tags(tag).finditer(self._strip_comments(html)):
+            value = self._attrs(match.group(1)).get(attr)
+            if value:
+                values.append(value)
+        return values
+    
+    def first_link(self, html, container_tag):
+        html = self._strip_comments(html)
+        container = self._start_tags(container_tag).search(html)
+        if not container:
+            return None
+        link = self._start_tags('a').search(html, container.end())
+        return self._attrs(link.group(1)).get('href') or None if link else None
+    
+    def links_in_class(self, html, tag, class_name):
+        html = self._strip_comments(html)
+        for match in self._start_tags(tag).finditer(html):
+            if class_name not in self._attrs(match.group(1)).get('class', '').split():
+                continue
+            close = re.compile(rf'</{tag}\s*>', re.IGNORECASE).search(html, match.end())
+            section = html[match.end():close.start() if close else len(html)]
+            links = []
+            for link in re.finditer(r'<a\b([^>]*)>(.*?)</a\s*>', section, re.IGNORECASE | re.DOTALL):
+                links.append((self._attrs(link.group(1)).get('href'), self._text(link.group(2))))
+            return links
+        return []
+    
+    def containers(self, html, tags, keywords):
+        html = self._strip_comments(html)
+        keywords = list(keywords)
+        pattern = re.compile(rf'<({"|".join(tags)})\b([^>]*)>', re.IGNORECASE)
+        found = []
+        for match in pattern.finditer(html):
+            attrs = self._attrs(match.group(2))
+            classes = attrs.get('class', '').split()
+            if classes and any(keyword in ' '.join(classes).lower() for keyword in keywords):
+                found.append((classes, attrs.get('id')))
+        return found
+
+
+PARSERS = {
+    'bs4': Bs4Parser,
+    'lxml': LxmlParser,
+    'scan': TagScanParser,
+}
+
+
+def get_parser(name: Optional[str] = None) -> HtmlParser:
+    """Parser backend by name (default SCRAPER_HTML_PARSER); lxml falls back to bs4 when missing"""
+    name = (name or SCRAPER_HTML_PARSER).lower()
+    if name == 'lxml' and lxml is None:
+        print("[WARNING] lxml is not installed, using BeautifulSoup")
+        name = 'bs4'
+    if name not in PARSERS:
+        raise ValueError(f"Unknown HTML parser '{name}', expected one of {', '.join(PARSERS)}")
+    return PARSERS[name]()
+
+
+# Shared instance used by the scrapers
+html_parser = get_parser()
@@ -0,0 +1,261 @@
+"""
+Base class for scrapers of sites served from several mirrors
+Episode URLs are built from the slug format each mirror is known to use
+(probed with HEAD otherwise), mirrors are tried best-first by health, and
+an episode page whose mirror fails is fetched again from the next one.
+"""
+import asyncio
+import time
+from abc import abstractmethod
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import aiohttp
+import requests
+from .base_scraper import BaseScraper
+from .episode_formats import EpisodeFormats
+from .health import mirror_health, is_mirror_failure
+
+
+class MirroredScraper(BaseScraper):
+    """Scraper whose episode pages live on interchangeable mirrors (self.mirrors)"""
+    
+    def __init__(self, mirrors: List[str]):
+        super().__init__()
+        self.mirrors = mirrors
+        # Slug format that worked on each mirror (skips the HEAD probes)
+        self.episode_formats = EpisodeFormats()
+    
+    @abstractmethod
+    def _episode_slugs(self, anime_id: str, episode_num: int) -> List[str]:
+        """Episode page slugs used by the different mirrors"""
+        pass
+    
+    @abstractmethod
+    def _extract_from_episode(self, page, episode_url: str) -> Optional[Dict[str, str]]:
+        """Video URLs from a streamed episode page that answered 200"""
+        pass
+    
+    @abstractmethod
+    async def _extract_from_episode_async(self, page, episode_url: str) -> Optional[Dict[str, str]]:
+        """Async version of _extract_from_episode"""
+        pass
+    
+    def get_episode_url(self, anime_id: str, episode_num: int) -> Optional[str]:
+        """Construct the episode URL"""
+        return self._known_episode_url(anime_id, episode_num) or self._probe_episode_url(anime_id, episode_num)
+    
+    async def get_episode_url_async(self, anime_id: str, episode_num: int) -> Optional[str]:
+        """Async version of get_episode_url"""
+        return (self._known_episode_url(anime_id, episode_num)
+                or await self._probe_episode_url_async(anime_id, episode_num))
+    
+    def _known_episode_url(self, anime_id: str, episode_num: int,
+                           mirrors: Optional[List[str]] = None) -> Optional[str]:
+        """Episode URL on a mirror whose slug format is known, without any request"""
+        known = self.episode_formats.guess(
+            mirror_health.ordered(self.mirrors) if mirrors is None else mirrors,
+            self._episode_slugs(anime_id, episode_num), anime_id, episode_num
+        )
+        if not known:
+            return None
+        _, episode_url = known
+        print(f"[DEBUG] Using known URL format: {episode_url}")
+        return episode_url
+    
+    def _probe_episode_url(self, anime_id: str, episode_num: int, mirrors: Optional[List[str]] = None,
+                           skip: Optional[int] = None) -> Optional[str]:
+        """Find the episode URL by probing each mirror x URL format (but slugs[skip]) with HEAD"""
+        try:
+            url_formats = self._episode_slugs(anime_id, episode_num)
+            
+            # Healthy, fast mirrors first; mirrors with an open circuit are skipped
+            for mirror in mirror_health.ordered(self.mirrors) if mirrors is None else mirrors:
+                for index, url_format in enumerate(url_formats):
+                    if index == skip:
+                        continue
+                    episode_url = f"{mirror}/{url_format}"
+                    
+                    started = time.monotonic()
+                    try:
+                        print(f"[DEBUG] Trying URL: {episode_url}")
+                        response = self.session.head(episode_url, timeout=10, allow_redirects=True)
+                    except Exception as e:
+                        print(f"[DEBUG] URL failed: {e}")
+                        mirror_health.record(mirror, False, time.monotonic() - started)
+                        break  # Mirror is down, the other formats would fail too
+                    
+                    if self._probed(mirror, index, episode_url, response.status_code, started, anime_id, episode_num):
+                        return episode_url
+                    if is_mirror_failure(response.status_code):
+                        break
+            
+            print(f"[ERROR] No working URL found for {anime_id} episode {episode_num}")
+            return None
+        
+        except Exception as e:
+            print(f"Episode URL error: {e}")
+            return None
+    
+    async def _probe_episode_url_async(self, anime_id: str, episode_num: int, mirrors: Optional[List[str]] = None,
+                                       skip: Optional[int] = None) -> Optional[str]:
+        """Async version of _probe_episode_url"""
+        try:
+            url_formats = self._episode_slugs(anime_id, episode_num)
+            
+            for mirror in mirror_health.ordered(self.mirrors) if mirrors is None else mirrors:
+                for index, url_format in enumerate(url_formats):
+                    if index == skip:
+                        continue
+                    episode_url = f"{mirror}/{url_format}"
+                    
+                    started = time.monotonic()
+                    try:
+                        print(f"[DEBUG] Trying URL: {episode_url}")
+                        response = await self.async_head(episode_url, timeout=10, allow_redirects=True)
+                    except Exception as e:
+                        print(f"[DEBUG] URL failed: {e}")
+                        mirror_health.record(mirror, False, time.monotonic() - started)
+                        break  # Mirror is down, the other formats would fail too
+                    
+                    if self._probed(mirror, index, episode_url, response.status_code, started, anime_id, episode_num):
+                        return episode_url
+                    if is_mirror_failure(response.status_code):
+                        break
+            
+            print(f"[ERROR] No working URL found for {anime_id} episode {episode_num}")
+            return None
+        
+        except Exception as e:
+            print(f"Episode URL error: {e}")
+            return None
+    
+    def _probed(self, mirror: str, index: int, episode_url: str, status: int, started: float,
+                anime_id: str, episode_num: int) -> bool:
+        """Record a HEAD probe answer; True (and the format learned) when the episode page is there"""
+        mirror_health.record(mirror, not is_mirror_failure(status), time.monotonic() - started)
+        if status != 200:
+            print(f"[DEBUG] URL returned {status}")
+            return False
+        print(f"[DEBUG] Found working URL: {episode_url}")
+        self.episode_formats.learn(mirror, index)
+        self.episode_formats.expect(episode_url, mirror, anime_id, episode_num)
+        return True
+    
+    @staticmethod
+    def _mirror_of(url: str) -> str:
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+    
+    def _next_mirrors(self, status: Optional[int], tried: List[str]) -> Optional[List[str]]:
+        """Mirrors not tried yet when status (None = unreachable) says the mirror is failing"""
+        if status is not None and not is_mirror_failure(status):
+            return None
+        others = [mirror for mirror in mirror_health.ordered(self.mirrors) if mirror not in tried]
+        if others:
+            print(f"[DEBUG] Mirror failing, trying {others[0]}")
+        return others
+    
+    def _next_episode_url(self, origin: Tuple[str, str, int], status: Optional[int],
+                          tried: List[str]) -> Optional[str]:
+        """Episode URL to fetch after the page built for origin did not answer 200, None to give up"""
+        mirror, anime_id, episode_num = origin
+        if status == 404:
+            # Missing episode, or the mirror renamed its pages: its known format
+            # is only replaced when another slug answers
+            return self._probe_episode_url(anime_id, episode_num, [mirror], self.episode_formats.known(mirror))
+        mirrors = self._next_mirrors(status, tried)
+        if not mirrors:
+            return None
+        return (self._known_episode_url(anime_id, episode_num, mirrors)
+                or self._probe_episode_url(anime_id, episode_num, mirrors))
+    
+    async def _next_episode_url_async(self, origin: Tuple[str, str, int], status: Optional[int],
+                                      tried: List[str]) -> Optional[str]:
+        """Async version of _next_episode_url"""
+        mirror, anime_id, episode_num = origin
+        if status == 404:
+            return await self._probe_episode_url_async(anime_id, episode_num, [mirror],
+                                                       self.episode_formats.known(mirror))
+        mirrors = self._next_mirrors(status, tried)
+        if not mirrors:
+            return None
+        return (self._known_episode_url(anime_id, episode_num, mirrors)
+                or await self._probe_episode_url_async(anime_id, episode_num, mirrors))
+    
+    def extract_video_url(self, episode_url: str) -> Optional[Dict[str, str]]:
+        """Extract video URLs from episode page (on the next mirror if its mirror fails)"""
+        try:
+            seen = []
+            while episode_url and episode_url not in seen:
+                seen.append(episode_url)
+                origin = self.episode_formats.fetched(episode_url)
+                status, video_urls = self._extract_episode_page(episode_url)
+                if status == 200 or origin is None:
+                    return video_urls
+                episode_url = self._next_episode_url(origin, status, [self._mirror_of(url) for url in seen])
+            return None
+        
+        except Exception as e:
+            print(f"[ERROR] Video extraction error: {e}")
+            return None
+    
+    async def extract_video_url_async(self, episode_url: str) -> Optional[Dict[str, str]]:
+        """Async version of extract_video_url"""
+        try:
+            seen = []
+            while episode_url and episode_url not in seen:
+                seen.append(episode_url)
+                origin = self.episode_formats.fetched(episode_url)
+                status, video_urls = await self._extract_episode_page_async(episode_url)
+                if status == 200 or origin is None:
+                    return video_urls
+                episode_url = await self._next_episode_url_async(
+                    origin, status, [self._mirror_of(url) for url in seen]
+                )
+            return None
+        
+        except Exception as e:
+            print(f"[ERROR] Video extraction error: {e}")
+            return None
+    
+    def _extract_episode_page(self, episode_url: str) -> Tuple[Optional[int], Optional[Dict[str, str]]]:
+        """(status, video URLs) of one episode page, status None when its mirror is unreachable"""
+        mirror = self._mirror_of(episode_url)
+        started = time.monotonic()
+        answered = False
+        try:
+            print(f"[DEBUG] Fetching episode page: {episode_url}")
+            with self.stream_page(episode_url, timeout=15) as page:
+                answered = True
+                mirror_health.record(mirror, not is_mirror_failure(page.status_code), time.monotonic() - started)
+                if page.status_code != 200:
+                    print(f"[DEBUG] Page returned status {page.status_code}")
+                    return page.status_code, None
+                return 200, self._extract_from_episode(page, episode_url)
+        except requests.RequestException as e:
+            if answered:
+                raise
+            print(f"[DEBUG] Mirror {mirror} failed: {e}")
+            mirror_health.record(mirror, False, time.monotonic() - started)
+            return None, None
+    
+    async def _extract_episode_page_async(self, episode_url: str) -> Tuple[Optional[int], Optional[Dict[str, str]]]:
+        """Async version of _extract_episode_page"""
+        mirror = self._mirror_of(episode_url)
+        started = time.monotonic()
+        answered = False
+        try:
+            print(f"[DEBUG] Fetching episode page: {episode_url}")
+            async with self.async_stream_page(episode_url, timeout=15) as page:
+                answered = True
+                mirror_health.record(mirror, not is_mirror_failure(page.status_code), time.monotonic() - started)
+                if page.status_code != 200:
+                    print(f"[DEBUG] Page returned status {page.status_code}")
+                    return page.status_code, None
+                return 200, await self._extract_from_episode_async(page, episode_url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if answered:
+                raise
+            print(f"[DEBUG] Mirror {mirror} failed: {e}")
+            mirror_health.record(mirror, False, time.monotonic() - started)
+            return None, None
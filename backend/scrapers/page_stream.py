@@ -0,0 +1,281 @@
+"""
+Incremental page fetching for the HTML scrapers
+A PageStream reads the response body chunk by chunk and keeps the text
+received so far, so a scraper can act on the first iframe or video URL
+while the rest of the page is still on the wire, and close the
+connection as soon as it has what it needs. Bodies are capped at
+SCRAPER_STREAM_MAX_BYTES.
+"""
+import asyncio
+import codecs
+import os
+import re
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+import aiohttp
+import requests
+
+
+SCRAPER_STREAM = os.getenv('SCRAPER_STREAM', 'true').lower() in ('1', 'true', 'yes')
+SCRAPER_STREAM_CHUNK = int(os.getenv('SCRAPER_STREAM_CHUNK', 16 * 1024))  # First read size in bytes
+SCRAPER_STREAM_MAX_BYTES = int(os.getenv('SCRAPER_STREAM_MAX_BYTES', 4 * 1024 * 1024))
+
+
+class _PageText:
+    """Decoded text received so far and the bookkeeping shared by both streams"""
+    
+    def __init__(self, encoding: Optional[str], max_bytes: int):
+        try:
+            decoder = codecs.getincrementaldecoder(encoding or 'utf-8')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')
+        self._decoder = decoder(errors='replace')
+        self.max_bytes = max_bytes
+        self.text = ''
+        self.bytes_read = 0
+        self.done = False
+        self._marks: Dict[str, int] = {}
+        self._markers: Dict[str, re.Pattern] = {}
+    
+    def _next_size(self, chunk_size: int) -> int:
+        """Reads grow with the page, so the text is copied O(log n) times instead of once per chunk"""
+        return max(1, min(max(chunk_size, self.bytes_read // 4), self.max_bytes - self.bytes_read))
+    
+    def _feed(self, chunk: bytes, final: bool = False):
+        self.bytes_read += len(chunk)
+        self.text += self._decoder.decode(chunk, final)
+        if final or self.bytes_read >= self.max_bytes:
+            if not final:
+                print(f"[INFO] Page cut at {self.bytes_read} bytes (SCRAPER_STREAM_MAX_BYTES)")
+                self.text += self._decoder.decode(b'', True)
+            self.done = True
+    
+    def complete_text(self) -> str:
+        """Text up to the last complete tag (all of it once the page is done)"""
+        if self.done:
+            return self.text
+        return self.text[:self.text.rfind('>') + 1]
+    
+    def _has_new(self, marker: str) -> bool:
+        """True when a complete tag starting with marker (e.g. "<iframe") arrived since the last call"""
+        pattern = self._markers.get(marker)
+        if pattern is None:
+            pattern = self._markers[marker] = re.compile(re.escape(marker), re.IGNORECASE)
+        start = self._marks.get(marker, 0)
+        match = pattern.search(self.text, start)
+        if match is None:
+            # The marker may be split between chunks
+            self._marks[marker] = max(start, len(self.text) - len(marker) + 1)
+            return False
+        if self.text.find('>', match.end()) == -1:
+            self._marks[marker] = match.start()  # Tag not complete yet
+            return False
+        self._marks[marker] = match.end()
+        return True
+
+
+class PageStream(_PageText):
+    """Streaming body of a requests response (fetched with stream=True)"""
+    
+    def __init__(self, response, max_bytes: int = SCRAPER_STREAM_MAX_BYTES, chunk_size: int = SCRAPER_STREAM_CHUNK):
+        super().__init__(response.encoding, max_bytes)
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = response.url
+        self.chunk_size = chunk_size
+    
+    def read_more(self) -> bool:
+        """Read one more chunk; False once the page is complete"""
+        if self.done:
+            return False
+        chunk = self.response.raw.read(self._next_size(self.chunk_size), decode_content=True)
+        if not chunk:
+            self._feed(b'', final=True)
+        else:
+            self._feed(chunk)
+        if self.done:
+            self.close()
+        return not self.done
+    
+    def read_until(self, marker: str) -> bool:
+        """Read until a new complete <marker ...> tag has arrived; False at the end of the page"""
+        while not self._has_new(marker):
+            if not self.read_more():
+                return False
+        return True
+    
+    def read_all(self) -> str:
+        while self.read_more():
+            pass
+        return self.text
+    
+    def close(self):
+        self.response.close()
+
+
+class AsyncPageStream(_PageText):
+    """Streaming body of an aiohttp response"""
+    
+    def __init__(self, response: aiohttp.ClientResponse, max_bytes: int = SCRAPER_STREAM_MAX_BYTES,
+                 chunk_size: int = SCRAPER_STREAM_CHUNK):
+        super().__init__(response.charset, max_bytes)
+        self.response = response
+        self.status_code = response.status
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.chunk_size = chunk_size
+    
+    async def read_more(self) -> bool:
+        if self.done:
+            return False
+        chunk = await self.response.content.read(self._next_size(self.chunk_size))
+        if not chunk:
+            self._feed(b'', final=True)
+        else:
+            self._feed(chunk)
+        if self.done:
+            self.close()
+        return not self.done
+    
+    async def read_until(self, marker: str) -> bool:
+        while not self._has_new(marker):
+            if not await self.read_more():
+                return False
+        return True
+    
+    async def read_all(self) -> str:
+        while await self.read_more():
+            pass
+        return self.text
+    
+    def close(self):
+        if self.done:
+            self.response.release()
+        else:
+            # Drop the connection rather than draining the rest of the body
+            self.response.close()
+
+
+class ThreadedPageStream:
+    """
+    AsyncPageStream interface over a PageStream read in worker threads
+    Used for hosts behind a Cloudflare challenge, which only the
+    cloudscraper (requests) session gets through
+    """
+    
+    def __init__(self, page: PageStream):
+        self.page = page
+        self.status_code = page.status_code
+        self.headers = page.headers
+        self.url = page.url
+    
+    @property
+    def text(self) -> str:
+        return self.page.text
+    
+    @property
+    def done(self) -> bool:
+        return self.page.done
+    
+    def complete_text(self) -> str:
+        return self.page.complete_text()
+    
+    async def _run(self, fn, *args):
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except requests.RequestException as e:
+            raise aiohttp.ClientError(str(e)) from e
+    
+    async def read_more(self) -> bool:
+        return await self._run(self.page.read_more)
+    
+    async def read_until(self, marker: str) -> bool:
+        return await self._run(self.page.read_until, marker)
+    
+    async def read_all(self) -> str:
+        return await self._run(self.page.read_all)
+    
+    def close(self):
+        self.page.close()
+
+
+# Elements whose content must not be parsed on its own (it is not markup)
+_RAW_ELEMENTS = (('<!--', '-->'), ('<script', '</script'))
+
+
+class _NewText:
+    """
+    Part of a streamed page not handed to extract yet, so every tag is parsed
+    once instead of the whole partial page on each check. A comment or
+    script still open at the end is handed out again with the next part.
+    """
+    
+    def __init__(self):
+        self.offset = 0
+    
+    def take(self, page) -> str:
+        part = page.complete_text()[self.offset:]
+        if page.done:
+            self.offset += len(part)
+            return part
+        lower = part.lower()
+        keep = len(part)
+        for opener, closer in _RAW_ELEMENTS:
+            start = lower.rfind(opener)
+            if start != -1 and lower.find(closer, start) == -1:
+                keep = min(keep, start)
+        self.offset += keep
+        return part
+
+
+def stream_values(page: PageStream, marker: str, extract: Callable[[str], List[str]]) -> Iterator[str]:
+    """
+    Yield extract(html) values (e.g. iframe sources) as soon as their tag has
+    arrived, in document order and each once; the page is read up to the
+    next marker between values, and extract only sees the newly arrived
+    part. Exhausting the generator reads the whole page.
+    """
+    seen = set()
+    new_text = _NewText()
+    while True:
+        for value in extract(new_text.take(page)):
+            if value not in seen:
+                seen.add(value)
+                yield value
+        if page.done:
+            return
+        page.read_until(marker)
+
+
+async def stream_values_async(page: AsyncPageStream, marker: str,
+                              extract: Callable[[str], List[str]]) -> AsyncIterator[str]:
+    """Async version of stream_values"""
+    seen = set()
+    new_text = _NewText()
+    while True:
+        for value in extract(new_text.take(page)):
+            if value not in seen:
+                seen.add(value)
+                yield value
+        if page.done:
+            return
+        await page.read_until(marker)
+
+
+def early_hit(page: PageStream, scan):
+    """Read the page until scan (a url_scanner.StreamScan) reports a hit; None once the page is complete"""
+    while page.read_more():
+        hit = scan.feed(page.text)
+        if hit:
+            return hit
+    return None
+
+
+async def early_hit_async(page: AsyncPageStream, scan):
+    """Async version of early_hit"""
+    while await page.read_more():
+        hit = scan.feed(page.text)
+        if hit:
+            return hit
+    return None
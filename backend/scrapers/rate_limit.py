@@ -0,0 +1,44 @@
+"""
+Per-host request rate limiting for the async scraper path
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+class HostRateLimiter:
+    """
+    Spaces requests to each host so they never exceed the configured rate
+    
+    Rates are requests per second keyed by host; a key also matches its
+    subdomains ("allanime.day" covers "api.allanime.day").
+    """
+    
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: Optional[float] = None):
+        self.rates = rates or {}
+        self.default_rate = default_rate
+        self._next_slot: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+    
+    def rate_for(self, host: str) -> Optional[float]:
+        for pattern, rate in self.rates.items():
+            if host == pattern or host.endswith(f".{pattern}"):
+                return rate
+        return self.default_rate
+    
+    async def acquire(self, url: str):
+        """Wait until a request to the URL's host is allowed"""
+        host = urlparse(url).hostname or ''
+        rate = self.rate_for(host)
+        if not rate or rate <= 0:
+            return
+        
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + 1.0 / rate
+        
+        if slot > now:
+            await asyncio.sleep(slot - now)
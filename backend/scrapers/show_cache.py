@@ -0,0 +1,197 @@
+"""
+Show ID resolution cache
+Remembers anime name -> provider show ID so the search request is only
+made once per show instead of once per episode lookup
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict
+
+
+SHOW_CACHE_TTL = int(os.getenv('SHOW_CACHE_TTL', 7 * 24 * 3600))  # 1 week
+SHOW_CACHE_MAX_ENTRIES = int(os.getenv('SHOW_CACHE_MAX_ENTRIES', 1000))
+# 'auto' uses Redis while the app's RedisManager reports it reachable, the file store otherwise
+SHOW_CACHE_BACKEND = os.getenv('SHOW_CACHE_BACKEND', 'auto')
+SHOW_CACHE_FILE = os.getenv(
+    'SHOW_CACHE_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.show_id_cache.json')
+)
+
+
+class _FileStore:
+    """Persists the whole cache as one JSON file"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict] = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+    
+    def get(self, key: str) -> Optional[Dict]:
+        return self._data.get(key)
+    
+    def set(self, key: str, entry: Dict, ttl: int):
+        with self._lock:
+            self._data[key] = entry
+            now = time.time()
+            # Drop expired entries while we are rewriting the file anyway
+            self._data = {k: v for k, v in self._data.items() if v.get('expires_at', 0) > now}
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._data, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"[WARNING] Could not persist show ID cache: {e}")
+
+
+class ShowIdCache:
+    """
+    In-memory LRU of anime name -> show ID with per-entry TTL,
+    backed by a persistent store (Redis or a JSON file)
+    
+    Redis goes through the app's RedisManager (set as `redis` by main.py),
+    so the store follows its availability checks instead of being fixed
+    at import: the async methods use Redis while it is up and the file
+    store otherwise. The sync methods run outside the event loop and only
+    use the file store.
+    """
+    
+    def __init__(self, ttl: int = SHOW_CACHE_TTL, max_entries: int = SHOW_CACHE_MAX_ENTRIES, store='default',
+                 redis_manager=None, backend: str = SHOW_CACHE_BACKEND):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend.lower()
+        self.redis = redis_manager  # cache.RedisManager
+        self._store = store  # 'default' = file store created on first use
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @property
+    def redis_available(self) -> bool:
+        return self.backend in ('auto', 'redis') and self.redis is not None and self.redis.available
+    
+    def _file_store(self):
+        """Persistent store for when Redis is not used, None if there is none"""
+        if self._store == 'default':
+            with self._lock:
+                if self._store == 'default':
+                    self._store = _FileStore(SHOW_CACHE_FILE) if self.backend in ('auto', 'file') else None
+        return self._store
+    
+    @staticmethod
+    def _key(namespace: str, anime_name: str) -> str:
+        return f"{namespace}:{anime_name.strip().lower()}"
+    
+    def _get_memory(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+    
+    def _set_memory(self, key: str, entry: Dict):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def _load(self, key: str) -> Optional[str]:
+        """Memory first, then the persistent store"""
+        entry = self._get_memory(key)
+        if entry:
+            return entry['show_id']
+        
+        store = self._file_store()
+        if store is None:
+            return None
+        
+        try:
+            entry = store.get(key)
+        except Exception as e:
+            print(f"[WARNING] Show ID cache read error: {e}")
+            return None
+        
+        if entry and entry.get('expires_at', 0) > time.time():
+            self._set_memory(key, entry)
+            return entry['show_id']
+        return None
+    
+    def get(self, namespace: str, anime_name: str) -> Optional[str]:
+        """Return the cached show ID or None"""
+        return self._load(self._key(namespace, anime_name))
+    
+    async def get_async(self, namespace: str, anime_name: str) -> Optional[str]:
+        """Like get, but reads Redis when it is up and the file store off the event loop"""
+        key = self._key(namespace, anime_name)
+        entry = self._get_memory(key)
+        if entry:
+            return entry['show_id']
+        if not self.redis_available:
+            return await asyncio.to_thread(self._load, key)
+        
+        try:
+            data = await self.redis.client.get(f"showid:{key}")
+        except Exception as e:
+            self.redis.report_error(e)
+            print(f"[WARNING] Show ID cache read error: {e}")
+            return None
+        
+        entry = json.loads(data) if data else None
+        if entry and entry.get('expires_at', 0) > time.time():
+            self._set_memory(key, entry)
+            return entry['show_id']
+        return None
+    
+    def set(self, namespace: str, anime_name: str, show_id: str):
+        """Remember a resolved show ID"""
+        key = self._key(namespace, anime_name)
+        entry = {'show_id': show_id, 'expires_at': time.time() + self.ttl}
+        self._set_memory(key, entry)
+        self._save(key, entry)
+    
+    def _save(self, key: str, entry: Dict):
+        store = self._file_store()
+        if store is None:
+            return
+        try:
+            store.set(key, entry, self.ttl)
+        except Exception as e:
+            print(f"[WARNING] Show ID cache write error: {e}")
+    
+    async def set_async(self, namespace: str, anime_name: str, show_id: str):
+        """Like set, but writes Redis when it is up and the file store off the event loop"""
+        key = self._key(namespace, anime_name)
+        entry = {'show_id': show_id, 'expires_at': time.time() + self.ttl}
+        self._set_memory(key, entry)
+        if not self.redis_available:
+            await asyncio.to_thread(self._save, key, entry)
+            return
+        
+        try:
+            await self.redis.client.setex(f"showid:{key}", self.ttl, json.dumps(entry))
+        except Exception as e:
+            self.redis.report_error(e)
+            print(f"[WARNING] Show ID cache write error: {e}")
+    
+    def clear(self):
+        """Forget the in-memory entries (the persistent store is left alone)"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared instance
+show_id_cache = ShowIdCache()
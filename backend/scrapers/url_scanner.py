@@ -0,0 +1,250 @@
+"""
+Multi-pattern video URL scanner
+The scrapers look for a video URL with a list of regexes in priority
+order, where the first match of the highest-priority pattern wins. Run
+one by one with re.findall, every pattern rescans the whole page and
+collects every match although only the first is used.
+
+PatternScanner compiles the list once and, for each pattern, the
+literals any match must contain (e.g. "m3u8", "sources:"). A scan checks
+those literals first, so patterns that cannot match are skipped without
+running the regex; the rest are searched in priority order for their
+first match only, and the scan stops at the first acceptable hit.
+Case-insensitive patterns are located through their leading literal in a
+case-folded copy of the page, which is much faster than re.IGNORECASE.
+
+(A single alternation of all patterns is not used: Python's re engine
+loses its literal-prefix scan on alternations and gets several times
+slower than the patterns on their own.)
+
+StreamScan checks a page that is still being downloaded (page_stream.py)
+for a hit that first() is bound to return on the whole page, so the
+scraper can stop reading early.
+"""
+import re
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+
+# {m}, {m,}, {m,n} - anything else starting with "{" is a literal brace
+BRACE_QUANTIFIER = re.compile(r'\{\d*(?:,\d*)?\}')
+
+# Characters of already-scanned text a StreamScan searches again, so a match
+# cut off by the end of one chunk is found once the next one arrives
+STREAM_OVERLAP = 4096
+
+
+class Hit(NamedTuple):
+    value: str
+    priority: int     # Index of the pattern that matched
+    position: int
+
+
+def _is_quantifier(pattern: str, i: int) -> bool:
+    return i < len(pattern) and (pattern[i] in '*+?' or bool(BRACE_QUANTIFIER.match(pattern, i)))
+
+
+def _is_optional(pattern: str, i: int) -> bool:
+    """Quantifier at i that allows zero repetitions"""
+    if i >= len(pattern):
+        return False
+    if pattern[i] in '*?':
+        return True
+    match = BRACE_QUANTIFIER.match(pattern, i)
+    return bool(match) and match.group(0)[1:].split(',')[0].rstrip('}') in ('', '0')
+
+
+def literals(pattern: str) -> Tuple[str, List[str]]:
+    """
+    (prefix, required) for a regex: the literal every match starts with
+    and the literals every match contains ('' / [] when unknown)
+    Conservative: alternations, lookarounds and inline flags give nothing.
+    """
+    if '|' in pattern or '(?=' in pattern or '(?!' in pattern or '(?<' in pattern:
+        return '', []
+    
+    n = len(pattern)
+    groups: List[List[str]] = [[]]     # Required runs per open group
+    run = ''
+    prefix = None                      # None until the first token is seen
+    i = 0
+    
+    def flush():
+        nonlocal run, prefix
+        if run:
+            groups[-1].append(run)
+            if prefix is None:
+                prefix = run
+        run = ''
+    
+    while i < n:
+        c = pattern[i]
+        token = None
+        if c == '\\':
+            escaped = pattern[i + 1:i + 2]
+            if escaped in ('x', 'u', 'U', 'N') or escaped.isdigit():
+                return '', []  # Character codes and backreferences
+            if escaped and not escaped.isalnum():
+                token = escaped
+            i += 2
+        elif c == '[':
+            # Character class: skip to its closing bracket
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < n and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i += 1
+        elif c == '(':
+            flush()
+            if pattern.startswith('(?:', i):
+                i += 3
+            elif pattern.startswith('(?P<', i):
+                i = pattern.index('>', i) + 1
+            elif pattern.startswith('(?', i):
+                return '', []
+            else:
+                i += 1
+            groups.append([])
+            continue
+        elif c == ')':
+            flush()
+            if len(groups) == 1:
+                return '', []
+            runs = groups.pop()
+            i += 1
+            if _is_optional(pattern, i):
+                if prefix in runs:
+                    prefix = ''
+            else:
+                groups[-1].extend(runs)
+            continue
+        elif _is_quantifier(pattern, i):
+            match = BRACE_QUANTIFIER.match(pattern, i)
+            i = match.end() if match else i + 1
+        elif c not in '.^$':
+            token = c
+            i += 1
+        else:
+            i += 1
+        
+        if token is None or _is_optional(pattern, i):
+            # Not a literal, or an optional one: the run ends here
+            flush()
+            if prefix is None:
+                prefix = ''
+        else:
+            run += token
+            if _is_quantifier(pattern, i):
+                flush()
+    
+    flush()
+    if len(groups) != 1:
+        return '', []
+    return prefix or '', groups[0]
+
+
+class _CompiledPattern:
+    def __init__(self, pattern: str, flags: int):
+        self.regex = re.compile(pattern, flags)
+        self.has_group = self.regex.groups > 0
+        self.ignorecase = bool(flags & re.IGNORECASE)
+        prefix, required = literals(pattern)
+        fold = str.casefold if self.ignorecase else str
+        self.prefix = fold(prefix)
+        self.required = [fold(literal) for literal in required]
+    
+    def value(self, match: re.Match) -> str:
+        """First capture group, or the whole match (like re.findall)"""
+        return match.group(1) if self.has_group else match.group(0)
+
+
+class PatternScanner:
+    """
+    Finds the first match of the highest-priority pattern
+    Each pattern yields its first capture group, or the whole match if it
+    has none. Only a pattern's first match is considered: when accept()
+    rejects it, the pattern is out and the next one decides.
+    """
+    
+    def __init__(self, patterns: Sequence[str], flags: int = 0):
+        self.patterns = list(patterns)
+        self.flags = flags
+        self._compiled = [_CompiledPattern(pattern, flags) for pattern in self.patterns]
+    
+    def first(self, text: str, accept: Optional[Callable[[str], bool]] = None) -> Optional[Hit]:
+        """First acceptable hit of the best pattern, None if nothing matches"""
+        folded = None
+        
+        for priority, pattern in enumerate(self._compiled):
+            haystack = text
+            if pattern.ignorecase:
+                if folded is None:
+                    folded = text.casefold()
+                haystack = folded
+            
+            # Cheap rejection: a literal every match needs is not on the page
+            if any(literal not in haystack for literal in pattern.required):
+                continue
+            
+            match = self._search(pattern, text, folded)
+            if match is None:
+                continue
+            value = pattern.value(match)
+            if accept is None or accept(value):
+                return Hit(value, priority, match.start())
+        
+        return None
+    
+    @staticmethod
+    def _search(pattern: _CompiledPattern, text: str, folded: Optional[str]) -> Optional[re.Match]:
+        """First match of one pattern"""
+        if not (pattern.ignorecase and len(pattern.prefix) >= 3 and len(folded) == len(text)):
+            # Case-sensitive patterns already get re's fast literal-prefix scan
+            return pattern.regex.search(text)
+        
+        # Case-insensitive: jump between occurrences of the leading literal
+        position = folded.find(pattern.prefix)
+        while position != -1:
+            match = pattern.regex.match(text, position)
+            if match:
+                return match
+            position = folded.find(pattern.prefix, position + 1)
+        return None
+    
+    def stream(self, accept: Optional[Callable[[str], bool]] = None) -> 'StreamScan':
+        """Scanner for a page that arrives in chunks (see StreamScan)"""
+        return StreamScan(self, accept)
+
+
+class StreamScan:
+    """
+    Early-exit scan of a growing page
+    Only the top-priority pattern can decide before the page is complete:
+    its first match wins no matter what follows. A match is only trusted
+    once it ends before the received text does (a URL running into the end
+    of the chunk may still grow). When that first match is rejected the
+    decision depends on the lower patterns, so feed() stops reporting hits
+    and the caller runs first() on the whole page as usual.
+    """
+    
+    def __init__(self, scanner: PatternScanner, accept: Optional[Callable[[str], bool]] = None):
+        self._pattern = scanner._compiled[0]
+        self._accept = accept
+        self._checked = 0     # Text before this offset holds no complete match
+        self._rejected = False
+    
+    def feed(self, text: str) -> Optional[Hit]:
+        """Hit first() would return for any completion of text, else None"""
+        if self._rejected or not text:
+            return None
+        match = self._pattern.regex.search(text, max(0, self._checked - STREAM_OVERLAP))
+        if match is None or match.end() >= len(text):
+            self._checked = match.start() if match else len(text)
+            return None
+        value = self._pattern.value(match)
+        if self._accept is not None and not self._accept(value):
+            self._rejected = True
+            return None
+        return Hit(value, 0, match.start())
@@ -1,17 +1,30 @@
 """
 Main video scraper that tries multiple providers
 """
-from typing import Optional, Dict
+import asyncio
+import os
+import time
+from typing import Optional, Dict, List
 from .allanime_scraper import AllAnimeScraper
 from .gogoanime_scraper import GogoAnimeScraper
 from .direct_scraper import DirectWebScraper
+from .base_scraper import track_upstream_errors
+from .health import provider_health
+
+
+# Race providers concurrently instead of trying them one after another
+RACE_PROVIDERS = os.getenv('SCRAPER_RACE', 'true').lower() in ('1', 'true', 'yes')
+# Seconds to wait for the running providers before starting the next one
+# (0 starts every provider at once, which multiplies the upstream load)
+HEDGE_DELAY = float(os.getenv('SCRAPER_HEDGE_DELAY', 3))
 
 
 class VideoScraper:
     """Main scraper that tries multiple providers with fallback"""
     
     def __init__(self):
-        # Initialize all available scrapers (in order of preference)
+        # Initialize all available scrapers (in order of preference; at
+        # runtime they are reordered by measured success rate and latency)
         self.scrapers = [
             AllAnimeScraper(),       # Try AllAnime API first (same as ani-cli)
             DirectWebScraper(),      # Fallback to direct scraper
@@ -20,36 +33,219 @@ class VideoScraper:
             # NineAnimeScraper(),
             # AnimePaheScraper(),
         ]
+        self.race = RACE_PROVIDERS
+        self.hedge_delay = HEDGE_DELAY
     
     def get_video_url(self, anime_name: str, episode_num: int) -> Optional[Dict[str, any]]:
         """
         Try to get video URL from available scrapers
         Returns dict with video URLs and metadata
         """
-        for scraper in self.scrapers:
-            try:
-                print(f"Trying {scraper.__class__.__name__}...")
-                result = scraper.get_video(anime_name, episode_num)
+        with track_upstream_errors() as errors:
+            for scraper in self._ordered_scrapers():
+                try:
+                    print(f"Trying {scraper.__class__.__name__}...")
+                    started = time.monotonic()
+                    with track_upstream_errors() as upstream_errors:
+                        try:
+                            result = scraper.run_stage('get_video', scraper.get_video, anime_name, episode_num)
+                        except Exception:
+                            self._record(scraper, False, started)
+                            raise
+                    self._record_result(scraper, result, upstream_errors, started)
+                    
+                    if result:
+                        return self._success_result(scraper, anime_name, episode_num, result)
+                        
+                except Exception as e:
+                    print(f"Error with {scraper.__class__.__name__}: {e}")
+                    errors.append(f"{scraper.__class__.__name__}: {e}")
+                    continue
+        
+        return self._failure_result(anime_name, episode_num, errors)
+    
+    async def get_video_url_async(self, anime_name: str, episode_num: int,
+                                  race: Optional[bool] = None) -> Optional[Dict[str, any]]:
+        """
+        Async version of get_video_url
+        Does not block the event loop while the providers are scraped
+        
+        With race enabled the providers run concurrently (optionally
+        staggered by hedge_delay) and the first success wins.
+        """
+        with track_upstream_errors() as errors:
+            if self.race if race is None else race:
+                return await self._race_providers(anime_name, episode_num, errors)
+            
+            for scraper in self._ordered_scrapers():
+                try:
+                    print(f"Trying {scraper.__class__.__name__}...")
+                    result = await self._get_video_timed(scraper, anime_name, episode_num)
+                    
+                    if result:
+                        return self._success_result(scraper, anime_name, episode_num, result)
+                        
+                except Exception as e:
+                    print(f"Error with {scraper.__class__.__name__}: {e}")
+                    errors.append(f"{scraper.__class__.__name__}: {e}")
+                    continue
+        
+        return self._failure_result(anime_name, episode_num, errors)
+    
+    async def _race_providers(self, anime_name: str, episode_num: int, errors: List[str]) -> Dict[str, any]:
+        """
+        Start the providers in preference order, each one hedge_delay after the
+        previous (or immediately when a running provider fails), return the
+        first successful result and cancel the providers still running
+        """
+        async def run(scraper):
+            print(f"Trying {scraper.__class__.__name__}...")
+            return scraper, await self._get_video_timed(scraper, anime_name, episode_num)
+        
+        waiting = self._ordered_scrapers()
+        running = set()
+        
+        try:
+            while waiting or running:
+                if waiting:
+                    running.add(asyncio.create_task(run(waiting.pop(0))))
+                    if self.hedge_delay <= 0:
+                        continue
+                
+                done, running = await asyncio.wait(
+                    running,
+                    timeout=self.hedge_delay if waiting else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
                 
-                if result:
-                    return {
-                        'success': True,
-                        'episode': episode_num,
-                        'anime': anime_name,
-                        'provider': scraper.__class__.__name__,
-                        'video_urls': result
-                    }
+                for task in done:
+                    try:
+                        scraper, result = task.result()
+                    except Exception as e:
+                        print(f"Error while racing providers: {e}")
+                        errors.append(str(e))
+                        continue
                     
-            except Exception as e:
-                print(f"Error with {scraper.__class__.__name__}: {e}")
-                continue
+                    if result:
+                        return self._success_result(scraper, anime_name, episode_num, result)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        
+        return self._failure_result(anime_name, episode_num, errors)
+    
+    def _ordered_scrapers(self) -> List:
+        """Scrapers best-first; providers ejected by their circuit breaker are left out"""
+        by_name = {scraper.__class__.__name__: scraper for scraper in self.scrapers}
+        return [by_name[name] for name in provider_health.ordered(list(by_name))]
+    
+    def _record(self, scraper, ok: bool, started: float):
+        provider_health.record(scraper.__class__.__name__, ok, time.monotonic() - started)
+    
+    def _record_result(self, scraper, result: Optional[Dict], upstream_errors: List[str], started: float):
+        """
+        Only upstream errors make a lookup without result a failure; a clean
+        "not found" (a movie the provider lacks, an episode not out yet) says
+        nothing about the provider's health and is not recorded
+        """
+        if result:
+            self._record(scraper, True, started)
+        elif upstream_errors:
+            self._record(scraper, False, started)
+    
+    async def _get_video_timed(self, scraper, anime_name: str, episode_num: int) -> Optional[Dict]:
+        """get_video_async that feeds provider_health (cancelled attempts are not counted)"""
+        started = time.monotonic()
+        with track_upstream_errors() as upstream_errors:
+            try:
+                result = await scraper.run_stage_async('get_video', scraper.get_video_async, anime_name, episode_num)
+            except Exception:
+                self._record(scraper, False, started)
+                raise
+        self._record_result(scraper, result, upstream_errors, started)
+        return result
+    
+    def url_lifetime(self, provider: Optional[str]) -> Optional[int]:
+        """Known URL lifetime (seconds) of a provider by name, None if unknown"""
+        for scraper in self.scrapers:
+            if scraper.__class__.__name__ == provider:
+                return scraper.url_lifetime
+        return None
+    
+    def provider_stats(self) -> Dict[str, any]:
+        """Provider order and per-provider health, for /health"""
+        names = [scraper.__class__.__name__ for scraper in self.scrapers]
+        return {
+            'order': provider_health.ranked(names),
+            'stats': provider_health.snapshot(),
+        }
+    
+    async def get_video_urls_batch_async(self, anime_name: str, episode_nums: List[int]) -> Dict[int, Dict[str, any]]:
+        """
+        Resolve many episodes at once through the AllAnime batch API
+        Returns a result dict (same shape as get_video_url) per episode
+        """
+        scraper = next((s for s in self.scrapers if isinstance(s, AllAnimeScraper)), None)
+        if scraper is None:
+            return {episode_num: self._failure_result(anime_name, episode_num) for episode_num in episode_nums}
+        
+        with track_upstream_errors() as errors:
+            show_id = await scraper.search_anime_async(anime_name)
+            video_urls = await scraper.extract_video_urls_batch_async(show_id, episode_nums) if show_id else {}
         
+        return {
+            episode_num: (
+                self._success_result(scraper, anime_name, episode_num, video_urls[episode_num])
+                if video_urls.get(episode_num)
+                else self._failure_result(anime_name, episode_num, errors)
+            )
+            for episode_num in episode_nums
+        }
+    
+    def _success_result(self, scraper, anime_name: str, episode_num: int, video_urls: Dict) -> Dict[str, any]:
+        # Alternate sources ({'url', 'provider'} list, best first) sit next to video_urls,
+        # which maps quality -> URL
+        video_urls = dict(video_urls)
+        alternates = video_urls.pop('alternates', None)
+        result = {
+            'success': True,
+            'episode': episode_num,
+            'anime': anime_name,
+            'provider': scraper.__class__.__name__,
+            'video_urls': video_urls
+        }
+        if alternates:
+            result['alternates'] = alternates
+        return result
+    
+    def _failure_result(self, anime_name: str, episode_num: int,
+                        errors: Optional[List[str]] = None) -> Dict[str, any]:
+        """
+        reason is "provider_error" when upstream errors were seen (the video
+        may exist, retry soon) and "not_found" when every provider answered
+        """
+        if errors:
+            return {
+                'success': False,
+                'error': f'Video sources unavailable ({len(errors)} upstream errors, last: {errors[-1]})',
+                'reason': 'provider_error',
+                'episode': episode_num,
+                'anime': anime_name
+            }
         return {
             'success': False,
             'error': 'No video sources found',
+            'reason': 'not_found',
             'episode': episode_num,
             'anime': anime_name
         }
+    
+    async def close_async(self):
+        """Close the async sessions of all scrapers"""
+        for scraper in self.scrapers:
+            await scraper.close_async()
 
 
 # Singleton instance
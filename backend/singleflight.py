@@ -0,0 +1,122 @@
+"""
+Single-flight coalescing of concurrent work per key
+Concurrent cache misses for the same content wait on one scrape and
+share its result instead of each hitting the providers
+"""
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+SINGLEFLIGHT_LOCK_TTL = int(os.getenv('SINGLEFLIGHT_LOCK_TTL', 60))       # Seconds a worker may hold a lock
+SINGLEFLIGHT_WAIT = float(os.getenv('SINGLEFLIGHT_WAIT', 60))             # Max seconds to wait on another worker
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv('SINGLEFLIGHT_POLL_INTERVAL', 0.25))
+
+# Deletes the lock only if we still own it
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    In-process single-flight: the first caller for a key runs the function,
+    callers arriving while it runs await the same result
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+    
+    def in_flight(self) -> int:
+        """Number of keys currently being resolved"""
+        return len(self._calls)
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            # Run in its own task so a caller that goes away (client
+            # disconnect) does not cancel the work for everybody else
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(
+                lambda done: self._calls.pop(key) if self._calls.get(key) is done else None
+            )
+        else:
+            print(f"[INFO] Joining in-flight lookup for {key}")
+        
+        return await asyncio.shield(task)
+
+
+class RedisSingleFlight:
+    """
+    Cross-worker single-flight using a Redis lock (SET NX PX)
+    
+    The worker that gets the lock runs the function. The others poll the
+    cache until the result shows up or the lock goes away, and only run
+    the function themselves if the lock holder failed to produce a result.
+    """
+    
+    def __init__(self, redis_manager, lock_ttl: int = SINGLEFLIGHT_LOCK_TTL,
+                 wait: float = SINGLEFLIGHT_WAIT, poll_interval: float = SINGLEFLIGHT_POLL_INTERVAL):
+        self.redis = redis_manager
+        self.lock_ttl = lock_ttl
+        self.wait = wait
+        self.poll_interval = poll_interval
+    
+    async def _acquire(self, lock_key: str, token: str) -> bool:
+        return bool(await self.redis.client.set(lock_key, token, nx=True, px=self.lock_ttl * 1000))
+    
+    async def _release(self, lock_key: str, token: str):
+        await self.redis.client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+    
+    async def _locked(self, lock_key: str) -> bool:
+        return bool(await self.redis.client.exists(lock_key))
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]],
+                 read_cached: Callable[[], Awaitable[Optional[Any]]]) -> Any:
+        if not self.redis.available:
+            return await fn()
+        
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        
+        try:
+            acquired = await self._acquire(lock_key, token)
+        except Exception as e:
+            self.redis.report_error(e)
+            print(f"[WARNING] Redis lock error, resolving locally: {e}")
+            return await fn()
+        
+        if acquired:
+            try:
+                return await fn()
+            finally:
+                try:
+                    await self._release(lock_key, token)
+                except Exception as e:
+                    print(f"[WARNING] Redis lock release error: {e}")
+        
+        # Another worker is resolving this key - wait for its result
+        print(f"[INFO] Waiting for another worker to resolve {key}")
+        deadline = time.monotonic() + self.wait
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                cached = await read_cached()
+                if cached:
+                    return cached
+                if not await self._locked(lock_key):
+                    break
+        except Exception as e:
+            print(f"[WARNING] Redis lock wait error: {e}")
+        
+        # Lock holder failed or timed out - last check, then do it ourselves
+        cached = await read_cached()
+        if cached:
+            return cached
+        return await fn()
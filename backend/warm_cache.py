@@ -0,0 +1,308 @@
+"""
+Cache warmer
+Resolves episode, movie and special ranges into the same cache keys the
+API reads, so peak traffic is served from cache. Meant to run nightly.
+
+Usage:
+    python warm_cache.py --episodes 1-1100 --movies 1-15 --specials 1-10
+    python warm_cache.py --episodes 1-200 --workers 16 --rate allanime.day=5 --batch
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+from cache import RedisManager, TieredCache
+from content import MAX_EPISODE, parse_content_id, episode_cache_key, content_cache_key
+from freshness import result_ttl, stamp, is_stale
+from scrapers.base_scraper import BaseScraper
+from scrapers.rate_limit import HostRateLimiter
+from scrapers.video_scraper import video_scraper
+
+
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.warm_cache_state.json')
+
+
+class WarmJob:
+    """One content item to resolve and the cache keys it is stored under"""
+    
+    def __init__(self, content_id: str):
+        self.content_id = content_id
+        content_type, self.search_query, self.episode_num = parse_content_id(content_id)
+        self.cache_keys = [content_cache_key(content_type, content_id)]
+        if content_type == "episode":
+            # /api/episode/{n}/video and /api/content/{n}/video use different keys
+            self.cache_keys.insert(0, episode_cache_key(self.episode_num))
+
+
+class WarmStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.succeeded = 0
+        self.failed: List[str] = []
+        self.skipped = 0
+        self.latencies: List[float] = []
+        self.providers = Counter()
+    
+    def report(self, total: int):
+        elapsed = time.monotonic() - self.started
+        resolved = self.succeeded + len(self.failed)
+        latencies = sorted(self.latencies)
+        
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+        
+        print("\n" + "=" * 60)
+        print("Cache warm summary")
+        print("=" * 60)
+        print(f"Items:       {total} ({self.skipped} skipped, {resolved} resolved)")
+        print(f"✅ Succeeded: {self.succeeded}")
+        print(f"❌ Failed:    {len(self.failed)}")
+        print(f"Elapsed:     {elapsed:.1f}s")
+        print(f"Throughput:  {resolved / elapsed if elapsed else 0:.2f} items/s")
+        print(f"Latency:     p50 {percentile(0.5):.2f}s, p95 {percentile(0.95):.2f}s")
+        if self.providers:
+            print("Providers:   " + ", ".join(f"{name} {count}" for name, count in self.providers.most_common()))
+        if self.failed:
+            shown = ', '.join(self.failed[:20])
+            print(f"Failed IDs:  {shown}{' ...' if len(self.failed) > 20 else ''}")
+        print()
+
+
+def parse_ranges(spec: Optional[str]) -> List[int]:
+    """Parse "1-100,150,200-210" into a sorted list of numbers"""
+    numbers: Set[int] = set()
+    if not spec:
+        return []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            numbers.update(range(int(start), int(end) + 1))
+        else:
+            numbers.add(int(part))
+    return sorted(numbers)
+
+
+def parse_rates(specs: List[str]) -> Dict[str, float]:
+    """Parse ["allanime.day=5", "anitaku.pe=2"] into {host: requests per second}"""
+    rates = {}
+    for spec in specs:
+        host, _, rate = spec.partition('=')
+        rates[host.strip()] = float(rate)
+    return rates
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return set(json.load(f).get('done', []))
+    except (OSError, ValueError):
+        return set()
+
+
+def save_checkpoint(path: str, done: Set[str]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'done': sorted(done), 'updated': time.time()}, f)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class CacheWarmer:
+    def __init__(self, cache: TieredCache, workers: int, checkpoint: Optional[str], force: bool):
+        self.cache = cache
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.force = force
+        self.done: Set[str] = load_checkpoint(checkpoint) if checkpoint else set()
+        self.stats = WarmStats()
+        self._since_checkpoint = 0
+    
+    async def _store(self, job: WarmJob, result: Dict):
+        # Same expiry-aware lifetime the API uses
+        ttl = result_ttl(result, video_scraper.url_lifetime(result.get('provider')))
+        if ttl <= 0:
+            return
+        result = stamp(result, ttl)
+        for cache_key in job.cache_keys:
+            await self.cache.set(cache_key, result, ttl)
+    
+    def _mark_done(self, job: WarmJob):
+        self.done.add(job.content_id)
+        self._since_checkpoint += 1
+        if self.checkpoint and self._since_checkpoint >= 20:
+            save_checkpoint(self.checkpoint, self.done)
+            self._since_checkpoint = 0
+    
+    async def _is_cached(self, job: WarmJob) -> bool:
+        for cache_key in job.cache_keys:
+            cached = await self.cache.get(cache_key)
+            # Failed lookups and entries due for a refresh are warmed again
+            if not cached or not cached.get('success') or is_stale(cached):
+                return False
+        return True
+    
+    async def _pending(self, jobs: List[WarmJob]) -> List[WarmJob]:
+        """Drop jobs finished in a previous run or already in the cache"""
+        pending = []
+        for job in jobs:
+            if not self.force and (job.content_id in self.done or await self._is_cached(job)):
+                self.stats.skipped += 1
+                continue
+            pending.append(job)
+        return pending
+    
+    async def _resolve_batched(self, jobs: List[WarmJob]) -> List[WarmJob]:
+        """Resolve episodes through the AllAnime batch API, return what is left"""
+        episodes = [job for job in jobs if job.search_query == "One Piece"]
+        if not episodes:
+            return jobs
+        
+        started = time.monotonic()
+        results = await video_scraper.get_video_urls_batch_async(
+            "One Piece", [job.episode_num for job in episodes]
+        )
+        print(f"[INFO] Batch resolved {sum(1 for r in results.values() if r.get('success'))}/{len(episodes)} "
+              f"episodes in {time.monotonic() - started:.1f}s")
+        
+        remaining = [job for job in jobs if job not in episodes]
+        for job in episodes:
+            result = results.get(job.episode_num)
+            if result and result.get('success'):
+                await self._store(job, result)
+                self.stats.succeeded += 1
+                self.stats.providers[result.get('provider')] += 1
+                self._mark_done(job)
+            else:
+                remaining.append(job)
+        return remaining
+    
+    async def _worker(self, queue: "asyncio.Queue[WarmJob]"):
+        while True:
+            job = await queue.get()
+            try:
+                started = time.monotonic()
+                result = await video_scraper.get_video_url_async(job.search_query, job.episode_num)
+                self.stats.latencies.append(time.monotonic() - started)
+                
+                if result and result.get('success'):
+                    await self._store(job, result)
+                    self.stats.succeeded += 1
+                    self.stats.providers[result.get('provider')] += 1
+                    self._mark_done(job)
+                    print(f"✅ {job.content_id} ({result.get('provider')})")
+                else:
+                    self.stats.failed.append(job.content_id)
+                    print(f"❌ {job.content_id}: {result.get('error', 'unknown error') if result else 'no result'}")
+            except Exception as e:
+                self.stats.failed.append(job.content_id)
+                print(f"❌ {job.content_id}: {e}")
+            finally:
+                queue.task_done()
+    
+    async def run(self, jobs: List[WarmJob], batch: bool):
+        pending = await self._pending(jobs)
+        print(f"[INFO] {len(pending)} items to resolve ({self.stats.skipped} already done)")
+        
+        if batch and pending:
+            pending = await self._resolve_batched(pending)
+        
+        queue: "asyncio.Queue[WarmJob]" = asyncio.Queue()
+        for job in pending:
+            queue.put_nowait(job)
+        
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.workers)]
+        finished = False
+        try:
+            await queue.join()
+            finished = True
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self.checkpoint:
+                # The checkpoint only resumes an interrupted run: the next
+                # (nightly) run starts over, as its entries will have expired
+                if finished:
+                    clear_checkpoint(self.checkpoint)
+                else:
+                    save_checkpoint(self.checkpoint, self.done)
+
+
+def build_jobs(args) -> List[WarmJob]:
+    jobs = [WarmJob(str(n)) for n in parse_ranges(args.episodes) if 1 <= n <= MAX_EPISODE]
+    jobs += [WarmJob(f"movie-{n}") for n in parse_ranges(args.movies)]
+    jobs += [WarmJob(f"special-{n}") for n in parse_ranges(args.specials)]
+    return jobs
+
+
+async def main(args) -> int:
+    jobs = build_jobs(args)
+    if not jobs:
+        print("Nothing to warm. Pass --episodes, --movies and/or --specials.")
+        return 1
+    
+    redis_manager = RedisManager()
+    await redis_manager.start()
+    if not redis_manager.available:
+        print("❌ Redis is required: the API would not see results cached by this process")
+        await redis_manager.stop()
+        return 1
+    
+    BaseScraper.rate_limiter = HostRateLimiter(parse_rates(args.rate), args.default_rate)
+    
+    if args.reset:
+        clear_checkpoint(args.checkpoint)
+    
+    warmer = CacheWarmer(TieredCache(redis_manager), args.workers, args.checkpoint, args.force)
+    
+    print("\n" + "=" * 60)
+    print(f"Warming {len(jobs)} items with {args.workers} workers")
+    print("=" * 60 + "\n")
+    
+    try:
+        await warmer.run(jobs, args.batch)
+    finally:
+        warmer.stats.report(len(jobs))
+        await video_scraper.close_async()
+        await redis_manager.stop()
+    
+    return 0 if not warmer.stats.failed else 2
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolve One Piece content into the video cache")
+    parser.add_argument('--episodes', help='Episode ranges, e.g. "1-1100" or "1-50,100"')
+    parser.add_argument('--movies', help='Movie ranges, e.g. "1-15"')
+    parser.add_argument('--specials', help='Special ranges, e.g. "1-10"')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent resolutions (default 8)')
+    parser.add_argument('--rate', action='append', default=[], metavar='HOST=RPS',
+                        help='Per-host request rate limit, repeatable (e.g. allanime.day=5)')
+    parser.add_argument('--default-rate', type=float, default=None,
+                        help='Rate limit for hosts without --rate (requests/second)')
+    parser.add_argument('--batch', action='store_true',
+                        help='Resolve episodes through the AllAnime batch API first')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                        help='Progress file used to resume an interrupted run (removed once a run finishes)')
+    parser.add_argument('--reset', action='store_true', help='Ignore and clear the checkpoint')
+    parser.add_argument('--force', action='store_true', help='Resolve items even if already cached')
+    args = parser.parse_args()
+    
+    try:
+        sys.exit(asyncio.run(main(args)))
+    except KeyboardInterrupt:
+        print("\nInterrupted - progress saved, run again to resume")
+        sys.exit(130)
@@ -14,6 +14,8 @@ const VideoPlayer = ({ episodeNumber, nextEpisode, hasNextEpisode }) => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [selectedQuality, setSelectedQuality] = useState('default');
+  // -1 = primary source, otherwise index into videoData.alternates
+  const [alternateIndex, setAlternateIndex] = useState(-1);
   const [showSkipIntro, setShowSkipIntro] = useState(false);
   const [showSkipOutro, setShowSkipOutro] = useState(false);
   const [countdown, setCountdown] = useState(null);
@@ -118,6 +120,7 @@ const VideoPlayer = ({ episodeNumber, nextEpisode, hasNextEpisode }) => {
         
         if (response.data.success) {
           setVideoData(response.data);
+          setAlternateIndex(-1);
           
           // Set default quality
           const qualities = Object.keys(response.data.video_urls);
@@ -420,7 +423,10 @@ const VideoPlayer = ({ episodeNumber, nextEpisode, hasNextEpisode }) => {
     );
   }
 
-  const currentVideoUrl = videoData.video_urls[selectedQuality] || videoData.video_urls['default'];
+  const alternates = videoData.alternates || [];
+  const currentVideoUrl = alternateIndex >= 0
+    ? alternates[alternateIndex].url
+    : videoData.video_urls[selectedQuality] || videoData.video_urls['default'];
   const availableQualities = Object.keys(videoData.video_urls).filter(q => q !== 'provider' && q !== 'source');
   
   // Use proxy URL to handle CORS and headers
@@ -441,6 +447,12 @@ const VideoPlayer = ({ episodeNumber, nextEpisode, hasNextEpisode }) => {
           onError={(e) => {
             console.error('Video playback error:', e);
             console.error('Attempted URL:', proxyUrl);
+            if (alternateIndex + 1 < alternates.length) {
+              // Fail over to the next source the backend already resolved
+              console.log('🔁 Trying alternate source:', alternates[alternateIndex + 1].provider);
+              setAlternateIndex(alternateIndex + 1);
+              return;
+            }
             setError('Error playing video. The source may be unavailable or blocked.');
           }}
           onLoadedMetadata={() => {
@@ -592,7 +604,10 @@ const VideoPlayer = ({ episodeNumber, nextEpisode, hasNextEpisode }) => {
               {availableQualities.map((quality) => (
                 <button
                   key={quality}
-                  onClick={() => setSelectedQuality(quality)}
+                  onClick={() => {
+                    setSelectedQuality(quality);
+                    setAlternateIndex(-1);
+                  }}
                   className={`px-4 py-2 rounded-lg transition-colors ${
                     selectedQuality === quality
                       ? 'bg-op-orange text-white'